@@ -0,0 +1,54 @@
+# Measures how BFCode construction and simplification scale with program size.
+# Usage: python -m benchmarks.bfcode [max_pieces]
+
+import sys
+import time
+
+from c2bf.bf.code.common import bf_f, bf_sum
+from c2bf.bf.code.main import BFCode
+
+
+def build_iadd(n: int):
+    code = BFCode()
+    for _ in range(n):
+        code += "+>-<"
+    return code
+
+def build_add(n: int):
+    code = BFCode()
+    for _ in range(n):
+        code = code + "+>-<"
+    return code
+
+def build_sum(n: int):
+    return bf_sum(BFCode("+>") + bf_f(2) for _ in range(n))
+
+def build_nested(n: int):
+    code = BFCode()
+    for _ in range(n):
+        code = "[" + code + "]"
+    return code
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    ret = fn(*args)
+    return ret, time.perf_counter() - start
+
+
+def main(args):
+    max_pieces = int(args[0]) if args else 1_000_000
+    print(f"{'builder':<8} {'pieces':>9} {'ops':>10} {'build s':>9} {'iter s':>9} {'to_bf s':>9} {'us/piece':>9}")
+    for builder in (build_iadd, build_add, build_sum, build_nested):
+        n = 1000
+        while n <= max_pieces:
+            code, build_time = timed(builder, n)
+            ops, iter_time = timed(lambda: sum(1 for _ in code))
+            _, bf_time = timed(code.to_bf)
+            name = builder.__name__.removeprefix("build_")
+            print(f"{name:<8} {n:>9} {ops:>10} {build_time:>9.3f} {iter_time:>9.3f} {bf_time:>9.3f} {build_time / n * 1e6:>9.3f}")
+            n *= 10
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,39 @@
+# Times infinite_fib() code generation with and without the primitive cache.
+# Usage: python -m benchmarks.codegen
+
+import time
+
+import infinite_fib
+from c2bf.bf.code.main import BFCode, BFNode
+from c2bf.compile.mem.memo import PRIMITIVES
+
+
+def dag_size(code: BFCode):
+    seen = set()
+    stack: list = [code]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, BFCode):
+            stack.extend(part for part in node.parts if not isinstance(part, tuple))
+        elif isinstance(node, BFNode):
+            stack.append(node.code)
+    return len(seen)
+
+
+def main():
+    maxsize = PRIMITIVES.maxsize
+    for label, size in (("uncached", 0), ("cached", maxsize)):
+        PRIMITIVES.clear()
+        PRIMITIVES.maxsize = size
+        start = time.perf_counter()
+        code = infinite_fib.infinite_fib()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<9} {elapsed * 1000:8.2f} ms  {dag_size(code):6} nodes  {PRIMITIVES.info()}")
+    PRIMITIVES.maxsize = maxsize
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Compares terms/second of the binary and decimal infinite_fib modes when
+# starting from terms with a given number of decimal digits.
+# Usage: python -m benchmarks.fib_modes [budget_seconds] [digits...]
+
+import math
+import select
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+import infinite_fib
+from c2bf.bf.bfc import main as bfc_main
+
+
+def fib_with_digits(digits: int):
+    # F(n) ~ phi^n / sqrt(5)
+    phi = (1 + math.sqrt(5)) / 2
+    return infinite_fib.fib_pair(math.ceil((digits - 1 + math.log10(math.sqrt(5))) / math.log10(phi)))
+
+
+def build(tmp: Path, mode: str, terms):
+    bf = tmp.joinpath(f"{mode}.bf")
+    with bf.open("wt") as fout:
+        infinite_fib.infinite_fib(mode, terms).write_bf(fout)
+    errmsg = bfc_main([*infinite_fib.BFC_FLAGS, str(bf), str(tmp.joinpath(f"{mode}.c"))])
+    if errmsg is not None:
+        sys.exit(errmsg)
+    exe = tmp.joinpath(mode)
+    subprocess.run(["gcc", "-O2", str(tmp.joinpath(f"{mode}.c")), "-o", str(exe)], check=True)
+    return exe
+
+
+def count_terms(exe: Path, budget: float):
+    proc = subprocess.Popen([str(exe)], stdout=subprocess.PIPE)
+    assert(proc.stdout is not None)
+    start = time.perf_counter()
+    terms, last = 0, None
+    while (left := budget - (time.perf_counter() - start)) > 0:
+        ready, _, _ = select.select([proc.stdout], [], [], left)
+        if not ready:
+            break
+        chunk = proc.stdout.read1(1 << 16)
+        if not chunk:
+            break
+        if newlines := chunk.count(b"\n"):
+            terms += newlines
+            last = time.perf_counter() - start
+    proc.kill()
+    proc.wait()
+    return terms, last
+
+
+def main(args):
+    budget = float(args[0]) if args else 10.0
+    sizes = [int(a) for a in args[1:]] or [1_000, 10_000, 100_000]
+    print(f"{'digits':>8} {'mode':>8} {'terms':>8} {'terms/s':>12}")
+    for digits in sizes:
+        terms = fib_with_digits(digits)
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode in infinite_fib.MODES:
+                exe = build(Path(tmp), mode, terms)
+                count, elapsed = count_terms(exe, budget)
+                rate = f"{count / elapsed:12.3f}" if count and elapsed else f"{'< ' + format(1 / budget, '.3f'):>12}"
+                print(f"{digits:8} {mode:>8} {count:8} {rate}", flush=True)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
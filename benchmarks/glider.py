@@ -0,0 +1,78 @@
+# Compares glider scan strategies on long tapes laid out like the fibonacci units:
+# a marker cell every USIZE bytes and random limbs in between.
+# Usage: python -m benchmarks.glider [max_units]
+
+import subprocess
+import sys
+import tempfile
+
+from pathlib import Path
+
+from c2bf.bf.bfc import glider_helpers_c
+from c2bf.compile.mem.units import USIZE
+
+
+SOURCE = r"""
+#define _GNU_SOURCE
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+typedef uint8_t cell;
+
+%(helpers)s
+
+static double now(void) {
+	struct timespec t;
+	clock_gettime(CLOCK_MONOTONIC, &t);
+	return t.tv_sec + t.tv_nsec * 1e-9;
+}
+
+#define BENCH(label, expr) do { \
+	double start = now(); \
+	for (int r = 0; r < reps; r++) { uint8_t *p = mem + 64; sink += (uintptr_t)(expr); } \
+	double secs = (now() - start) / reps; \
+	printf("%%-16s %%10zu %%9.3f ns/unit %%8.2f GB/s\n", label, units, secs / units * 1e9, units * STEP / secs / 1e9); \
+} while (0)
+
+int main(int argc, char **argv) {
+	size_t units = strtoul(argv[1], NULL, 10);
+	int reps = atoi(argv[2]);
+	enum { STEP = %(usize)d };
+	size_t size = units * STEP + 128;
+	uint8_t *mem = calloc(size, 1);
+	volatile uintptr_t sink = 0;
+	srand(1);
+	for (size_t i = 0; i < units; i++)
+		for (int j = 1; j < STEP; j++)
+			mem[64 + i * STEP + j] = rand() %% 250;
+	mem[64 + units * STEP] = 254;
+	uint8_t *end = mem + size;
+
+	BENCH("step 1 loop", ({ while (*p != 254) p++; p; }));
+	BENCH("step 1 memchr", memchr(p, 254, end - p));
+	BENCH("stride loop", ({ while (*p != 254) p += STEP; p; }));
+	BENCH("stride unrolled", glide_f(p, 254, STEP, end));
+	return 0;
+}
+"""
+
+
+def main(args):
+    max_units = int(args[0]) if args else 10_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp).joinpath("glider.c")
+        exe = Path(tmp).joinpath("glider")
+        src.write_text(SOURCE % {"helpers": glider_helpers_c(), "usize": USIZE})
+        subprocess.run(["gcc", "-O2", str(src), "-o", str(exe)], check=True)
+        units = 10
+        while units <= max_units:
+            reps = max(1, 100_000_000 // units)
+            subprocess.run([str(exe), str(units), str(reps)], check=True)
+            units *= 10
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
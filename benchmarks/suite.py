@@ -0,0 +1,188 @@
+# Times every stage of the pipeline: generating the program, writing the BF,
+# parsing and each bfc pass, C generation, gcc and the compiled program running
+# to a fixed number of terms. Results can be saved as JSON baselines and compared.
+# Usage: python -m benchmarks.suite [--modes binary decimal] [--save NAME] [--compare NAME]
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import infinite_fib
+from c2bf.bf import bfc
+from c2bf.compile.mem.memo import PRIMITIVES
+
+
+BASELINES = Path(__file__).parent.joinpath("baselines")
+TERMS = {"binary": 400, "decimal": 20_000}
+# lowerings the generated C must still call, so a pass that stops matching (say an
+# earlier pass taking its loops first) fails here instead of only running slower
+LOWERINGS = {"binary": [r"print_run(_[fb])?\(p,"], "decimal": []}
+
+type Results = Dict[str, Dict[str, float]]
+
+
+def best_of[T](repeat: int, func: Callable[[], T]) -> Tuple[float, T]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result # type: ignore
+
+
+def run_terms(exe: Path, terms: int):
+    # returns (seconds, bytes printed) for the program to print `terms` lines
+    start = time.perf_counter()
+    proc = subprocess.Popen([str(exe), "--max-lines", str(terms)], stdout=subprocess.PIPE)
+    assert(proc.stdout is not None)
+    size = 0
+    while chunk := proc.stdout.read1(1 << 16):
+        size += len(chunk)
+    proc.wait()
+    return time.perf_counter() - start, size
+
+
+def bench_mode(mode: str, terms: int, repeat: int, tmp: Path):
+    stages: Dict[str, float] = {}
+
+    def codegen():
+        PRIMITIVES.clear()
+        return infinite_fib.infinite_fib(mode)
+    stages["codegen"], code = best_of(repeat, codegen)
+    stages["to_bf"], bf = best_of(repeat, code.to_bf)
+    stages["parse"], parsed = best_of(repeat, lambda: bfc.parse(bf))
+
+    flags = bfc.parse_options(infinite_fib.BFC_FLAGS)
+    assert(not isinstance(flags, str))
+    options = flags[0]
+
+    # each pass (all rounds of a fixed-point one) keeps its best time over the repeats
+    for _ in range(repeat):
+        stats = bfc.PassStats()
+        commands = bfc.run_passes(parsed, options.passes, stats)
+        for name, seconds in stats.seconds.items():
+            stages[f"pass {name}"] = min(stages.get(f"pass {name}", float("inf")), seconds)
+
+    # peak python memory of the IR from parsing through the last pass, measured on
+    # its own since tracemalloc slows everything it watches
+    tracemalloc.start()
+    bfc.run_passes(bfc.parse(bf), options.passes)
+    memory = {"ir peak MB": tracemalloc.get_traced_memory()[1] / 1e6}
+    tracemalloc.stop()
+    stages["emit c"], source = best_of(repeat, lambda: bfc.commands_to_c(commands, mode, True, 1, options))
+    for call in LOWERINGS[mode]:
+        if re.search(call, source) is None:
+            sys.exit(f"{mode}: the generated C has no call matching {call}")
+    src = tmp.joinpath(f"{mode}.c")
+    src.write_text(source)
+    exe = tmp.joinpath(mode)
+    cmd = [infinite_fib.CC, *infinite_fib.CFLAGS, str(src), "-o", str(exe)]
+    stages["cc"], _ = best_of(1, lambda: subprocess.run(cmd, check=True))
+
+    seconds, size = min(run_terms(exe, terms) for _ in range(repeat))
+    runtime = {
+        "terms": terms,
+        "seconds": seconds,
+        "terms/s": terms / seconds,
+        "digits/s": (size - terms) / seconds,
+    }
+    return stages, runtime, memory
+
+
+def environment():
+    cc = subprocess.run([infinite_fib.CC, "--version"], capture_output=True, text=True).stdout.splitlines()
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cc": cc[0] if cc else infinite_fib.CC,
+        "cpus": os.cpu_count(),
+    }
+
+
+# stage timings are lower-is-better, runtime rates are higher-is-better; stages
+# that moved by less than NOISE seconds are never reported, they are mostly jitter
+NOISE = 0.002
+
+
+def compare(results: Results, baseline: Results, threshold: float):
+    regressions: List[str] = []
+    print(f"\n{'':<12} {'metric':<16} {'baseline':>14} {'now':>14} {'change':>8}")
+    # a renamed stage or metric can't be compared, say so rather than dropping it
+    for group in (g for g in baseline if g not in results):
+        print(f"{group:<12} only in the baseline")
+    for group, metrics in results.items():
+        if group not in baseline:
+            print(f"{group:<12} not in the baseline")
+            continue
+        if metrics.get("terms") != baseline[group].get("terms"):
+            print(f"{group:<12} skipped, baseline ran a different number of terms")
+            continue
+        for metric in (m for m in baseline[group] if m not in metrics):
+            print(f"{group:<12} {metric:<16} only in the baseline")
+        for metric, value in metrics.items():
+            old = baseline[group].get(metric)
+            if old is None:
+                print(f"{group:<12} {metric:<16} not in the baseline")
+                continue
+            if metric == "terms" or old == 0:
+                continue
+            change = value / old - 1
+            rate = metric.endswith("/s")
+            worse = -change if rate else change
+            if worse > threshold and (rate or value - old > NOISE):
+                regressions.append(f"{group} {metric}")
+                flag = "  REGRESSION"
+            else:
+                flag = ""
+            print(f"{group:<12} {metric:<16} {old:14.4f} {value:14.4f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the infinite_fib pipeline.")
+    parser.add_argument("--modes", nargs="+", choices=infinite_fib.MODES, default=list(infinite_fib.MODES))
+    parser.add_argument("--terms", type=int, help="terms to run the compiled program for (default: per mode)")
+    parser.add_argument("--repeat", type=int, default=3, help="take the best of this many runs")
+    parser.add_argument("--save", metavar="NAME", help="store the results as benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare against benchmarks/baselines/NAME.json")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown reported as a regression")
+    opts = parser.parse_args(args)
+
+    results: Results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in opts.modes:
+            stages, runtime, memory = bench_mode(mode, opts.terms or TERMS[mode], opts.repeat, Path(tmp))
+            results[mode] = stages
+            results[f"{mode} run"] = runtime
+            results[f"{mode} memory"] = memory
+            print(f"{mode}:")
+            for stage, seconds in stages.items():
+                print(f"  {stage:<16} {seconds * 1000:10.2f} ms")
+            print(f"  ir peak          {memory['ir peak MB']:10.2f} MB")
+            print(f"  {runtime['terms']} terms in {runtime['seconds']:.2f}s: {runtime['terms/s']:.1f} terms/s, {runtime['digits/s']:.0f} digits/s")
+
+    if opts.save:
+        BASELINES.mkdir(exist_ok=True)
+        path = BASELINES.joinpath(f"{opts.save}.json")
+        path.write_text(json.dumps({"environment": environment(), "results": results}, indent=2) + "\n")
+        print(f"saved {path}")
+
+    if opts.compare:
+        baseline = json.loads(BASELINES.joinpath(f"{opts.compare}.json").read_text())
+        regressions = compare(results, baseline["results"], opts.threshold)
+        if regressions:
+            sys.exit(f"regressions: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
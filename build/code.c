@@ -1,34 +1,320 @@
+#define _GNU_SOURCE
+#include <stddef.h>
 #include <stdint.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <time.h>
+#include <errno.h>
+#include <signal.h>
+#include <unistd.h>
+#include <sys/mman.h>
 
-static uint8_t read() {
+typedef uint8_t cell;
+
+static uint8_t bf_read() {
 	int temp = getchar();
 	return (uint8_t)(temp != EOF ? temp : 0);
 }
 
+#define OUT_SIZE ((size_t)1048576u)
+static uint8_t out_buf[OUT_SIZE];
+static size_t out_len = 0;
+static int out_tty = 0;
+static const long long out_interval = 100LL * 1000000;
+static long long out_last = 0;
+static long long out_lines_left = -1;
+
+static void out_flush(void) {
+	size_t done = 0;
+	while (done < out_len) {
+		ssize_t n = write(STDOUT_FILENO, out_buf + done, out_len - done);
+		if (n < 0 && errno == EINTR)
+			continue;
+		if (n <= 0)
+			_exit(EXIT_FAILURE);
+		done += (size_t)n;
+	}
+	out_len = 0;
+}
+
+static void out_signal(int sig) {
+	out_flush();
+	_exit(128 + sig);
+}
+
+// A scan that ran off the tape without finding what it looked for
+static _Noreturn void tape_overrun(const char *msg) {
+	out_flush();
+	fputs(msg, stderr);
+	exit(EXIT_FAILURE);
+}
+
+// --max-lines N exits after printing N newlines
+static void out_init(int argc, char **argv) {
+	for (int i = 1; i + 1 < argc; i++) {
+		if (strcmp(argv[i], "--max-lines") == 0)
+			out_lines_left = strtoll(argv[++i], NULL, 10);
+	}
+	out_tty = isatty(STDOUT_FILENO);
+	atexit(out_flush);
+	signal(SIGINT, out_signal);
+	signal(SIGTERM, out_signal);
+}
+
+static void out_newline(void) {
+	struct timespec t;
+	clock_gettime(CLOCK_MONOTONIC, &t);
+	long long now = t.tv_sec * 1000000000LL + t.tv_nsec;
+	if (out_tty || out_len == OUT_SIZE || now - out_last >= out_interval) {
+		out_flush();
+		out_last = now;
+	}
+	if (out_lines_left > 0 && --out_lines_left == 0)
+		exit(EXIT_SUCCESS);
+}
+
+static inline void bf_putchar(uint8_t c) {
+	out_buf[out_len++] = c;
+	if (c == '\n')
+		out_newline();
+	else if (out_len == OUT_SIZE)
+		out_flush();
+}
+
+static void out_write(const uint8_t *src, size_t n) {
+	while (n > 0) {
+		size_t chunk = OUT_SIZE - out_len < n ? OUT_SIZE - out_len : n;
+		memcpy(out_buf + out_len, src, chunk);
+		out_len += chunk;
+		src += chunk;
+		n -= chunk;
+		if (out_len == OUT_SIZE)
+			out_flush();
+	}
+}
+
+// Writes src[0], src[-1], ..., src[1 - n]
+static void out_write_reversed(const uint8_t *src, size_t n) {
+	while (n > 0) {
+		size_t chunk = OUT_SIZE - out_len < n ? OUT_SIZE - out_len : n;
+		uint8_t *dst = out_buf + out_len;
+		for (size_t i = 0; i < chunk; i++)
+			dst[i] = src[-(ptrdiff_t)i];
+		out_len += chunk;
+		src -= chunk;
+		n -= chunk;
+		if (out_len == OUT_SIZE)
+			out_flush();
+	}
+}
+
+static cell *print_run_f(cell *p, cell bias, cell *end) {
+	cell *q = memchr(p + 1, (cell)-bias, end - p - 1);
+	if (q == NULL)
+		tape_overrun("tape overflow\n");
+	*p -= bias;
+	out_write(p, q - p);
+	memset(p, 0, q - p);
+	*q += bias;
+	return q;
+}
+
+static cell *print_run_b(cell *p, cell bias, cell *start) {
+	cell *q = memrchr(start, (cell)-bias, p - start);
+	if (q == NULL)
+		tape_overrun("tape underflow\n");
+	*p -= bias;
+	out_write_reversed(p, p - q);
+	memset(q + 1, 0, p - q);
+	*q += bias;
+	return q;
+}
+
+static cell *print_run(cell *p, ptrdiff_t step, cell bias) {
+	*p -= bias;
+	do {
+		bf_putchar(*p);
+		*p = 0;
+		p += step;
+	} while (*p != (cell)-bias);
+	*p += bias;
+	return p;
+}
+
 static int BLOCK_SIZE = 9;
 static int dbg_count = 100000;
-static void dbg(uint8_t mem[], uint8_t *p) {
+static void dbg(cell mem[], cell *p) {
+	out_flush();
 	printf("\nDBG OUTPUT:\n");
 	int i, j;
 	for (i = 1000; i < 1100; i += BLOCK_SIZE) {
 		for (j = 0; j < BLOCK_SIZE; j++) {
 			if (p == &mem[i + j])
-				printf("*%3d ", mem[i + j]);
+				printf("*%3u ", (unsigned)mem[i + j]);
 			else
-				printf(" %3d ", mem[i + j]);
+				printf(" %3u ", (unsigned)mem[i + j]);
 		}
 		printf("\n");
 	}
+	fflush(stdout);
 	if (--dbg_count == 0)
 		exit(0);
 }
-int main(void) {
-	uint8_t mem[1000000] = {0};
-	uint8_t *p = &mem[1000];
-	uint8_t dm;
+
+static inline cell *glide_f(cell *p, cell target, size_t step, cell *end) {
+	while (p + 4 * step <= end) {
+		if (p[0] == target) return p;
+		if (*(p + step) == target) return p + step;
+		if (*(p + 2 * step) == target) return p + 2 * step;
+		if (*(p + 3 * step) == target) return p + 3 * step;
+		p += 4 * step;
+	}
+	for (; p < end; p += step) {
+		if (*p == target) return p;
+	}
+	return NULL;
+}
+static inline cell *glide_b(cell *p, cell target, size_t step, cell *start) {
+	while (p >= start + 4 * step) {
+		if (p[0] == target) return p;
+		if (*(p - step) == target) return p - step;
+		if (*(p - 2 * step) == target) return p - 2 * step;
+		if (*(p - 3 * step) == target) return p - 3 * step;
+		p -= 4 * step;
+	}
+	for (; p >= start; p -= step) {
+		if (*p == target) return p;
+	}
+	return NULL;
+}
+
+static cell *dec_move(cell *p, ptrdiff_t step, unsigned levels) {
+	unsigned level = 1;
+	for (;;) {
+		if (level > levels) {
+			*p = 0;
+			level = levels;
+			p += step;
+		} else if (*p) {
+			unsigned take = *p < levels - level + 1 ? *p : levels - level + 1;
+			*p -= take;
+			level += take;
+		} else if (level == 1) {
+			return p;
+		} else {
+			level--;
+			p += step;
+		}
+	}
+}
+
+#define TAPE_LIMIT ((size_t)17179869184u)
+#define TAPE_WINDOW ((size_t)1 << 16)
+#define MAX_TAPES 16
+
+struct tape {
+	uint8_t *base;
+	size_t committed;
+	size_t limit;
+};
+static struct tape tapes[MAX_TAPES];
+static int tape_count = 0;
+
+static void tape_fail(const char *msg, size_t len) {
+	out_flush();
+	if (write(STDERR_FILENO, msg, len) < 0) {}
+	_exit(EXIT_FAILURE);
+}
+
+static void tape_fault(int sig, siginfo_t *info, void *context) {
+	(void)context;
+	uint8_t *addr = info->si_addr;
+	size_t page = (size_t)sysconf(_SC_PAGESIZE);
+	for (int i = 0; i < tape_count; i++) {
+		struct tape *t = &tapes[i];
+		if (addr >= t->base - page && addr < t->base)
+			tape_fail("tape underflow\n", 15);
+		if (addr < t->base + t->committed || addr >= t->base + t->limit)
+			continue;
+		size_t size = t->committed;
+		while (t->base + size <= addr)
+			size *= 2;
+		if (size > t->limit)
+			size = t->limit;
+		if (mprotect(t->base + t->committed, size - t->committed, PROT_READ | PROT_WRITE) != 0)
+			tape_fail("tape overflow\n", 14);
+		t->committed = size;
+		return;
+	}
+	for (int i = 0; i < tape_count; i++) {
+		if (addr >= tapes[i].base + tapes[i].limit && addr < tapes[i].base + tapes[i].limit + page)
+			tape_fail("tape overflow\n", 14);
+	}
+	signal(sig, SIG_DFL);
+}
+
+static uint8_t *tape_open(size_t limit) {
+	size_t page = (size_t)sysconf(_SC_PAGESIZE);
+	limit = (limit + page - 1) / page * page;
+	if (tape_count == MAX_TAPES) {
+		fputs("too many tapes\n", stderr);
+		exit(EXIT_FAILURE);
+	}
+	uint8_t *region = mmap(NULL, limit + 2 * page, PROT_NONE, MAP_PRIVATE | MAP_ANONYMOUS | MAP_NORESERVE, -1, 0);
+	if (region == MAP_FAILED) {
+		perror("mmap");
+		exit(EXIT_FAILURE);
+	}
+	struct tape *t = &tapes[tape_count];
+	t->base = region + page;
+	t->committed = TAPE_WINDOW < limit ? TAPE_WINDOW : limit;
+	t->limit = limit;
+	if (mprotect(t->base, t->committed, PROT_READ | PROT_WRITE) != 0) {
+		perror("mprotect");
+		exit(EXIT_FAILURE);
+	}
+	if (tape_count++ == 0) {
+		struct sigaction sa;
+		memset(&sa, 0, sizeof sa);
+		sa.sa_sigaction = tape_fault;
+		sa.sa_flags = SA_SIGINFO | SA_NODEFER;
+		sigemptyset(&sa.sa_mask);
+		sigaction(SIGSEGV, &sa, NULL);
+	}
+	return t->base;
+}
+
+static struct tape *tape_of(uint8_t *base) {
+	for (int i = 0; i < tape_count; i++) {
+		if (tapes[i].base == base)
+			return &tapes[i];
+	}
+	return NULL;
+}
+
+// Bytes of the tape that may have been written
+static size_t tape_size(uint8_t *base) {
+	return tape_of(base)->committed;
+}
+
+// Commits the first size bytes of the tape, returns 0 if it can't be that large
+static int tape_reserve(uint8_t *base, size_t size) {
+	struct tape *t = tape_of(base);
+	if (size > t->limit)
+		return 0;
+	if (size > t->committed) {
+		if (mprotect(t->base + t->committed, size - t->committed, PROT_READ | PROT_WRITE) != 0)
+			return 0;
+		t->committed = size;
+	}
+	return 1;
+}
+
+int main(int argc, char **argv) {
+	cell *mem = (cell *)tape_open(TAPE_LIMIT);
+	cell *p = &mem[1000];
+	out_init(argc, argv);
 	
 	p[34] = 0u;
 	p[35] = 1u;
@@ -37,392 +323,212 @@ int main(void) {
 	p += 18;
 	while (*p) {
 		p += 9;
-		while (*p != 254) {
+		if (*p != 254) {
 			p += 9;
+			if (*p != 254) {
+				p = glide_f(p, 254, 9, mem + TAPE_LIMIT / sizeof(cell));
+				if (p == NULL)
+					tape_overrun("tape overflow\n");
+			}
 		}
 		p[1] = 0u;
-		while (*p != 255) {
+		if (*p != 255) {
 			p -= 9;
+			if (*p != 255) {
+				p = glide_b(p, 255, 9, mem);
+				if (p == NULL)
+					tape_overrun("tape underflow\n");
+			}
 		}
 		p[9] += 2u;
-		p += 9;
-		while (*p) {
-			p[0] += 254u;
-			p[1] = 0u;
-			p[6] = 0u;
-			p[1] += p[8];
-			p[6] += p[8];
-			p[8] = p[1];
-			p[1] = 0u;
+		if (p[9]) {
+			p[9] -= 2u;
+			cell *restrict units = p;
+			ptrdiff_t n = 0;
+			do {
+				cell *p = units + n * 9;
+				p[10] = p[17];
+				p[15] = p[17];
+				p[17] = p[10];
+				p[10] = 0u;
+				n++;
+			} while ((cell)(units[n * 9 + 9] + 2u) != 0);
+			p = units + n * 9;
 			p[9] += 2u;
-			p += 9;
 		}
-		p[0]--;
-		while (*p) {
-			p[0]--;
-			p[-9]++;
+		p[9] = 255u;
+		while (p[9]) {
+			p[9]--;
+			p[0]++;
 			p -= 9;
 		}
-		p[0]--;
-		p[1] = 1u;
-		p++;
+		p[9] = 255u;
+		p[10] = 1u;
+		p += 10;
 		while (*p) {
-			p[1] = 1u;
-			p++;
-			while (*p) {
-				p[7] += 2u;
-				p += 7;
-				while (*p) {
-					p[0] += 254u;
-					p[2] = 0u;
-					p[1] = p[6];
-					p[2] += p[6];
-					p[6] = p[2];
-					p[2] = 0u;
-					p++;
-					while (*p) {
-						p[0] = 0u;
-						p[-1] = 253u;
-						p[0] = 0u;
-						p[1] = 0u;
-						p[2] = 0u;
-						p[3] = 1u;
-						p[1] = p[5];
-						p[5] = 0u;
-						p++;
-						while (*p) {
-							p[0]--;
-							p[4]++;
-							while (*p) {
-								p[0]--;
-								p[4]++;
-								while (*p) {
-									p[0]--;
-									p[4]++;
-									while (*p) {
-										p[0]--;
-										p[4]++;
-										while (*p) {
-											p[0]--;
-											p[4]++;
-											while (*p) {
-												p[0]--;
-												p[4]++;
-												while (*p) {
-													p[0]--;
-													p[4]++;
-													while (*p) {
-														p[0]--;
-														p[4]++;
-														while (*p) {
-															p[0]--;
-															p[4]++;
-															while (*p) {
-																p[0]--;
-																p[4] += 2u;
-																p[-8] = 1u;
-																p -= 8;
-																while (*p) {
-																	p[11]++;
-																	p[0] = 0u;
-																	p[1] = 0u;
-																	p[0] += p[11];
-																	p[1] += p[11];
-																	p[11] = p[0];
-																	p[0] = 1u;
-																	p++;
-																	if (*p) {
-																		p[0] = 0u;
-																		p[-1]--;
-																	}
-																	p[0] += p[-1];
-																	p[-1] = 0u;
-																	if (*p) {
-																		p[0] = 0u;
-																		p[8] = 1u;
-																	}
-																	p += 8;
-																}
-																p += 6;
-																while (*p != 253) {
-																	p -= 9;
-																}
-																p[6] = 0u;
-																p[4] = 1u;
-																p++;
-															}
-														}
-													}
-												}
-											}
-										}
-									}
-								}
-							}
-							p++;
-						}
-						p++;
-						while (*p) {
-							p[0]--;
-							p--;
-						}
-						p[-3] = 0u;
-						p[-2] = 0u;
-						p[-1] = 0u;
-						p[0] = 0u;
-						p[1] = 0u;
-						p -= 2;
-					}
-					p[8] += 2u;
-					p += 8;
-				}
-				p[0]--;
-				while (*p) {
-					p[0]--;
-					p[-9]++;
-					p -= 9;
+			p += 8;
+			if (*p != 254) {
+				p += 9;
+				if (*p != 254) {
+					p = glide_f(p, 254, 9, mem + TAPE_LIMIT / sizeof(cell));
+					if (p == NULL)
+						tape_overrun("tape overflow\n");
 				}
-				p[0]--;
-				p[18] += 2u;
-				p += 18;
-				while (*p) {
-					p[0] = 253u;
-					p += 6;
-					while (*p) {
-						p[0]--;
-						p[-3] = 25u;
-						p -= 3;
-						while (*p) {
-							p[0]--;
-							p[-11] = 1u;
-							p -= 11;
-							while (*p) {
-								p[4]++;
-								p[0] = 0u;
-								p[1] = 0u;
-								p[0] += p[4];
-								p[1] += p[4];
-								p[4] = p[0];
-								p[0] = 1u;
-								p++;
-								if (*p) {
-									p[0] = 0u;
-									p[-1]--;
-								}
-								p[0] += p[-1];
-								p[-1] = 0u;
-								if (*p) {
-									p[0] = 0u;
-									p[8] = 1u;
-								}
-								p += 8;
-							}
-							p += 8;
-							while (*p != 253) {
-								p -= 9;
-							}
-							p += 3;
-						}
-						p[0] += 6u;
-						while (*p) {
-							p[0]--;
-							p[-11] = 1u;
-							p -= 11;
-							while (*p) {
-								p[5]++;
-								p[0] = 0u;
-								p[1] = 0u;
-								p[0] += p[5];
-								p[1] += p[5];
-								p[5] = p[0];
-								p[0] = 1u;
-								p++;
-								if (*p) {
-									p[0] = 0u;
-									p[-1]--;
-								}
-								p[0] += p[-1];
-								p[-1] = 0u;
-								if (*p) {
-									p[0] = 0u;
-									p[8] = 1u;
-								}
-								p += 8;
-							}
-							p += 8;
-							while (*p != 253) {
-								p -= 9;
-							}
-							p += 3;
+			}
+			p[-9]++;
+			if (p[-9]) {
+				p[-9] -= 1u;
+				cell *restrict units = p;
+				ptrdiff_t n = 0;
+				do {
+					cell *p = units + n * -9;
+					p[-8] = p[-3];
+					p[-3] = 0u;
+					if (p[-8]) {
+						uint64_t dm_n = p[-8], dm_first = (cell)(9u - p[-7]) + (uint64_t)1;
+						if (dm_n < dm_first) {
+							p[-7] += (cell)dm_n;
+						} else {
+							dm_n -= dm_first;
+							p[-4] += (cell)(1 + dm_n / 10u);
+							p[-7] = (cell)(dm_n % 10u);
 						}
-						p += 3;
+						p[-8] = 0;
+						p[-6] = 0;
+						p[-3] = 0;
 					}
-					p[-6] = 0u;
-					p[3] += 2u;
-					p += 3;
-				}
-				p[0]--;
-				while (*p) {
-					p[0]--;
-					p[-9]++;
-					p -= 9;
-				}
-				p[0]--;
-				p[4] = 0u;
-				p[10] = 10u;
-				p[12] = 0u;
-				p[11] = p[15];
-				p[12] += p[15];
-				p[15] = p[12];
-				p[12] = 0u;
-				p += 10;
-				while (*p) {
-					p[0]--;
-					p[3] = 0u;
-					p[2] = p[1];
-					p[3] += p[1];
-					p[1] = p[3];
-					p[3] = 1u;
-					p += 2;
-					if (*p) {
-						p[0] = 0u;
-						p[1]--;
-					}
-					p[0] += p[1];
-					p[1] = 0u;
-					if (*p) {
-						p[0] = 0u;
-						p[-8]++;
-					}
-					p[-1]--;
-					p -= 2;
-				}
-				p[1] = 0u;
-				p -= 6;
-				while (*p) {
-					p[0] = 1u;
-					p[14] += 2u;
-					p += 14;
-					while (*p) {
-						p[0] += 254u;
-						p[2] = 0u;
-						p[1] = p[6];
-						p[2] += p[6];
-						p[6] = p[2];
-						p[2] = 0u;
-						p++;
-						while (*p) {
-							p[0] = 0u;
-							p--;
-							while (*p != 255) {
-								p -= 9;
-							}
-							p[4] = 0u;
-							p += 9;
-							while (*p != 254) {
-								p += 9;
-							}
-							p -= 8;
+					p[-7] += p[-5] * 6u;
+					p[-4] += p[-5] * 25u;
+					p[-5] = 0u;
+					if (p[-7]) {
+						uint64_t dm_n = p[-7], dm_first = (cell)(9u - p[-8]) + (uint64_t)1;
+						if (dm_n < dm_first) {
+							p[-8] += (cell)dm_n;
+						} else {
+							dm_n -= dm_first;
+							p[-4] += (cell)(1 + dm_n / 10u);
+							p[-8] = (cell)(dm_n % 10u);
 						}
-						p[8] += 2u;
-						p += 8;
+						p[-7] = 0;
+						p[-6] = 0;
+						p[-3] = 0;
 					}
-					p[0]--;
-					while (*p) {
-						p[0]--;
-						p[-9]++;
-						p -= 9;
-					}
-					p[0]--;
-					p += 4;
-					if (*p) {
-						p[0] = 0u;
-						p[-2] = 0u;
-					}
-				}
-				p -= 2;
+					p[-14] = p[-8];
+					p[-8] = 0u;
+					n++;
+				} while ((cell)(units[n * -9 + -9] + 1u) != 0);
+				p = units + n * -9;
+				p[-9] += 1u;
 			}
-			p += 7;
-			while (*p != 254) {
+			p[-9] = 255u;
+			if (*p != 254) {
 				p += 9;
+				if (*p != 254) {
+					p = glide_f(p, 254, 9, mem + TAPE_LIMIT / sizeof(cell));
+					if (p == NULL)
+						tape_overrun("tape overflow\n");
+				}
 			}
-			while (*p) {
-				p++;
+			if (*p != 0) {
+				p += 1;
+				if (*p != 0) {
+					p = memchr(p, 0, mem + TAPE_LIMIT / sizeof(cell) - p);
+					if (p == NULL)
+						tape_overrun("tape overflow\n");
+				}
 			}
 			p[1] = 0u;
-			p[0] += 50u;
+			p[0] = 50u;
 			while (*p) {
 				p[0] += 254u;
 				p[-1] += 2u;
 				p--;
 			}
-			p[0]--;
+			p[0] = 255u;
 			while (*p) {
 				p[0]--;
 				p[-9]++;
 				p -= 9;
 			}
-			p[0]--;
-			p += 15;
+			p[0] = 255u;
+			p += 4;
 			while (*p) {
 				p[0]--;
-				p -= 6;
-				while (*p != 254) {
+				p += 5;
+				if (*p != 254) {
 					p += 9;
+					if (*p != 254) {
+						p = glide_f(p, 254, 9, mem + TAPE_LIMIT / sizeof(cell));
+						if (p == NULL)
+							tape_overrun("tape overflow\n");
+					}
 				}
-				while (*p) {
-					p++;
+				if (*p != 0) {
+					p += 1;
+					if (*p != 0) {
+						p = memchr(p, 0, mem + TAPE_LIMIT / sizeof(cell) - p);
+						if (p == NULL)
+							tape_overrun("tape overflow\n");
+					}
 				}
 				p[-1] += 3u;
-				p--;
-				while (*p) {
-					p[0] += 254u;
-					p[-1] += 2u;
+				while (p[-1]) {
+					p[-1] += 254u;
+					p[-2] += 2u;
 					p--;
 				}
-				p[0]--;
-				while (*p) {
-					p[0]--;
-					p[-9]++;
+				p[-1] = 255u;
+				while (p[-1]) {
+					p[-1]--;
+					p[-10]++;
 					p -= 9;
 				}
-				p[0]--;
-				p += 15;
+				p[-1] = 255u;
+				p += 3;
 			}
-			p[-11] = 1u;
-			p[-6] += 2u;
-			p -= 6;
+			p[0] = 1u;
+			p[5] += 2u;
+			p += 5;
 			while (*p) {
 				p[0] += 254u;
-				p[2] = 0u;
 				p[1] = p[5];
-				p[2] += p[5];
+				p[2] = p[5];
 				p[5] = p[2];
 				p[2] = 0u;
 				p++;
 				while (*p) {
 					p[0] = 0u;
 					p--;
-					while (*p != 255) {
+					if (*p != 255) {
 						p -= 9;
+						if (*p != 255) {
+							p = glide_b(p, 255, 9, mem);
+							if (p == NULL)
+								tape_overrun("tape underflow\n");
+						}
 					}
 					p[4] = 0u;
 					p += 9;
-					while (*p != 254) {
+					if (*p != 254) {
 						p += 9;
+						if (*p != 254) {
+							p = glide_f(p, 254, 9, mem + TAPE_LIMIT / sizeof(cell));
+							if (p == NULL)
+								tape_overrun("tape overflow\n");
+						}
 					}
 					p -= 8;
 				}
 				p[8] += 2u;
 				p += 8;
 			}
-			p[0]--;
+			p[0] = 255u;
 			while (*p) {
 				p[0]--;
 				p[-9]++;
 				p -= 9;
 			}
-			p[0]--;
+			p[0] = 255u;
 			p[3] = 1u;
 			p += 4;
 			while (*p) {
@@ -430,143 +536,136 @@ int main(void) {
 				p[-3] = 0u;
 				p[-1] = 0u;
 				p += 5;
-				while (*p != 254) {
+				if (*p != 254) {
 					p += 9;
+					if (*p != 254) {
+						p = glide_f(p, 254, 9, mem + TAPE_LIMIT / sizeof(cell));
+						if (p == NULL)
+							tape_overrun("tape overflow\n");
+					}
 				}
-				while (*p) {
-					p++;
+				if (*p != 0) {
+					p += 1;
+					if (*p != 0) {
+						p = memchr(p, 0, mem + TAPE_LIMIT / sizeof(cell) - p);
+						if (p == NULL)
+							tape_overrun("tape overflow\n");
+					}
 				}
 				p[-1] += 2u;
 				p--;
-				while (*p) {
-					p[0] += 254u;
-					putchar(p[0]);
-					p[0] = 0u;
-					p[-1] += 2u;
-					p--;
-				}
-				p[0]--;
-				while (*p) {
-					p[0]--;
-					p[-9]++;
+				if (*p)
+					p = print_run_b(p, 2u, mem);
+				p++;
+				p[-1] = 255u;
+				while (p[-1]) {
+					p[-1]--;
+					p[-10]++;
 					p -= 9;
 				}
-				p[0]--;
-				p += 4;
+				p[-1] = 255u;
+				p += 3;
 			}
-			p--;
-			while (*p) {
-				p[0] = 0u;
-				p[6] += 2u;
-				p += 6;
-				while (*p) {
-					p[0] += 254u;
-					p[6] = p[5];
-					p[5] = 0u;
-					p[9] += 2u;
-					p += 9;
+			while (p[-1]) {
+				p[-1] = 0u;
+				p[5] += 2u;
+				if (p[5]) {
+					p[5] -= 2u;
+					cell *restrict units = p;
+					ptrdiff_t n = 0;
+					do {
+						cell *p = units + n * 9;
+						p[11] = p[10];
+						p[10] = 0u;
+						n++;
+					} while ((cell)(units[n * 9 + 5] + 2u) != 0);
+					p = units + n * 9;
+					p[5] += 2u;
 				}
-				p[0]--;
-				while (*p) {
-					p[0]--;
-					p[-9]++;
+				p[5] = 255u;
+				while (p[5]) {
+					p[5]--;
+					p[-4]++;
 					p -= 9;
 				}
-				p[0]--;
-				p += 3;
+				p[5] = 255u;
+				p += 9;
 			}
-			p -= 2;
+			p -= 3;
 		}
 		p[9] += 10u;
-		putchar(p[9]);
+		bf_putchar(p[9]);
 		p[9] = 0u;
 		p[8] += 2u;
-		p += 8;
-		while (*p) {
-			p[0] += 254u;
-			p[1] = 0u;
-			p[2] = 0u;
-			p[1] += p[7];
-			p[2] += p[7];
-			p[7] = p[1];
-			p[1] = 0u;
-			p[3] = 0u;
-			p[1] += p[8];
-			p[3] += p[8];
-			p[8] = p[1];
-			p[1] = 0u;
-			p += 3;
-			while (*p) {
-				p[0]--;
-				p[7] = 0u;
-				p[8] = 0u;
-				p[-1]++;
-				p[8] = 0u;
-				p[7] = p[-1];
-				p[8] += p[-1];
-				p[-1] = p[8];
-				p[8] = 1u;
-				p += 7;
-				if (*p) {
-					p[0] = 0u;
-					p[1]--;
-				}
-				p[0] += p[1];
-				p[1] = 0u;
-				if (*p) {
-					p[0] = 0u;
-					p[-9]++;
-				}
-				p -= 7;
-			}
-			p -= 11;
-			while (*p) {
-				p[0] = 0u;
-				p[18] = 0u;
-				p[19] = 0u;
-				p[10]++;
-				p[19] = 0u;
-				p[18] = p[10];
-				p[19] += p[10];
-				p[10] = p[19];
-				p[19] = 1u;
-				p += 18;
-				if (*p) {
-					p[0] = 0u;
-					p[1]--;
+		if (p[8]) {
+			p[8] -= 2u;
+			cell *restrict units = p;
+			ptrdiff_t n = 0;
+			do {
+				cell *p = units + n * 9;
+				p[9] = p[15];
+				p[10] = p[15];
+				p[15] = p[9];
+				p[9] = p[16];
+				p[11] = p[16];
+				p[16] = p[9];
+				p[9] = 0u;
+				if (p[11]) {
+					uint64_t dm_n = p[11], dm_first = (cell)(255u - p[10]) + (uint64_t)1;
+					if (dm_n < dm_first) {
+						p[10] += (cell)dm_n;
+					} else {
+						dm_n -= dm_first;
+						p[9] += (cell)(1 + dm_n / 256u);
+						p[10] = (cell)(dm_n % 256u);
+					}
+					p[11] = 0;
+					p[12] = 0;
+					p[13] = 0;
 				}
-				p[0] += p[1];
-				p[1] = 0u;
-				if (*p) {
-					p[0] = 0u;
-					p[-9]++;
+				if (p[0]) {
+					uint64_t dm_n = p[0], dm_first = (cell)(255u - p[10]) + (uint64_t)1;
+					if (dm_n < dm_first) {
+						p[10] += (cell)dm_n;
+					} else {
+						dm_n -= dm_first;
+						p[9] += (cell)(1 + dm_n / 256u);
+						p[10] = (cell)(dm_n % 256u);
+					}
+					p[0] = 0;
+					p[12] = 0;
+					p[13] = 0;
 				}
-				p -= 18;
-			}
-			p[15] = p[16];
-			p[16] = p[10];
-			p[10] = 0u;
-			p[17] += 2u;
-			p += 17;
+				p[15] = p[16];
+				p[16] = p[10];
+				p[10] = 0u;
+				n++;
+			} while ((cell)(units[n * 9 + 8] + 2u) != 0);
+			p = units + n * 9;
+			p[8] += 2u;
 		}
-		p[0] += 254u;
-		p[2] = 0u;
-		p[1] = p[-1];
-		p[2] += p[-1];
-		p[-1] = p[2];
-		p[2] = 0u;
-		p++;
-		if (*p) {
-			p[0] = 0u;
-			p[-1] = 0u;
-			p[8] = 254u;
+		p[8] = 254u;
+		p[9] = p[7];
+		p[10] = p[7];
+		p[7] = p[10];
+		p[10] = 0u;
+		if (p[9]) {
+			p[9] = 0u;
+			p[8] = 0u;
+			p[17] = 254u;
 		}
-		p--;
-		while (*p != 255) {
+		p += 8;
+		if (*p != 255) {
 			p -= 9;
+			if (*p != 255) {
+				p = glide_b(p, 255, 9, mem);
+				if (p == NULL)
+					tape_overrun("tape underflow\n");
+			}
 		}
 	}
 	p += 9;
 	
+	out_flush();
 	return EXIT_SUCCESS;
 }
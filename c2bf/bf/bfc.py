@@ -9,105 +9,298 @@
 # Optimizing brainfuck compiler
 # 
 # This script translates brainfuck source code into C/Java/Python source code.
-# Usage: python bfc.py BrainfuckFile OutputFile.c/java/py
+# Usage: python bfc.py [--option=value ...] BrainfuckFile OutputFile.c/java/py
 # 
 # Copyright (c) 2023 Project Nayuki
 # All rights reserved. Contact Nayuki for licensing.
 # https://www.nayuki.io/page/optimizing-brainfuck-compiler
 # 
 
-import pathlib, re, sys
+import hashlib, operator, pathlib, re, sys, time
 from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
 
 # ---- Intermediate representation (IR) ----
 
+# Commands are immutable once built: passes make new nodes instead of editing old
+# ones, so identical subtrees can be shared. Each subclass lists its fields in
+# __slots__, in constructor order. The hash is structural and cached once asked
+# for, and two nodes that both have one only get compared field by field if it matches.
 class Command:  # Common superclass
+	__slots__: Tuple[str, ...] = ("_hash",)
+	_fields: Callable[["Command"], object]
+	
+	def __init_subclass__(cls):
+		cls._fields = operator.attrgetter(*cls.__slots__)
+	
+	def fields(self) -> Tuple[object, ...]:
+		return tuple((tuple(v) if isinstance(v, list) else v) for v in map(self.__getattribute__, self.__slots__))
+	
+	def __hash__(self):
+		h: Optional[int] = getattr(self, "_hash", None)
+		if h is None:
+			h = self._hash = hash((self.__class__, self.fields()))
+		return h
+	
 	def __eq__(self, other):
-		if not isinstance(other, self.__class__):
+		if self is other:
+			return True
+		if other.__class__ is not self.__class__:
 			return False
-		return self.__dict__ == other.__dict__
-
+		h0: Optional[int] = getattr(self, "_hash", None)
+		h1: Optional[int] = getattr(other, "_hash", None)
+		if h0 is not None and h1 is not None and h0 != h1:
+			return False
+		return self._fields(self) == other._fields(other)
+	
 	def __repr__(self):
 		nm = self.__class__.__name__
-		return nm + "(" + ", ".join(f"{k}={v}" for k,v in self.__dict__.items()) + ")"
+		return nm + "(" + ", ".join(f"{k}={getattr(self, k)}" for k in self.__slots__) + ")"
 
 class Assign(Command):
+	__slots__ = ("offset", "value")
 	def __init__(self, offset: int, value: int):
 		self.offset = offset
 		self.value = value
 
 class Add(Command):
+	__slots__ = ("offset", "value")
 	def __init__(self, offset: int, value: int):
 		self.offset = offset
 		self.value = value
 
 class MultAssign(Command):
+	__slots__ = ("srcOff", "destOff", "value")
 	def __init__(self, srcOff: int, destOff: int, value: int):
 		self.srcOff = srcOff
 		self.destOff = destOff
 		self.value = value
 
 class MultAdd(Command):
+	__slots__ = ("srcOff", "destOff", "value")
 	def __init__(self, srcOff: int, destOff: int, value: int):
 		self.srcOff = srcOff
 		self.destOff = destOff
 		self.value = value
 
 class Right(Command):
+	__slots__ = ("offset",)
 	def __init__(self, offset: int):
 		self.offset = offset
 
 class Input(Command):
+	__slots__ = ("offset",)
 	def __init__(self, offset: int):
 		self.offset = offset
 
 class Output(Command):
+	__slots__ = ("offset",)
 	def __init__(self, offset: int):
 		self.offset = offset
 
 class Dbg(Command):
+	__slots__ = ("offset",)
 	def __init__(self, offset: int):
 		self.offset = offset
 
+# If and Loop test the cell at offset. Their bodies use offsets from p like everything
+# else, so a block that was reached with a pending pointer move needn't commit it.
 class If(Command):
-	def __init__(self, commands: List[Command]):
+	__slots__ = ("commands", "offset")
+	def __init__(self, commands: List[Command], offset: int = 0):
 		self.commands = commands
+		self.offset = offset
 
 class Loop(Command):
-	def __init__(self, commands: List[Command]):
+	__slots__ = ("commands", "offset")
+	def __init__(self, commands: List[Command], offset: int = 0):
+		self.commands = commands
+		self.offset = offset
+
+# A named part of the program, from a "{name ... }" label in the source. Only parsed
+# when profiling, so the report can attribute counts to the code that generated them.
+class Region(Command):
+	__slots__ = ("name", "commands")
+	def __init__(self, name: str, commands: List[Command]):
+		self.name = name
 		self.commands = commands
 
 class Glider(Command):
+	__slots__ = ("offset", "target")
 	def __init__(self, offset: int, target: int):
 		self.offset = offset
 		self.target = target
 
+# Nested loops [- [- ... [- [-] >k] ... >k] >k] with max_moves decrementing levels
+# around a clear, each moving offset cells after its inner loop. They walk the tape
+# counting the current cell down; see dec_move in the C output for the exact steps.
 class DecMove(Command):
+	__slots__ = ("offset", "max_moves")
 	def __init__(self, offset: int, max_moves: int):
 		self.offset = offset
 		self.max_moves = max_moves
 
 class MemMove(Command):
+	__slots__ = ("srcOff", "destOff", "mem_size")
 	def __init__(self, srcOff: int, destOff: int, mem_size: int):
 		self.srcOff = srcOff
 		self.destOff = destOff
 		self.mem_size = mem_size
 
+# The generator's per-unit loop "+c [ -c body >stride +c ] -c", with the marker at
+# offset: runs the balanced body on each unit in turn, starting at p, until a unit
+# whose marker is -bias. That marker gets bias added and p is left on its unit.
+# The first marker already has bias added, like the loop it came from.
+class UnitLoop(Command):
+	__slots__ = ("commands", "offset", "stride", "bias")
+	def __init__(self, commands: List[Command], offset: int, stride: int, bias: int):
+		self.commands = commands
+		self.offset = offset
+		self.stride = stride
+		self.bias = bias
+
+# Prints and clears cells in steps of offset, until reaching a cell that is -bias.
+# The first cell already has bias added; the stop cell gets bias added.
+class PrintRun(Command):
+	__slots__ = ("offset", "bias")
+	def __init__(self, offset: int, bias: int):
+		self.offset = offset
+		self.bias = bias
+
+# The loop from workspace.divmod_const: counts the cell at srcOff down to zero into
+# remOff, which is cleared with quotOff incremented whenever it reaches divisor, at
+# most the cell size. Both temps are zero afterwards if the loop ran at all.
+class DivMod(Command):
+	__slots__ = ("srcOff", "quotOff", "remOff", "tempOffs", "divisor")
+	def __init__(self, srcOff: int, quotOff: int, remOff: int, tempOffs: Tuple[int, int], divisor: int):
+		self.srcOff = srcOff
+		self.quotOff = quotOff
+		self.remOff = remOff
+		self.tempOffs = tempOffs
+		self.divisor = divisor
+
+# ---- Options ----
+
+# Code generation settings, set from --name=value command line flags.
+# tape: "static" for a fixed array, or "mmap" for a reserved region that is
+#   committed as it gets touched, with guard pages turning overflow into growth
+# tape_limit: bytes of address space reserved for an mmap tape (K/M/G suffixes)
+# out_buffer: bytes of output buffered before writing to stdout, which is also
+#   flushed at exit and on SIGINT/SIGTERM
+# flush_ms: a newline flushes the buffer if this long has passed since the last
+#   flush, so slow producers still show progress (always flushes on a terminal)
+# profile: path the C program writes loop/if/glider counts per labeled region to at exit
+# cell_bits: width of a tape cell, 8, 16 or 32; arithmetic wraps at that width
+# passes: optimization passes to run in order, see parse_passes
+# pass_stats: print the time and rewrites of each pass to stderr (a bare --pass-stats)
+# verify: run the program before and after the passes in the difftest interpreter
+#   and refuse to write output if they differ (turned off by a bare --no-verify)
+# checkpoints: let the C program save and resume its tape at the top of the last
+#   top-level loop, see checkpoint_helpers_c (a bare --checkpoints)
+# telemetry: milliseconds between the stats records the C program writes, see
+#   telemetry_helpers_c; 0 for none
+class Options:
+	def __init__(self, tape: str = "static", tape_limit: int = 1 << 34, out_buffer: int = 1 << 20, flush_ms: int = 100, profile: Optional[str] = None,
+			cell_bits: int = 8, passes: str = "gliders,decmoves,optimize*,dataflow,divmods,printruns,unitloops,memmoves", pass_stats: bool = False, verify: bool = True,
+			checkpoints: bool = False, telemetry: int = 0):
+		self.tape = tape
+		self.tape_limit = tape_limit
+		self.out_buffer = out_buffer
+		self.flush_ms = flush_ms
+		self.profile = profile
+		self.cell_bits = cell_bits
+		self.passes = passes
+		self.pass_stats = pass_stats
+		self.verify = verify
+		self.checkpoints = checkpoints
+		self.telemetry = telemetry
+
+
+TAPE_MODES: Tuple[str, ...] = ("static", "mmap")
+CELL_BITS: Tuple[int, ...] = (8, 16, 32)
+
+# The mask that wraps a value to a cell of the given width.
+def cell_mask(bits: int) -> int:
+	return (1 << bits) - 1
+
+# Splits the command line into Options and the remaining arguments, or returns an error message.
+def parse_options(args: Sequence[str]) -> Tuple[Options, List[str]] | str:
+	options = Options()
+	rest: List[str] = []
+	for arg in args:
+		if not arg.startswith("--"):
+			rest.append(arg)
+			continue
+		key, sep, value = arg[2 : ].partition("=")
+		if arg == "--pass-stats":
+			options.pass_stats = True
+			continue
+		if arg == "--no-verify":
+			options.verify = False
+			continue
+		if arg == "--checkpoints":
+			options.checkpoints = True
+			continue
+		if not sep:
+			return f"{arg}: Options take the form --name=value"
+		if key == "tape":
+			if value not in TAPE_MODES:
+				return f"{arg}: Tape must be one of {', '.join(TAPE_MODES)}"
+			options.tape = value
+		elif key in ("tape-limit", "out-buffer"):
+			m = re.fullmatch(r"(\d+)([KMG]?)", value)
+			if m is None or int(m.group(1)) == 0:
+				return f"{arg}: Expected a size like 512M or 16G"
+			size = int(m.group(1)) << {"": 0, "K": 10, "M": 20, "G": 30}[m.group(2)]
+			if key == "tape-limit":
+				options.tape_limit = size
+			else:
+				options.out_buffer = size
+		elif key == "cell-bits":
+			if value not in map(str, CELL_BITS):
+				return f"{arg}: Cell width must be one of {', '.join(map(str, CELL_BITS))}"
+			options.cell_bits = int(value)
+		elif key == "profile":
+			if not value:
+				return f"{arg}: Expected a path for the profile report"
+			options.profile = value
+		elif key == "passes":
+			passes = parse_passes(value)
+			if isinstance(passes, str):
+				return f"{arg}: {passes}"
+			options.passes = value
+		elif key == "flush-ms":
+			if not value.isdigit():
+				return f"{arg}: Expected a number of milliseconds"
+			options.flush_ms = int(value)
+		elif key == "telemetry":
+			if not value.isdigit():
+				return f"{arg}: Expected a number of milliseconds"
+			options.telemetry = int(value)
+		else:
+			return f"{arg}: Unknown option"
+	return options, rest
+
+
 # ---- Main ----
 
 def main(args: Sequence[str]) -> Optional[str]:
 	# Handle command-line arguments
+	parsed = parse_options(args)
+	if isinstance(parsed, str):
+		return parsed
+	options, args = parsed
 	if len(args) != 2:
-		return "Usage: python bfc.py BrainfuckFile OutputFile.c/java/py"
+		return "Usage: python bfc.py [--tape=static|mmap] [--tape-limit=SIZE] [--out-buffer=SIZE] [--flush-ms=N] [--profile=PATH] [--cell-bits=8|16|32] [--passes=a,b*,...] [--pass-stats] [--no-verify] [--checkpoints] [--telemetry=MS] BrainfuckFile OutputFile.c/java/py"
 	
 	inpath: pathlib.Path = pathlib.Path(args[0])
 	if not inpath.is_file():
 		return f"{inpath}: Not a file"
 	
 	outpath: pathlib.Path = pathlib.Path(args[1])
-	outfunc: Callable[[List[Command],str,bool,int], str]
+	outfunc: Callable[[List[Command],str,bool,int,Options], str]
 	if   outpath.suffix == ".c"   :  outfunc = commands_to_c
+	elif outpath.suffix == ".py"  :  outfunc = commands_to_py
 	else:  return f"{outpath}: Unknown output type"
 	
 	# Read input
@@ -115,16 +308,28 @@ def main(args: Sequence[str]) -> Optional[str]:
 		incode = fin.read()
 	
 	# Parse and optimize Brainfuck code
-	commands = parse(incode)
-	commands = optimize_gliders(commands)
-	# commands = optimize_decmoves(commands)
-	commands = optimize(commands)
-	commands = optimize(commands)
-	commands = optimize(commands)
-	commands = optimize_memmoves(commands)
+	parsed: List[Command] = parse(incode, options.profile is not None)
+	stats: Optional[PassStats] = PassStats() if options.pass_stats else None
+	commands = run_passes(parsed, options.passes, stats, cell_mask(options.cell_bits))
+	if stats is not None:
+		print(stats.report(), file=sys.stderr)
+	if options.verify:
+		try:
+			from c2bf.bf import difftest
+		except ModuleNotFoundError:  # run as a script, difftest is next to this file
+			import difftest
+		error: Optional[str] = difftest.check(parsed, commands, bits=options.cell_bits)
+		if error is not None:
+			return f"{inpath}: Optimized program differs from the original ({error}), rerun with --no-verify to keep it anyway"
+	
+	if (options.checkpoints or options.telemetry) and outfunc is not commands_to_c:
+		return f"{outpath}: Checkpoints and telemetry are only supported in C output"
+	if options.checkpoints:
+		if checkpoint_site(commands) is None:
+			return f"{inpath}: Checkpoints need a loop at the top level of the program"
 	
 	# Write output
-	outcode = outfunc(commands, outpath.stem)
+	outcode = outfunc(commands, outpath.stem, True, 1, options)
 	with outpath.open("wt") as fout:
 		fout.write(outcode)
 	return None
@@ -133,42 +338,59 @@ def main(args: Sequence[str]) -> Optional[str]:
 # ---- Parser ----
 
 # Parses the given raw code string, returning a list of Command objects.
-def parse(codestr: str) -> List[Command]:
-	codestr = re.sub(r"[^+\-<>.,\[\]@]", "", codestr)  # Keep only the 8 Brainfuck characters
-	return _parse(iter(codestr), True)
+# With labels, "{name" ... "}" become Regions, otherwise they are comments like any other text.
+# Equal commands and loops are interned, so repeated code is one shared subtree.
+def parse(codestr: str, labels: bool = False) -> List[Command]:
+	if labels:
+		tokens = re.findall(r"\{\w+|[+\-<>.,\[\]@}]", codestr)
+	else:
+		tokens = re.sub(r"[^+\-<>.,\[\]@]", "", codestr)  # Keep only the 8 Brainfuck characters
+	return _parse(iter(tokens), None, {})
+
 
+_PARSE_LEAVES: Dict[str, Command] = {
+	"+": Add(0, +1),
+	"-": Add(0, -1),
+	"<": Right(-1),
+	">": Right(+1),
+	",": Input (0),
+	".": Output(0),
+	"@": Dbg(0),
+}
 
-def _parse(chargen: Iterator[str], maincall: bool) -> List[Command]:
+
+# Parses tokens up to `closer` ("]" for a loop, "}" for a region, None at the top level).
+def _parse(chargen: Iterator[str], closer: Optional[str], interned: Dict[Command, Command]) -> List[Command]:
 	result: List[Command] = []
 	for c in chargen:
 		item: Command
-		if   c == "+": item = Add(0, +1)
-		elif c == "-": item = Add(0, -1)
-		elif c == "<": item = Right(-1)
-		elif c == ">": item = Right(+1)
-		elif c == ",": item = Input (0)
-		elif c == ".": item = Output(0)
-		elif c == "@": item = Dbg(0)
-		elif c == "[": item = Loop(_parse(chargen, False))
-		elif c == "]":
-			if maincall:
-				raise ValueError("Extra loop closing")
-			else:
-				return result
+		if c in _PARSE_LEAVES:
+			result.append(_PARSE_LEAVES[c])
+			continue
+		elif c == "[": item = Loop(_parse(chargen, "]", interned))
+		elif c[0] == "{": item = Region(c[1 : ], _parse(chargen, "}", interned))
+		elif c in "]}":
+			if c != closer:
+				raise ValueError("Extra loop closing" if c == "]" else "Region closed inside a loop")
+			return result
 		else:
 			raise AssertionError("Illegal code character")
-		result.append(item)
+		result.append(interned.setdefault(item, item))
 	
-	if maincall:
+	if closer is None:
 		return result
 	else:
-		raise ValueError("Unclosed loop")
+		raise ValueError("Unclosed loop" if closer == "]" else "Unclosed region")
 
 
 # ---- Optimizers ----
 
 # Optimizes the given list of Commands, returning a new list of Commands.
-def optimize(commands: List[Command]) -> List[Command]:
+# Loops that occur more than once are only optimized once, through `done`.
+# Like every pass it takes the mask of the cell width, which folded values wrap with.
+def optimize(commands: List[Command], mask: int = 0xFF, done: Optional[Dict[Command, List[Command]]] = None) -> List[Command]:
+	if done is None:
+		done = {}
 	result: List[Command] = []
 	offset: int = 0  # How much the memory pointer has moved without being updated
 	off: int
@@ -189,9 +411,9 @@ def optimize(commands: List[Command]) -> List[Command]:
 			off = cmd.offset + offset
 			prev = result[-1] if len(result) >= 1 else None
 			if isinstance(prev, Add) and prev.offset == off:
-				prev.value = (prev.value + cmd.value) & 0xFF
+				result[-1] = Add(off, (prev.value + cmd.value) & mask)
 			elif isinstance(prev, Assign) and prev.offset == off:
-				prev.value = (prev.value + cmd.value) & 0xFF
+				result[-1] = Assign(off, (prev.value + cmd.value) & mask)
 			else:
 				result.append(Add(off, cmd.value))
 		elif isinstance(cmd, MultAdd):
@@ -210,33 +432,56 @@ def optimize(commands: List[Command]) -> List[Command]:
 			result.append(Output(cmd.offset + offset))
 		elif isinstance(cmd, Dbg):
 			result.append(Dbg(cmd.offset + offset))
-		else:
-			# Commit the pointer movement before starting a loop/if
-			if offset != 0:
-				result.append(Right(offset))
-				offset = 0
-			
-			if isinstance(cmd, Loop):
-				temp0: Optional[List[Command]] = optimize_simple_loop(cmd.commands)
-				if temp0 is not None:
-					result.extend(temp0)
-				else:
-					temp1: Optional[If] = optimize_complex_loop(cmd.commands)
-					if temp1 is not None:
-						result.append(temp1)
+		elif isinstance(cmd, Loop | If | Region):
+			# Blocks are optimized as if the tested cell were at 0, then moved to where it
+			# really is, which keeps the pending pointer movement going through them
+			test: int = 0
+			block: Command = cmd
+			if isinstance(cmd, Loop | If) and cmd.offset != 0:
+				test = cmd.offset
+				body: Optional[List[Command]] = _shift(cmd.commands, -test)
+				if body is None:
+					# A later pass put something that can't be shifted inside, so the
+					# body steps back from the tested cell and onto it again instead
+					body = [Right(-test), *cmd.commands, Right(test)]
+				block = cmd.__class__(body)
+			if isinstance(block, Loop):
+				if block not in done:
+					temp0: Optional[List[Command]] = optimize_simple_loop(block.commands)
+					if temp0 is not None:
+						done[block] = temp0
 					else:
-						# result.append(Loop(optimize(cmd.commands)))
-						temp2: Optional[If] = optimize_if_loop(cmd.commands)
-						if temp2 is not None:
-							result.append(temp2)
+						temp1: Optional[If] = optimize_complex_loop(block.commands)
+						if temp1 is not None:
+							done[block] = [temp1]
 						else:
-							result.append(Loop(optimize(cmd.commands)))
-			elif isinstance(cmd, If):
-				result.append(If(optimize(cmd.commands)))
-			elif isinstance(cmd, Glider | DecMove):
-				result.append(cmd)
+							# done[block] = [Loop(optimize(block.commands, mask, done))]
+							temp2: Optional[If] = optimize_if_loop(block.commands)
+							if temp2 is not None:
+								done[block] = [temp2]
+							else:
+								done[block] = [Loop(optimize(block.commands, mask, done))]
+				optimized: List[Command] = done[block]
 			else:
-				raise AssertionError("Unknown command")
+				optimized = [_with_commands(block, optimize(block.commands, mask, done))]
+			shifted: Optional[List[Command]] = _shift(optimized, offset + test)
+			if shifted is None:
+				# Commit the pointer movement before a block that can't be shifted, up to
+				# its tested cell, and step back after it
+				if offset + test != 0:
+					result.append(Right(offset + test))
+				offset = -test
+				shifted = optimized
+			result.extend(shifted)
+		elif isinstance(cmd, Glider | DecMove | PrintRun | UnitLoop | DivMod | MemMove):
+			# Commit the pointer movement before a command that moves it by an unknown amount,
+			# or one a later pass made, which is passed through as it is
+			if offset != 0:
+				result.append(Right(offset))
+				offset = 0
+			result.append(cmd)
+		else:
+			raise AssertionError("Unknown command")
 	
 	# Commit the pointer movement before exiting this block
 	if offset != 0:
@@ -313,7 +558,7 @@ def optimize_complex_loop(commands: List[Command]) -> Optional[If]:
 
 
 def optimize_if_loop(commands: List[Command]) -> Optional[If]:
-	if not isinstance(commands[0], Assign) or commands[0].offset != 0 or commands[0].value != 0:
+	if len(commands) == 0 or not isinstance(commands[0], Assign) or commands[0].offset != 0 or commands[0].value != 0:
 		return None
 
 	result: List[Command] = [commands[0]]
@@ -336,6 +581,46 @@ def optimize_if_loop(commands: List[Command]) -> Optional[If]:
 
 
 
+# Returns the commands as they would be written if the pointer were `delta` cells
+# further left, so every offset grows by delta. Pointer moves stay as they are.
+# Commands that move the pointer to a place found at run time can't be shifted,
+# and give None.
+def _shift(commands: List[Command], delta: int) -> Optional[List[Command]]:
+	if delta == 0:
+		return commands
+	result: List[Command] = []
+	for cmd in commands:
+		if isinstance(cmd, Assign | Add):
+			result.append(cmd.__class__(cmd.offset + delta, cmd.value))
+		elif isinstance(cmd, MultAssign | MultAdd):
+			result.append(cmd.__class__(cmd.srcOff + delta, cmd.destOff + delta, cmd.value))
+		elif isinstance(cmd, Input | Output | Dbg):
+			result.append(cmd.__class__(cmd.offset + delta))
+		elif isinstance(cmd, DivMod):
+			t, f = cmd.tempOffs
+			result.append(DivMod(cmd.srcOff + delta, cmd.quotOff + delta, cmd.remOff + delta, (t + delta, f + delta), cmd.divisor))
+		elif isinstance(cmd, MemMove):
+			result.append(MemMove(cmd.srcOff + delta, cmd.destOff + delta, cmd.mem_size))
+		elif isinstance(cmd, Right):
+			result.append(cmd)
+		elif isinstance(cmd, Loop | If | Region):
+			body: Optional[List[Command]] = _shift(cmd.commands, delta)
+			if body is None:
+				return None
+			if isinstance(cmd, Region):
+				result.append(Region(cmd.name, body))
+			else:
+				result.append(cmd.__class__(body, cmd.offset + delta))
+		else:
+			return None
+	return result
+
+
+# Copies a block command (Loop, If, Region) with its body replaced.
+def _with_commands(cmd: Command, commands: List[Command]) -> Command:
+	return cmd.__class__(*(commands if k == "commands" else getattr(cmd, k) for k in cmd.__slots__))
+
+
 def extract_multiple(cmds: List[Command], index: int, cmd: Command) -> int:
 	count = 0
 	while index + count < len(cmds) and cmds[index + count] == cmd:
@@ -343,15 +628,22 @@ def extract_multiple(cmds: List[Command], index: int, cmd: Command) -> int:
 	return count
 
 
-def try_extract_glider(cmds: List[Command], index: int) -> Tuple[Optional[Glider], int]:
-	P, M = Add(0, 1), Add(0, -1)
-	RR, RL = Right(1), Right(-1)
+def try_extract_glider(cmds: List[Command], index: int, mask: int = 0xFF) -> Tuple[Optional[Glider], int]:
+	P, M = _PARSE_LEAVES["+"], _PARSE_LEAVES["-"]
+	RR, RL = _PARSE_LEAVES[">"], _PARSE_LEAVES["<"]
+
+	# a bare [>] or [<<] scan is a glide to a zero cell
+	loop = cmds[index]
+	if isinstance(loop, Loop) and loop.offset == 0 and len(loop.commands) > 0:
+		moves = extract_multiple(loop.commands, 0, RR) or -extract_multiple(loop.commands, 0, RL)
+		if abs(moves) == len(loop.commands):
+			return Glider(moves, 0), index + 1
 
 	p1_count = extract_multiple(cmds, index, P)
 	if p1_count == 0 or index + p1_count >= len(cmds): 
 		return None, index
 	loop = cmds[index + p1_count]
-	if not isinstance(loop, Loop): 
+	if not isinstance(loop, Loop) or loop.offset != 0:
 		return None, index
 	inner_cmds = loop.commands
 	m1_count = extract_multiple(inner_cmds, 0, M)
@@ -373,53 +665,70 @@ def try_extract_glider(cmds: List[Command], index: int) -> Tuple[Optional[Glider
 	if m2_count != p1_count:
 		return None, index
 	
-	gl = Glider(offset, 256 - p1_count)
+	gl = Glider(offset, -p1_count & mask)
 	return gl, index + p1_count + 1 + m2_count
 
-def optimize_gliders(commands: List[Command]) -> List[Command]:
+# Blocks that occur more than once are only rewritten once, through `done`.
+def optimize_gliders(commands: List[Command], mask: int = 0xFF, done: Optional[Dict[Command, Command]] = None) -> List[Command]:
+	if done is None:
+		done = {}
 	result: List[Command] = []
 	i = 0
 	while i < len(commands):
-		gl, new_i = try_extract_glider(commands, i)
+		gl, new_i = try_extract_glider(commands, i, mask)
 		if gl is not None:
 			result.append(gl)
 			i = new_i
 		elif hasattr(commands[i], "commands"):
-			result.append(type(commands[i])(optimize_gliders(commands[i].commands))) 
+			block: Command = commands[i]
+			if block not in done:
+				done[block] = _with_commands(block, optimize_gliders(block.commands, mask, done))
+			result.append(done[block])
 			i += 1
 		else:
 			result.append(commands[i])
 			i += 1
 	return result
 
+# Levels a nest needs before it becomes a DecMove; shallower ones are cheap as loops.
+# infinite_fib makes no such nests at any depth, the pass is for hand-written programs.
+DECMOVE_MIN_LEVELS: int = 4
+
+
+# Returns the total of the Right commands ending the list and how many there are.
+def _trailing_move(cmds: List[Command]) -> Tuple[int, int]:
+	total = count = 0
+	while count < len(cmds) and isinstance(cmds[-1 - count], Right):
+		total += cmds[-1 - count].offset # type: ignore
+		count += 1
+	return total, count
+
+
+# Matches both the parsed form (Add(0,-1), k single steps, [-] innermost) and
+# the optimized one (Right(k), Assign(0,0) innermost).
 def try_extract_decmove(cmds: List[Command], index: int) -> Tuple[Optional[DecMove], int]:
-	M = Add(0, -1)
-	R = Right(1)
 	loop = cmds[index]
-	exp_move_count = None
-
-	for j in range(255):
-		if not isinstance(loop, Loop):
-			return None, index
-		inner_cmds = loop.commands
-		if len(inner_cmds) < 3:
-			return None, index
-		if inner_cmds[0] != M:
+	step: Optional[int] = None
+	levels = 0
+	while True:
+		if not isinstance(loop, Loop) or loop.offset != 0:
 			return None, index
-		move_count = extract_multiple(inner_cmds, 2, R)
-		if exp_move_count is None:
-			exp_move_count = move_count
-		if move_count != exp_move_count:
+		body = loop.commands
+		if body == [_PARSE_LEAVES["-"]] or body == [Assign(0, 0)]:
+			break
+		move, count = _trailing_move(body)
+		if len(body) != count + 2 or body[0] != _PARSE_LEAVES["-"] or move == 0:
 			return None, index
-		if len(inner_cmds) - 2 != move_count:
+		if step is not None and move != step:
 			return None, index
-		loop = inner_cmds[1]
-		if isinstance(loop, Loop) and len(loop.commands) == 1 and loop.commands[0] == M and j > 20:
-			return DecMove(exp_move_count, j + 1), index + 1
-
-	return None, index
+		step = move
+		levels += 1
+		loop = body[1]
+	if step is None or levels < DECMOVE_MIN_LEVELS:
+		return None, index
+	return DecMove(step, levels), index + 1
 
-def optimize_decmoves(commands: List[Command]) -> List[Command]:
+def optimize_decmoves(commands: List[Command], mask: int = 0xFF) -> List[Command]:
 	result: List[Command] = []
 	i = 0
 	while i < len(commands):
@@ -428,7 +737,7 @@ def optimize_decmoves(commands: List[Command]) -> List[Command]:
 			result.append(dm)
 			i = new_i
 		elif hasattr(commands[i], "commands"):
-			result.append(type(commands[i])(optimize_decmoves(commands[i].commands)))
+			result.append(_with_commands(commands[i], optimize_decmoves(commands[i].commands, mask)))
 			i += 1
 		else:
 			result.append(commands[i])
@@ -482,7 +791,7 @@ def try_extract_memmoves(cmds: List[Command], index: int) -> Tuple[Optional[DecM
 		return MemMove(src_offset, dest_offset, move_size), index
 	return None, o_index
 
-def optimize_memmoves(commands: List[Command]) -> List[Command]:
+def optimize_memmoves(commands: List[Command], mask: int = 0xFF) -> List[Command]:
 	result: List[Command] = []
 	i = 0
 	while i < len(commands):
@@ -491,58 +800,485 @@ def optimize_memmoves(commands: List[Command]) -> List[Command]:
 			result.append(dm)
 			i = new_i
 		elif hasattr(commands[i], "commands"):
-			result.append(type(commands[i])(optimize_memmoves(commands[i].commands)))
+			result.append(_with_commands(commands[i], optimize_memmoves(commands[i].commands, mask)))
+			i += 1
+		else:
+			result.append(commands[i])
+			i += 1
+	return result
+
+# Matches a loop that prints the current cell, clears it and moves on, optionally
+# biasing the next cell so the run ends at a marker value instead of zero:
+# [ Add(0,-c) Output(0) Assign(0,0) Add(k,c) Right(k) ] or [ Output(0) Assign(0,0) Right(k) ]
+# A loop testing another cell than p is matched with its body shifted back to 0.
+def try_extract_printrun(cmds: List[Command], index: int, mask: int = 0xFF) -> Tuple[Optional[PrintRun], int]:
+	loop = cmds[index]
+	if not isinstance(loop, Loop):
+		return None, index
+	body = _shift(loop.commands, -loop.offset)
+	if body is None:
+		return None, index
+	bias = 0
+	if len(body) == 5 and isinstance(body[0], Add) and isinstance(body[3], Add):
+		bias = body[3].value & mask
+		if bias == 0 or body[0].offset != 0 or (body[0].value + bias) & mask != 0:
+			return None, index
+		if not isinstance(body[4], Right) or body[3].offset != body[4].offset:
+			return None, index
+		body = body[1 : 3] + body[4 : ]
+	if len(body) != 3 or body[0] != Output(0) or body[1] != Assign(0, 0):
+		return None, index
+	if not isinstance(body[2], Right) or body[2].offset == 0:
+		return None, index
+	return PrintRun(body[2].offset, bias), index + 1
+
+def optimize_printruns(commands: List[Command], mask: int = 0xFF) -> List[Command]:
+	result: List[Command] = []
+	i = 0
+	while i < len(commands):
+		pr, new_i = try_extract_printrun(commands, i, mask)
+		if pr is not None:
+			# A print run starts at the pointer, so a loop on another cell needs a move there and back
+			test: int = commands[i].offset # type: ignore
+			if test != 0:
+				result.append(Right(test))
+			result.append(pr)
+			if test != 0:
+				result.append(Right(-test))
+			i = new_i
+		elif hasattr(commands[i], "commands"):
+			result.append(_with_commands(commands[i], optimize_printruns(commands[i].commands, mask)))
 			i += 1
 		else:
 			result.append(commands[i])
 			i += 1
 	return result
 
+# Matches Loop(m)[ Add(m,-c) body Add(m+s,c) Right(s) ] with a nonempty body
+# that leaves the pointer where it found it. An empty body is a glider's job.
+def try_extract_unitloop(cmds: List[Command], index: int, mask: int = 0xFF) -> Optional[UnitLoop]:
+	loop = cmds[index]
+	if not isinstance(loop, Loop) or len(loop.commands) < 4:
+		return None
+	first, body, bump, move = loop.commands[0], loop.commands[1 : -2], loop.commands[-2], loop.commands[-1]
+	if not isinstance(first, Add) or not isinstance(bump, Add) or not isinstance(move, Right):
+		return None
+	bias: int = bump.value & mask
+	if bias == 0 or first.offset != loop.offset or (first.value + bias) & mask != 0:
+		return None
+	if bump.offset != loop.offset + move.offset:
+		return None
+	effects = _effects(body)
+	if effects is None or effects[1] != 0 or _shift(body, 1) is None:
+		return None
+	return UnitLoop(body, loop.offset, move.offset, bias)
+
+def optimize_unitloops(commands: List[Command], mask: int = 0xFF) -> List[Command]:
+	result: List[Command] = []
+	for cmd in commands:
+		ul: Optional[UnitLoop] = try_extract_unitloop([cmd], 0, mask)
+		if ul is not None:
+			cmd = ul
+		if hasattr(cmd, "commands"):
+			cmd = _with_commands(cmd, optimize_unitloops(cmd.commands, mask))
+		result.append(cmd)
+	return result
+
+# A cell's value after straight-line code, as a constant plus factors of the values
+# cells had before it: (c, {off: f}) is c + sum(f * mem[off]).
+type Linear = Tuple[int, Dict[int, int]]
+
+# Returns the value of every cell the commands write, or None if they aren't all
+# Add, Assign, MultAdd or MultAssign.
+def _linear(commands: List[Command], mask: int) -> Optional[Dict[int, Linear]]:
+	values: Dict[int, Linear] = {}
+	def value(off: int) -> Linear:
+		return values.get(off, (0, {off: 1}))
+	for cmd in commands:
+		if isinstance(cmd, Assign):
+			values[cmd.offset] = (cmd.value & mask, {})
+		elif isinstance(cmd, Add):
+			const, factors = value(cmd.offset)
+			values[cmd.offset] = ((const + cmd.value) & mask, factors)
+		elif isinstance(cmd, MultAssign | MultAdd):
+			const, factors = value(cmd.srcOff)
+			const, factors = const * cmd.value, {off: f * cmd.value for (off, f) in factors.items()}
+			if isinstance(cmd, MultAdd):
+				old_const, old_factors = value(cmd.destOff)
+				const += old_const
+				factors = {off: old_factors.get(off, 0) + factors.get(off, 0) for off in old_factors.keys() | factors.keys()}
+			values[cmd.destOff] = (const & mask, {off: f & mask for (off, f) in factors.items() if f & mask != 0})
+		else:
+			return None
+	return values
+
+# Matches the loop from workspace.divmod_const in whatever order the earlier passes
+# left its stores: Loop(s)[ code setting s to s-1, r to r+1, t to r+1-k and f to 1,
+# If(t)[ t = 0 f = 0 ] If(f)[ f = 0 r = 0 q += 1 ] ], that is, one step of r
+# counting up to k, with t tested to see whether it got there.
+def try_extract_divmod(cmds: List[Command], index: int, mask: int = 0xFF) -> Optional[DivMod]:
+	loop = cmds[index]
+	if not isinstance(loop, Loop) or len(loop.commands) < 3:
+		return None
+	test, found = loop.commands[-2], loop.commands[-1]
+	if not isinstance(test, If) or not isinstance(found, If):
+		return None
+	step = _linear(loop.commands[ : -2], mask)
+	cleared = _linear(test.commands, mask)
+	bumped = _linear(found.commands, mask)
+	if step is None or cleared is None or bumped is None:
+		return None
+	s, t, f = loop.offset, test.offset, found.offset
+	if cleared != {t: (0, {}), f: (0, {})} or len(bumped) != 3 or bumped.get(f) != (0, {}):
+		return None
+	q = next((off for (off, v) in bumped.items() if v == (1, {off: 1})), None)
+	r = next((off for (off, v) in bumped.items() if v == (0, {}) and off != f), None)
+	if q is None or r is None or len({s, r, q, t, f}) != 5:
+		return None
+	k = (1 - step.get(t, (0, {}))[0]) & mask
+	if step != {s: (mask, {s: 1}), r: (1, {r: 1}), t: ((1 - k) & mask, {r: 1}), f: (1, {})}:
+		return None
+	# r reaching 0 again is a divisor of the cell size, an add with carry
+	return DivMod(s, q, r, (t, f), k or mask + 1)
+
+def optimize_divmods(commands: List[Command], mask: int = 0xFF) -> List[Command]:
+	result: List[Command] = []
+	for cmd in commands:
+		dm: Optional[DivMod] = try_extract_divmod([cmd], 0, mask)
+		if dm is not None:
+			cmd = dm
+		elif hasattr(cmd, "commands"):
+			cmd = _with_commands(cmd, optimize_divmods(cmd.commands, mask))
+		result.append(cmd)
+	return result
+
+
+# ---- Dataflow ----
+
+# Cells with a known value, by offset from the current pointer.
+type Known = Dict[int, int]
+
+
+# Returns the cells the commands may write and how far they move the pointer,
+# both relative to the pointer at the start, or None if either depends on run
+# time data (a loop or if with an unbalanced body, a glider and so on).
+def _effects(commands: List[Command]) -> Optional[Tuple[Set[int], int]]:
+	writes: Set[int] = set()
+	pos: int = 0
+	for cmd in commands:
+		if isinstance(cmd, Assign | Add | Input):
+			writes.add(pos + cmd.offset)
+		elif isinstance(cmd, MultAssign | MultAdd):
+			writes.add(pos + cmd.destOff)
+		elif isinstance(cmd, DivMod):
+			writes.update(pos + off for off in (cmd.srcOff, cmd.quotOff, cmd.remOff, *cmd.tempOffs))
+		elif isinstance(cmd, Right):
+			pos += cmd.offset
+		elif isinstance(cmd, Output | Dbg):
+			pass
+		elif isinstance(cmd, Loop | If | Region):
+			inner: Optional[Tuple[Set[int], int]] = _effects(cmd.commands)
+			if inner is None or (inner[1] != 0 and not isinstance(cmd, Region)):
+				return None
+			writes.update(pos + off for off in inner[0])
+			pos += inner[1]
+		else:
+			return None
+	return writes, pos
+
+
+# Forward pass: follows known cell values through straight-line code, into if
+# bodies and past loops, whose test cell is zero once they exit. Assignments of
+# the value a cell already has go, so do blocks testing a cell known to be zero,
+# and an if on a cell known to be nonzero becomes its body. Returns the new
+# commands and what is known at their end.
+def _propagate(commands: List[Command], known: Known, mask: int) -> Tuple[List[Command], Known]:
+	result: List[Command] = []
+	known = dict(known)
+	for cmd in commands:
+		if isinstance(cmd, Assign):
+			if known.get(cmd.offset) != cmd.value:
+				result.append(cmd)
+				known[cmd.offset] = cmd.value
+		elif isinstance(cmd, Add):
+			if cmd.value & mask == 0:
+				pass
+			elif cmd.offset in known:
+				# Becomes a store, which can make an earlier store to the cell dead
+				known[cmd.offset] = (known[cmd.offset] + cmd.value) & mask
+				result.append(Assign(cmd.offset, known[cmd.offset]))
+			else:
+				result.append(cmd)
+		elif isinstance(cmd, MultAssign | MultAdd):
+			src: Optional[int] = known.get(cmd.srcOff)
+			if isinstance(cmd, MultAdd) and src is None and known.get(cmd.destOff) == 0:
+				result.append(MultAssign(cmd.srcOff, cmd.destOff, cmd.value))
+				known.pop(cmd.destOff)
+			elif src is not None:
+				# The multiply has a known source, so it is really an Assign or Add
+				value: int = (src * cmd.value) & mask
+				folded: Command = Assign(cmd.destOff, value) if isinstance(cmd, MultAssign) else Add(cmd.destOff, value)
+				folded_result, known = _propagate([folded], known, mask)
+				result.extend(folded_result)
+			else:
+				result.append(cmd)
+				known.pop(cmd.destOff, None)
+		elif isinstance(cmd, Right):
+			result.append(cmd)
+			known = {off - cmd.offset: val for (off, val) in known.items()}
+		elif isinstance(cmd, Input):
+			result.append(cmd)
+			known.pop(cmd.offset, None)
+		elif isinstance(cmd, Output | Dbg):
+			result.append(cmd)
+		elif isinstance(cmd, If):
+			test: Optional[int] = known.get(cmd.offset)
+			if test == 0:
+				continue
+			body, body_known = _propagate(cmd.commands, known, mask)
+			if test is not None:
+				result.extend(body)
+				known = body_known
+				continue
+			result.append(If(body, cmd.offset))
+			effects = _effects(body)
+			skipped: Known = {**known, cmd.offset: 0}
+			if effects is None or effects[1] != 0:
+				known = {}
+			else:
+				known = {off: val for (off, val) in skipped.items() if body_known.get(off) == val}
+		elif isinstance(cmd, Loop):
+			if known.get(cmd.offset) == 0:
+				continue
+			effects = _effects(cmd.commands)
+			if effects is None or effects[1] != 0:
+				body, _ = _propagate(cmd.commands, {}, mask)
+				known = {}
+			else:
+				# Cells the body never writes keep their values through every iteration
+				known = {off: val for (off, val) in known.items() if off not in effects[0]}
+				body, _ = _propagate(cmd.commands, known, mask)
+			result.append(Loop(body, cmd.offset))
+			known[cmd.offset] = 0
+		elif isinstance(cmd, Region):
+			body, known = _propagate(cmd.commands, known, mask)
+			result.append(Region(cmd.name, body))
+		elif isinstance(cmd, DivMod):
+			if known.get(cmd.srcOff) == 0:
+				continue
+			result.append(cmd)
+			for off in (cmd.quotOff, cmd.remOff, *cmd.tempOffs):
+				known.pop(off, None)
+			known[cmd.srcOff] = 0
+		else:
+			result.append(cmd)
+			known = {0: cmd.target} if isinstance(cmd, Glider) else {}
+	return result, known
+
+
+# Backward pass: drops writes to cells that are overwritten before anything reads
+# them. Only straight-line code is looked at; blocks and the end of a block count
+# as reading everything.
+def _drop_dead_stores(commands: List[Command]) -> List[Command]:
+	result: List[Command] = []
+	dead: Set[int] = set()  # Cells that are written before being read, from here on
+	for cmd in reversed(commands):
+		if isinstance(cmd, Assign):
+			if cmd.offset in dead:
+				continue
+			dead.add(cmd.offset)
+		elif isinstance(cmd, Add):
+			if cmd.offset in dead:
+				continue
+		elif isinstance(cmd, MultAssign | MultAdd):
+			if cmd.destOff in dead:
+				continue
+			if isinstance(cmd, MultAssign):
+				dead.add(cmd.destOff)
+			dead.discard(cmd.srcOff)
+		elif isinstance(cmd, Right):
+			dead = {off + cmd.offset for off in dead}
+		elif isinstance(cmd, Input):
+			dead.add(cmd.offset)
+		elif isinstance(cmd, Output):
+			dead.discard(cmd.offset)
+		elif hasattr(cmd, "commands"):
+			cmd = _with_commands(cmd, _drop_dead_stores(cmd.commands))
+			dead = set()
+		else:
+			dead = set()
+		result.append(cmd)
+	result.reverse()
+	return result
+
+
+def optimize_dataflow(commands: List[Command], mask: int = 0xFF) -> List[Command]:
+	return _drop_dead_stores(_propagate(commands, {}, mask)[0])
+
+
+# ---- Pass manager ----
+
+# The optimization passes that --passes can name, each called with the commands and the cell mask.
+PASSES: Dict[str, Callable[[List[Command], int], List[Command]]] = {
+	"gliders": optimize_gliders,
+	"decmoves": optimize_decmoves,
+	"optimize": optimize,
+	"dataflow": optimize_dataflow,
+	"divmods": optimize_divmods,
+	"unitloops": optimize_unitloops,
+	"printruns": optimize_printruns,
+	"memmoves": optimize_memmoves,
+}
+
+# A pass is repeated at most this many times when running to a fixed point.
+MAX_ROUNDS: int = 16
+
+
+# Parses a comma-separated list of pass names. A name ending in "*" is run
+# until the IR stops changing. Returns [(name, fixed)] or an error message.
+def parse_passes(spec: str) -> List[Tuple[str, bool]] | str:
+	result: List[Tuple[str, bool]] = []
+	for item in spec.split(","):
+		name: str = item.removesuffix("*")
+		if name not in PASSES:
+			return f"Unknown pass {item!r}, expected one of {', '.join(PASSES)}"
+		result.append((name, item.endswith("*")))
+	return result
+
+
+# Wall time, rounds and rewrites of each pass over one run_passes call. A rewrite
+# is a node in the output of a round that was nowhere in its input.
+class PassStats:
+	def __init__(self):
+		self.seconds: Dict[str, float] = {}
+		self.rounds: Dict[str, int] = {}
+		self.rewrites: Dict[str, int] = {}
+	
+	def add(self, name: str, seconds: float, before: List[Command], after: List[Command]) -> None:
+		self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+		self.rounds[name] = self.rounds.get(name, 0) + 1
+		self.rewrites[name] = self.rewrites.get(name, 0) + len(_subtrees(after) - _subtrees(before))
+	
+	def report(self) -> str:
+		lines: List[str] = [f"{'pass':<12} {'rounds':>6} {'rewrites':>9} {'ms':>9}"]
+		for name in self.seconds:
+			lines.append(f"{name:<12} {self.rounds[name]:6} {self.rewrites[name]:9} {self.seconds[name] * 1000:9.2f}")
+		return "\n".join(lines)
+
+
+# Every distinct node in the given commands, including inside blocks.
+def _subtrees(commands: List[Command]) -> Set[Command]:
+	result: Set[Command] = set()
+	stack: List[List[Command]] = [commands]
+	while stack:
+		for cmd in stack.pop():
+			if cmd not in result:
+				result.add(cmd)
+				if hasattr(cmd, "commands"):
+					stack.append(cmd.commands)
+	return result
+
+
+# Runs the passes from the given spec (see parse_passes) over the commands. A pass
+# marked with "*" is rerun until a round gives back the same IR, compared by
+# structural hash, so a rerun that changes nothing is the only one wasted.
+def run_passes(commands: List[Command], spec: str, stats: Optional[PassStats] = None, mask: int = 0xFF) -> List[Command]:
+	passes = parse_passes(spec)
+	if isinstance(passes, str):
+		raise ValueError(passes)
+	for name, fixed in passes:
+		label: str = name + "*" if fixed else name
+		for _ in range(MAX_ROUNDS if fixed else 1):
+			start: float = time.perf_counter()
+			result: List[Command] = PASSES[name](commands, mask)
+			if stats is not None:
+				stats.add(label, time.perf_counter() - start, commands, result)
+			done: bool = hash(tuple(result)) == hash(tuple(commands)) and result == commands
+			commands = result
+			if done:
+				break
+	return commands
+
 # ---- Output formatters ----
 
-def commands_to_c(commands: List[Command], name: str, maincall: bool = True, indentlevel: int = 1) -> str:
+def commands_to_c(commands: List[Command], name: str, maincall: bool = True, indentlevel: int = 1, options: Options = Options(), profile: Optional["ProfileSites"] = None) -> str:
 	def indent(line: str, level: int = indentlevel) -> str:
 		return "\t" * level + line + "\n"
 	def indent1(line: str) -> str:
 		return indent(line, indentlevel + 1)
 	
+	tape_end: str = "mem + TAPE_LIMIT / sizeof(cell)" if options.tape == "mmap" else "mem + TAPE_SIZE"
+	# memchr and friends only work on byte cells
+	bytecells: bool = options.cell_bits == 8
+	# With telemetry the furthest cell is noted wherever p can stop a data dependent
+	# distance to the right, which with the constant moves around it bounds the tape used
+	reach: str = "if (p > tele_far) tele_far = p;"
 	result: str = ""
 	if maincall:
-		result += indent("#include <stdint.h>", 0)
-		result += indent("#include <stdio.h>", 0)
-		result += indent("#include <stdlib.h>", 0)
-		result += indent("#include <string.h>", 0)
-		result += indent("", 0)
-		result += indent("static uint8_t read() {", 0)
-		result += indent("int temp = getchar();", 1)
-		result += indent("return (uint8_t)(temp != EOF ? temp : 0);", 1)
-		result += indent("}", 0)
-		result += indent("", 0)
-		result += indent("static int BLOCK_SIZE = 9;", 0)
-		result += indent("static int dbg_count = 100000;", 0)
-		result += indent("static void dbg(uint8_t mem[], uint8_t *p) {", 0)
-		result += indent("printf(\"\\nDBG OUTPUT:\\n\");", 1)
-		result += indent("int i, j;", 1)
-		result += indent("for (i = 1000; i < 1100; i += BLOCK_SIZE) {", 1)
-		result += indent("for (j = 0; j < BLOCK_SIZE; j++) {", 2)
-		result += indent("if (p == &mem[i + j])", 3)
-		result += indent("printf(\"*%3d \", mem[i + j]);", 4)
-		result += indent("else", 3)
-		result += indent("printf(\" %3d \", mem[i + j]);", 4)
-		result += indent("}", 2)
-		result += indent("printf(\"\\n\");", 2)
-		result += indent("}", 1)
-		result += indent("if (--dbg_count == 0)", 1)
-		result += indent("exit(0);", 2)
-		result += indent("}", 0)
-		result += indent("int main(void) {", 0)
-		result += indent("uint8_t mem[1000000] = {0};")
-		result += indent("uint8_t *p = &mem[1000];")
-		result += indent("uint8_t dm;")
+		# The body goes first so the profiler knows every site before the prelude is written
+		profile = ProfileSites() if options.profile is not None else None
+		site: Optional[int] = checkpoint_site(commands) if options.checkpoints else None
+		if site is None:
+			body: str = commands_to_c(commands, name, False, indentlevel, options, profile)
+		else:
+			# Each iteration of the checkpointed loop starts by saving if a checkpoint is due,
+			# and a resumed run jumps in right after that
+			loop: Command = commands[site]
+			assert isinstance(loop, Loop)
+			body = commands_to_c(commands[ : site], name, False, indentlevel, options, profile)
+			body += indent("while (*p) {" if loop.offset == 0 else f"while (p[{loop.offset}]) {{")
+			if profile is not None:
+				body += indent1(f"prof_counts[{profile.site('loop')}]++;")
+			body += indent1("if (++ckpt_terms == ckpt_next || ckpt_pending)")
+			body += indent("ckpt_save(mem, p);", indentlevel + 2)
+			body += indent("ckpt_resume:;", 0)
+			body += commands_to_c(loop.commands, name, False, indentlevel + 1, options, profile)
+			body += indent("}")
+			body += commands_to_c(commands[site + 1 : ], name, False, indentlevel, options, profile)
+		
+		result += c_prelude(options, profile, ["sys/mman.h", "fcntl.h", "sys/stat.h"] if site is not None else [])
+		if site is not None:
+			program: int = int(hashlib.sha256(body.encode()).hexdigest()[ : 16], 16)
+			result += checkpoint_helpers_c(options.tape, program)
+			result += indent("", 0)
+		if options.telemetry:
+			result += telemetry_helpers_c(options.telemetry)
+			result += indent("", 0)
+		result += indent("int main(int argc, char **argv) {", 0)
+		if options.tape == "mmap":
+			result += indent("cell *mem = (cell *)tape_open(TAPE_LIMIT);")
+		else:
+			result += indent("static cell mem[TAPE_SIZE];")
+		result += indent("cell *p = &mem[1000];")
+		if profile is not None:
+			result += indent("cell *prof_start;")
+		result += indent("out_init(argc, argv);")
+		if options.telemetry:
+			result += indent("tele_init(argc, argv, mem);")
+		if profile is not None:
+			result += indent("atexit(prof_report);")
+		if site is not None:
+			result += indent("if (ckpt_init(argc, argv, mem, &p))")
+			result += indent1("goto ckpt_resume;")
+		result += indent("")
+		result += body
 		result += indent("")
+		result += indent("out_flush();")
+		result += indent("return EXIT_SUCCESS;")
+		result += indent("}", 0)
+		return result
 	
-	for cmd in commands:
-		if isinstance(cmd, Assign):
+	for cmd in assign_runs(commands):
+		if isinstance(cmd, list):
+			# A long run of constant stores, like a large number laid out on the tape, is a
+			# table and a loop so the C compiler doesn't have to chew through every statement
+			result += indent("{")
+			result += indent1(f"static const int offsets[{len(cmd)}] = {{{', '.join(str(c.offset) for c in cmd)}}};")
+			result += indent1(f"static const cell values[{len(cmd)}] = {{{', '.join(f'{c.value}u' for c in cmd)}}};")
+			result += indent1(f"for (int i = 0; i < {len(cmd)}; i++)")
+			result += indent("p[offsets[i]] = values[i];", indentlevel + 2)
+			result += indent("}")
+		elif isinstance(cmd, Assign):
 			result += indent(f"p[{cmd.offset}] = {cmd.value}u;")
 		elif isinstance(cmd, Add):
 			s: str = f"p[{cmd.offset}]"
@@ -571,47 +1307,1021 @@ def commands_to_c(commands: List[Command], name: str, maincall: bool = True, ind
 			else:
 				result += indent(f"p {plusminus(cmd.offset)}= {abs(cmd.offset)};")
 		elif isinstance(cmd, Input):
-			result += indent(f"p[{cmd.offset}] = read();")
+			result += indent(f"p[{cmd.offset}] = bf_read();")
 		elif isinstance(cmd, Output):
-			result += indent(f"putchar(p[{cmd.offset}]);")
+			result += indent(f"bf_putchar(p[{cmd.offset}]);")
 		elif isinstance(cmd, Dbg):
 			result += indent(f"dbg(mem, &p[{cmd.offset}]);")
 		elif isinstance(cmd, If):
-			result += indent("if (*p) {")
-			result += commands_to_c(cmd.commands, name, False, indentlevel + 1)
+			result += indent("if (*p) {" if cmd.offset == 0 else f"if (p[{cmd.offset}]) {{")
+			if profile is not None:
+				result += indent1(f"prof_counts[{profile.site('if')}]++;")
+			result += commands_to_c(cmd.commands, name, False, indentlevel + 1, options, profile)
 			result += indent("}")
 		elif isinstance(cmd, Loop):
-			result += indent("while (*p) {")
-			result += commands_to_c(cmd.commands, name, False, indentlevel + 1)
+			result += indent("while (*p) {" if cmd.offset == 0 else f"while (p[{cmd.offset}]) {{")
+			if profile is not None:
+				result += indent1(f"prof_counts[{profile.site('loop')}]++;")
+			result += commands_to_c(cmd.commands, name, False, indentlevel + 1, options, profile)
+			result += indent("}")
+			if options.telemetry:
+				effects: Optional[Tuple[Set[int], int]] = _effects(cmd.commands)
+				if effects is None or effects[1] != 0:
+					result += indent(reach)
+		elif isinstance(cmd, UnitLoop):
+			# Counted loop over units from a restrict base, with p rebound per unit for the
+			# body; markers in between are only tested, never changed and changed back
+			m, stride, bias = cmd.offset, cmd.stride, cmd.bias
+			result += indent(f"if (p[{m}]) {{")
+			result += indent1(f"p[{m}] -= {bias}u;")
+			result += indent1("cell *restrict units = p;")
+			result += indent1("ptrdiff_t n = 0;")
+			result += indent1("do {")
+			result += indent(f"cell *p = units + n * {stride};", indentlevel + 2)
+			if profile is not None:
+				result += indent(f"prof_counts[{profile.site('loop')}]++;", indentlevel + 2)
+			result += commands_to_c(cmd.commands, name, False, indentlevel + 2, options, profile)
+			result += indent("n++;", indentlevel + 2)
+			result += indent1(f"}} while ((cell)(units[n * {stride} + {m}] + {bias}u) != 0);")
+			result += indent1(f"p = units + n * {stride};")
+			result += indent1(f"p[{m}] += {bias}u;")
+			if options.telemetry:
+				result += indent1(reach)
 			result += indent("}")
+		elif isinstance(cmd, Region):
+			result += indent(f"// {cmd.name}")
+			if profile is not None:
+				parent: int = profile.enter(cmd.name)
+			result += commands_to_c(cmd.commands, name, False, indentlevel, options, profile)
+			if profile is not None:
+				profile.leave(parent)
 		elif isinstance(cmd, Glider):
-			result += indent(f"while (*p != {cmd.target}) {{")
-			result += commands_to_c([Right(cmd.offset)], name, False, indentlevel + 1)
+			# Most glides in generated code only go a unit or two, so the first step is taken
+			# inline and only longer scans go to memchr/memrchr or the unrolled helpers
+			step: int = abs(cmd.offset)
+			if profile is not None:
+				result += indent("prof_start = p;")
+			result += indent(f"if (*p != {cmd.target}) {{")
+			if options.telemetry:
+				result += indent1("cell *tele_from = p;")
+			result += indent1(f"p {plusminus(cmd.offset)}= {step};")
+			result += indent1(f"if (*p != {cmd.target}) {{")
+			if cmd.offset == 1 and bytecells:
+				result += indent(f"p = memchr(p, {cmd.target}, {tape_end} - p);", indentlevel + 2)
+			elif cmd.offset == -1 and bytecells:
+				result += indent(f"p = memrchr(mem, {cmd.target}, p - mem + 1);", indentlevel + 2)
+			elif cmd.offset > 0:
+				result += indent(f"p = glide_f(p, {cmd.target}, {step}, {tape_end});", indentlevel + 2)
+			else:
+				result += indent(f"p = glide_b(p, {cmd.target}, {step}, mem);", indentlevel + 2)
+			result += indent("if (p == NULL)", indentlevel + 2)
+			result += indent(f"tape_overrun(\"tape {'overflow' if cmd.offset > 0 else 'underflow'}\\n\");", indentlevel + 3)
+			result += indent1("}")
+			if options.telemetry and cmd.offset > 0:
+				result += indent1("tele_glide += (uint64_t)(p - tele_from);")
+				result += indent1(reach)
+			elif options.telemetry:
+				result += indent1("tele_glide += (uint64_t)(tele_from - p);")
 			result += indent("}")
+			if profile is not None:
+				result += indent(f"prof_counts[{profile.site('glide')}] += (size_t)(p > prof_start ? p - prof_start : prof_start - p) / {step};")
 		elif isinstance(cmd, DecMove):
-			if cmd.max_moves < 255:
-				result += indent(f"dm = *p < {cmd.max_moves} ? *p : {cmd.max_moves};")
-				result += indent("*p -= dm;")
-				result += indent(f"p += {cmd.offset} * dm;")
+			result += indent(f"p = dec_move(p, {cmd.offset}, {cmd.max_moves});")
+			if options.telemetry and cmd.offset > 0:
+				result += indent(reach)
+		elif isinstance(cmd, PrintRun):
+			if cmd.offset == 1 and bytecells:
+				call = f"print_run_f(p, {cmd.bias}u, {tape_end})"
+			elif cmd.offset == -1 and bytecells:
+				call = f"print_run_b(p, {cmd.bias}u, mem)"
+			else:
+				call = f"print_run(p, {cmd.offset}, {cmd.bias}u)"
+			if options.telemetry and cmd.offset > 0:
+				result += indent("if (*p) {")
+				result += indent1(f"p = {call};")
+				result += indent1(reach)
+				result += indent("}")
 			else:
-				result += indent(f"dm = *p;")
-				result += indent("*p = 0;")
-				result += indent(f"p += {cmd.offset} * dm;")
+				result += indent("if (*p)")
+				result += indent1(f"p = {call};")
 		elif isinstance(cmd, MemMove):
-			result += indent(f"memmove(p {plusminus(cmd.destOff)} {abs(cmd.destOff)}, p {plusminus(cmd.srcOff)} {abs(cmd.srcOff)}, {cmd.mem_size});")
+			result += indent(f"memmove(p {plusminus(cmd.destOff)} {abs(cmd.destOff)}, p {plusminus(cmd.srcOff)} {abs(cmd.srcOff)}, {cmd.mem_size} * sizeof(cell));")
 			set_zero_range = sorted(set(range(cmd.srcOff, cmd.srcOff + cmd.mem_size)) - set(range(cmd.destOff, cmd.destOff + cmd.mem_size)))
 			for x in set_zero_range:
 				result += indent(f"p[{x}] = 0;")
+		elif isinstance(cmd, DivMod):
+			# The whole count at once: r first reaches the divisor after dm_first steps,
+			# which may be a full wrap if it started above it, and again every k steps
+			s, q, r, k = cmd.srcOff, cmd.quotOff, cmd.remOff, cmd.divisor
+			result += indent(f"if (p[{s}]) {{")
+			result += indent1(f"uint64_t dm_n = p[{s}], dm_first = (cell)({k - 1}u - p[{r}]) + (uint64_t)1;")
+			result += indent1("if (dm_n < dm_first) {")
+			result += indent(f"p[{r}] += (cell)dm_n;", indentlevel + 2)
+			result += indent1("} else {")
+			result += indent("dm_n -= dm_first;", indentlevel + 2)
+			result += indent(f"p[{q}] += (cell)(1 + dm_n / {k}u);", indentlevel + 2)
+			result += indent(f"p[{r}] = (cell)(dm_n % {k}u);", indentlevel + 2)
+			result += indent1("}")
+			for off in (s, *cmd.tempOffs):
+				result += indent1(f"p[{off}] = 0;")
+			result += indent("}")
 		else:
 			raise AssertionError("Unknown command")
 	
+	return result
+
+
+# Profiled Loop/If/Glider sites in the order commands_to_c emits them, each in the
+# region it was found in. Regions are keyed by their path of labels, so a fragment
+# used in several places is reported once per place. The generated prof_report
+# adds up the counts per region, and inclusive of nested regions, into a text file.
+class ProfileSites:
+	KINDS: Tuple[str, ...] = ("loop", "if", "glide")
+	
+	def __init__(self):
+		self.kinds: List[int] = []
+		self.site_regions: List[int] = []
+		self.regions: List[str] = ["(top)"]
+		self.parents: List[int] = [-1]
+		self.current: int = 0
+	
+	def site(self, kind: str) -> int:
+		self.kinds.append(ProfileSites.KINDS.index(kind))
+		self.site_regions.append(self.current)
+		return len(self.kinds) - 1
+	
+	# Returns the region to go back to with leave()
+	def enter(self, name: str) -> int:
+		parent: int = self.current
+		path: str = name if parent == 0 else f"{self.regions[parent]}/{name}"
+		if path in self.regions:
+			self.current = self.regions.index(path)
+		else:
+			self.regions.append(path)
+			self.parents.append(parent)
+			self.current = len(self.regions) - 1
+		return parent
+	
+	def leave(self, parent: int) -> None:
+		self.current = parent
+	
+	def report_c(self, path: str) -> str:
+		def indent(line: str, level: int) -> str:
+			return "\t" * level + line + "\n"
+		def array(values: Sequence[object]) -> str:
+			return "{" + ", ".join(map(str, values or [0])) + "}"
+		sites: int = max(len(self.kinds), 1)
+		regions: int = len(self.regions)
+		result: str = ""
+		result += indent(f"static uint64_t prof_counts[{sites}];", 0)
+		result += indent(f"static const uint8_t prof_kinds[{sites}] = {array(self.kinds)};", 0)
+		result += indent(f"static const int prof_site_regions[{sites}] = {array(self.site_regions)};", 0)
+		result += indent(f"static const int prof_parents[{regions}] = {array(self.parents)};", 0)
+		result += indent(f"static const char *const prof_regions[{regions}] = {array([chr(34) + r + chr(34) for r in self.regions])};", 0)
+		result += indent("", 0)
+		result += indent("static void prof_report(void) {", 0)
+		result += indent(f"static uint64_t totals[{regions}][4];", 1)
+		result += indent("memset(totals, 0, sizeof totals);", 1)
+		result += indent(f"for (int i = 0; i < {len(self.kinds)}; i++) {{", 1)
+		result += indent("totals[prof_site_regions[i]][prof_kinds[i]] += prof_counts[i];", 2)
+		result += indent("totals[prof_site_regions[i]][3] += prof_counts[i];", 2)
+		result += indent("}", 1)
+		result += indent(f"for (int r = {regions - 1}; r > 0; r--)", 1)
+		result += indent("totals[prof_parents[r]][3] += totals[r][3];", 2)
+		result += indent(f"FILE *f = fopen({chr(34) + path.replace(chr(92), chr(92) * 2) + chr(34)}, \"w\");", 1)
+		result += indent("if (f == NULL)", 1)
+		result += indent("return;", 2)
+		result += indent("fprintf(f, \"%-60s %16s %16s %16s %16s\\n\", \"region\", \"loop iterations\", \"ifs taken\", \"glide steps\", \"inclusive\");", 1)
+		result += indent(f"for (int r = 0; r < {regions}; r++)", 1)
+		result += indent("fprintf(f, \"%-60s %16llu %16llu %16llu %16llu\\n\", prof_regions[r], (unsigned long long)totals[r][0], (unsigned long long)totals[r][1], (unsigned long long)totals[r][2], (unsigned long long)totals[r][3]);", 2)
+		result += indent("fclose(f);", 1)
+		result += indent("}", 0)
+		return result
+
+
+# Buffered stdout for the C output. Output goes into a fixed buffer that is written
+# out when full, at exit, on SIGINT/SIGTERM, and at newlines once flush_ms has
+# passed (or always when stdout is a terminal). PrintRuns over byte cells copy a whole
+# run into it at once, reversing it when the run goes leftwards. With telemetry the
+# newlines also count the lines and the length of the last one.
+def output_helpers_c(size: int, flush_ms: int, profile: bool = False, bytecells: bool = True, telemetry: bool = False) -> str:
+	def indent(line: str, level: int) -> str:
+		return "\t" * level + line + "\n"
+	result: str = ""
+	result += indent(f"#define OUT_SIZE ((size_t){size}u)", 0)
+	result += indent("static uint8_t out_buf[OUT_SIZE];", 0)
+	result += indent("static size_t out_len = 0;", 0)
+	result += indent("static int out_tty = 0;", 0)
+	result += indent(f"static const long long out_interval = {flush_ms}LL * 1000000;", 0)
+	result += indent("static long long out_last = 0;", 0)
+	result += indent("static long long out_lines_left = -1;", 0)
+	if telemetry:
+		result += indent("static uint64_t out_written = 0;", 0)
+		result += indent("static uint64_t tele_line_start = 0;", 0)
+		result += indent("static volatile uint64_t tele_lines = 0;", 0)
+		result += indent("static volatile uint64_t tele_line_length = 0;", 0)
+		# glides are hot, a plain counter may lag in a register a little
+		result += indent("static uint64_t tele_glide = 0;", 0)
+		result += indent("static cell *tele_far = NULL;", 0)
+	result += indent("", 0)
+	result += indent("static void out_flush(void) {", 0)
+	result += indent("size_t done = 0;", 1)
+	result += indent("while (done < out_len) {", 1)
+	result += indent("ssize_t n = write(STDOUT_FILENO, out_buf + done, out_len - done);", 2)
+	result += indent("if (n < 0 && errno == EINTR)", 2)
+	result += indent("continue;", 3)
+	result += indent("if (n <= 0)", 2)
+	result += indent("_exit(EXIT_FAILURE);", 3)
+	result += indent("done += (size_t)n;", 2)
+	result += indent("}", 1)
+	if telemetry:
+		result += indent("out_written += out_len;", 1)
+	result += indent("out_len = 0;", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static void out_signal(int sig) {", 0)
+	if profile:
+		result += indent("prof_report();", 1)
+	result += indent("out_flush();", 1)
+	result += indent("_exit(128 + sig);", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("// A scan that ran off the tape without finding what it looked for", 0)
+	result += indent("static _Noreturn void tape_overrun(const char *msg) {", 0)
+	result += indent("out_flush();", 1)
+	result += indent("fputs(msg, stderr);", 1)
+	result += indent("exit(EXIT_FAILURE);", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("// --max-lines N exits after printing N newlines", 0)
+	result += indent("static void out_init(int argc, char **argv) {", 0)
+	result += indent("for (int i = 1; i + 1 < argc; i++) {", 1)
+	result += indent("if (strcmp(argv[i], \"--max-lines\") == 0)", 2)
+	result += indent("out_lines_left = strtoll(argv[++i], NULL, 10);", 3)
+	result += indent("}", 1)
+	result += indent("out_tty = isatty(STDOUT_FILENO);", 1)
+	result += indent("atexit(out_flush);", 1)
+	result += indent("signal(SIGINT, out_signal);", 1)
+	result += indent("signal(SIGTERM, out_signal);", 1)
+	if profile:
+		# A reader like head closing the pipe should still leave a report
+		result += indent("signal(SIGPIPE, out_signal);", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static void out_newline(void) {", 0)
+	if telemetry:
+		result += indent("uint64_t line_end = out_written + out_len;", 1)
+		result += indent("tele_line_length = line_end - tele_line_start - 1;", 1)
+		result += indent("tele_line_start = line_end;", 1)
+		result += indent("tele_lines++;", 1)
+	result += indent("struct timespec t;", 1)
+	result += indent("clock_gettime(CLOCK_MONOTONIC, &t);", 1)
+	result += indent("long long now = t.tv_sec * 1000000000LL + t.tv_nsec;", 1)
+	result += indent("if (out_tty || out_len == OUT_SIZE || now - out_last >= out_interval) {", 1)
+	result += indent("out_flush();", 2)
+	result += indent("out_last = now;", 2)
+	result += indent("}", 1)
+	result += indent("if (out_lines_left > 0 && --out_lines_left == 0)", 1)
+	result += indent("exit(EXIT_SUCCESS);", 2)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static inline void bf_putchar(uint8_t c) {", 0)
+	result += indent("out_buf[out_len++] = c;", 1)
+	result += indent("if (c == '\\n')", 1)
+	result += indent("out_newline();", 2)
+	result += indent("else if (out_len == OUT_SIZE)", 1)
+	result += indent("out_flush();", 2)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static void out_write(const uint8_t *src, size_t n) {", 0)
+	result += indent("while (n > 0) {", 1)
+	result += indent("size_t chunk = OUT_SIZE - out_len < n ? OUT_SIZE - out_len : n;", 2)
+	result += indent("memcpy(out_buf + out_len, src, chunk);", 2)
+	result += indent("out_len += chunk;", 2)
+	result += indent("src += chunk;", 2)
+	result += indent("n -= chunk;", 2)
+	result += indent("if (out_len == OUT_SIZE)", 2)
+	result += indent("out_flush();", 3)
+	result += indent("}", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("// Writes src[0], src[-1], ..., src[1 - n]", 0)
+	result += indent("static void out_write_reversed(const uint8_t *src, size_t n) {", 0)
+	result += indent("while (n > 0) {", 1)
+	result += indent("size_t chunk = OUT_SIZE - out_len < n ? OUT_SIZE - out_len : n;", 2)
+	result += indent("uint8_t *dst = out_buf + out_len;", 2)
+	result += indent("for (size_t i = 0; i < chunk; i++)", 2)
+	result += indent("dst[i] = src[-(ptrdiff_t)i];", 3)
+	result += indent("out_len += chunk;", 2)
+	result += indent("src -= chunk;", 2)
+	result += indent("n -= chunk;", 2)
+	result += indent("if (out_len == OUT_SIZE)", 2)
+	result += indent("out_flush();", 3)
+	result += indent("}", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	if bytecells:
+		result += indent("static cell *print_run_f(cell *p, cell bias, cell *end) {", 0)
+		result += indent("cell *q = memchr(p + 1, (cell)-bias, end - p - 1);", 1)
+		result += indent("if (q == NULL)", 1)
+		result += indent("tape_overrun(\"tape overflow\\n\");", 2)
+		result += indent("*p -= bias;", 1)
+		result += indent("out_write(p, q - p);", 1)
+		result += indent("memset(p, 0, q - p);", 1)
+		result += indent("*q += bias;", 1)
+		result += indent("return q;", 1)
+		result += indent("}", 0)
+		result += indent("", 0)
+		result += indent("static cell *print_run_b(cell *p, cell bias, cell *start) {", 0)
+		result += indent("cell *q = memrchr(start, (cell)-bias, p - start);", 1)
+		result += indent("if (q == NULL)", 1)
+		result += indent("tape_overrun(\"tape underflow\\n\");", 2)
+		result += indent("*p -= bias;", 1)
+		result += indent("out_write_reversed(p, p - q);", 1)
+		result += indent("memset(q + 1, 0, p - q);", 1)
+		result += indent("*q += bias;", 1)
+		result += indent("return q;", 1)
+		result += indent("}", 0)
+		result += indent("", 0)
+	result += indent("static cell *print_run(cell *p, ptrdiff_t step, cell bias) {", 0)
+	result += indent("*p -= bias;", 1)
+	result += indent("do {", 1)
+	result += indent("bf_putchar(*p);", 2)
+	result += indent("*p = 0;", 2)
+	result += indent("p += step;", 2)
+	result += indent("} while (*p != (cell)-bias);", 1)
+	result += indent("*p += bias;", 1)
+	result += indent("return p;", 1)
+	result += indent("}", 0)
+	return result
+
+
+# Strided glider scans for the C output. Unrolled by four, with a plain loop
+# near the ends of the tape so the unrolled reads never leave it. Like memchr they
+# return NULL when the target is not on the tape.
+def glider_helpers_c() -> str:
+	def indent(line: str, level: int) -> str:
+		return "\t" * level + line + "\n"
+	result: str = ""
+	for name, sign, bound, check, bound_check in (("glide_f", "+", "end", "p + 4 * step <= end", "p < end"), ("glide_b", "-", "start", "p >= start + 4 * step", "p >= start")):
+		result += indent(f"static inline cell *{name}(cell *p, cell target, size_t step, cell *{bound}) {{", 0)
+		result += indent(f"while ({check}) {{", 1)
+		result += indent("if (p[0] == target) return p;", 2)
+		for i in range(1, 4):
+			mul = "" if i == 1 else f"{i} * "
+			result += indent(f"if (*(p {sign} {mul}step) == target) return p {sign} {mul}step;", 2)
+		result += indent(f"p {sign}= 4 * step;", 2)
+		result += indent("}", 1)
+		result += indent(f"for (; {bound_check}; p {sign}= step) {{", 1)
+		result += indent("if (*p == target) return p;", 2)
+		result += indent("}", 1)
+		result += indent("return NULL;", 1)
+		result += indent("}", 0)
+	return result
+
+
+# Level 1 is the outermost loop and levels + 1 the clear in the middle. Going down
+# a level takes one off the cell, leaving one moves step cells and retests the
+# level above, so a whole run of decrements is taken at once.
+def decmove_helper_c() -> str:
+	def indent(line: str, level: int) -> str:
+		return "\t" * level + line + "\n"
+	result: str = ""
+	result += indent("static cell *dec_move(cell *p, ptrdiff_t step, unsigned levels) {", 0)
+	result += indent("unsigned level = 1;", 1)
+	result += indent("for (;;) {", 1)
+	result += indent("if (level > levels) {", 2)
+	result += indent("*p = 0;", 3)
+	result += indent("level = levels;", 3)
+	result += indent("p += step;", 3)
+	result += indent("} else if (*p) {", 2)
+	result += indent("unsigned take = *p < levels - level + 1 ? *p : levels - level + 1;", 3)
+	result += indent("*p -= take;", 3)
+	result += indent("level += take;", 3)
+	result += indent("} else if (level == 1) {", 2)
+	result += indent("return p;", 3)
+	result += indent("} else {", 2)
+	result += indent("level--;", 3)
+	result += indent("p += step;", 3)
+	result += indent("}", 2)
+	result += indent("}", 1)
+	result += indent("}", 0)
+	return result
+
+
+# Tape backed by a reserved PROT_NONE mapping. Only a window at the start is
+# readable and writable; touching the guard pages past it raises SIGSEGV and the
+# handler doubles the window, so pages get committed as the program reaches them.
+# Tapes are kept in a small registry so the handler can tell which one faulted.
+# A page below each tape stays inaccessible to catch underflow.
+def mmap_tape_c(limit: int) -> str:
+	def indent(line: str, level: int) -> str:
+		return "\t" * level + line + "\n"
+	result: str = ""
+	result += indent(f"#define TAPE_LIMIT ((size_t){limit}u)", 0)
+	result += indent("#define TAPE_WINDOW ((size_t)1 << 16)", 0)
+	result += indent("#define MAX_TAPES 16", 0)
+	result += indent("", 0)
+	result += indent("struct tape {", 0)
+	result += indent("uint8_t *base;", 1)
+	result += indent("size_t committed;", 1)
+	result += indent("size_t limit;", 1)
+	result += indent("};", 0)
+	result += indent("static struct tape tapes[MAX_TAPES];", 0)
+	result += indent("static int tape_count = 0;", 0)
+	result += indent("", 0)
+	result += indent("static void tape_fail(const char *msg, size_t len) {", 0)
+	result += indent("out_flush();", 1)
+	result += indent("if (write(STDERR_FILENO, msg, len) < 0) {}", 1)
+	result += indent("_exit(EXIT_FAILURE);", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static void tape_fault(int sig, siginfo_t *info, void *context) {", 0)
+	result += indent("(void)context;", 1)
+	result += indent("uint8_t *addr = info->si_addr;", 1)
+	result += indent("size_t page = (size_t)sysconf(_SC_PAGESIZE);", 1)
+	result += indent("for (int i = 0; i < tape_count; i++) {", 1)
+	result += indent("struct tape *t = &tapes[i];", 2)
+	result += indent("if (addr >= t->base - page && addr < t->base)", 2)
+	result += indent("tape_fail(\"tape underflow\\n\", 15);", 3)
+	result += indent("if (addr < t->base + t->committed || addr >= t->base + t->limit)", 2)
+	result += indent("continue;", 3)
+	result += indent("size_t size = t->committed;", 2)
+	result += indent("while (t->base + size <= addr)", 2)
+	result += indent("size *= 2;", 3)
+	result += indent("if (size > t->limit)", 2)
+	result += indent("size = t->limit;", 3)
+	result += indent("if (mprotect(t->base + t->committed, size - t->committed, PROT_READ | PROT_WRITE) != 0)", 2)
+	result += indent("tape_fail(\"tape overflow\\n\", 14);", 3)
+	result += indent("t->committed = size;", 2)
+	result += indent("return;", 2)
+	result += indent("}", 1)
+	result += indent("for (int i = 0; i < tape_count; i++) {", 1)
+	result += indent("if (addr >= tapes[i].base + tapes[i].limit && addr < tapes[i].base + tapes[i].limit + page)", 2)
+	result += indent("tape_fail(\"tape overflow\\n\", 14);", 3)
+	result += indent("}", 1)
+	result += indent("signal(sig, SIG_DFL);", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static uint8_t *tape_open(size_t limit) {", 0)
+	result += indent("size_t page = (size_t)sysconf(_SC_PAGESIZE);", 1)
+	result += indent("limit = (limit + page - 1) / page * page;", 1)
+	result += indent("if (tape_count == MAX_TAPES) {", 1)
+	result += indent("fputs(\"too many tapes\\n\", stderr);", 2)
+	result += indent("exit(EXIT_FAILURE);", 2)
+	result += indent("}", 1)
+	result += indent("uint8_t *region = mmap(NULL, limit + 2 * page, PROT_NONE, MAP_PRIVATE | MAP_ANONYMOUS | MAP_NORESERVE, -1, 0);", 1)
+	result += indent("if (region == MAP_FAILED) {", 1)
+	result += indent("perror(\"mmap\");", 2)
+	result += indent("exit(EXIT_FAILURE);", 2)
+	result += indent("}", 1)
+	result += indent("struct tape *t = &tapes[tape_count];", 1)
+	result += indent("t->base = region + page;", 1)
+	result += indent("t->committed = TAPE_WINDOW < limit ? TAPE_WINDOW : limit;", 1)
+	result += indent("t->limit = limit;", 1)
+	result += indent("if (mprotect(t->base, t->committed, PROT_READ | PROT_WRITE) != 0) {", 1)
+	result += indent("perror(\"mprotect\");", 2)
+	result += indent("exit(EXIT_FAILURE);", 2)
+	result += indent("}", 1)
+	result += indent("if (tape_count++ == 0) {", 1)
+	result += indent("struct sigaction sa;", 2)
+	result += indent("memset(&sa, 0, sizeof sa);", 2)
+	result += indent("sa.sa_sigaction = tape_fault;", 2)
+	result += indent("sa.sa_flags = SA_SIGINFO | SA_NODEFER;", 2)
+	result += indent("sigemptyset(&sa.sa_mask);", 2)
+	result += indent("sigaction(SIGSEGV, &sa, NULL);", 2)
+	result += indent("}", 1)
+	result += indent("return t->base;", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static struct tape *tape_of(uint8_t *base) {", 0)
+	result += indent("for (int i = 0; i < tape_count; i++) {", 1)
+	result += indent("if (tapes[i].base == base)", 2)
+	result += indent("return &tapes[i];", 3)
+	result += indent("}", 1)
+	result += indent("return NULL;", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("// Bytes of the tape that may have been written", 0)
+	result += indent("static size_t tape_size(uint8_t *base) {", 0)
+	result += indent("return tape_of(base)->committed;", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("// Commits the first size bytes of the tape, returns 0 if it can't be that large", 0)
+	result += indent("static int tape_reserve(uint8_t *base, size_t size) {", 0)
+	result += indent("struct tape *t = tape_of(base);", 1)
+	result += indent("if (size > t->limit)", 1)
+	result += indent("return 0;", 2)
+	result += indent("if (size > t->committed) {", 1)
+	result += indent("if (mprotect(t->base + t->committed, size - t->committed, PROT_READ | PROT_WRITE) != 0)", 2)
+	result += indent("return 0;", 3)
+	result += indent("t->committed = size;", 2)
+	result += indent("}", 1)
+	result += indent("return 1;", 1)
+	result += indent("}", 0)
+	return result
+
+
+# Everything the generated C has before main: headers, the cell type, the output,
+# glider and decmove helpers and the tape, with extra headers from includes
+def c_prelude(options: Options, profile: Optional["ProfileSites"] = None, includes: Sequence[str] = ()) -> str:
+	def indent(line: str, level: int) -> str:
+		return "\t" * level + line + "\n"
+	# memchr and friends only work on byte cells
+	bytecells: bool = options.cell_bits == 8
+	result: str = ""
+	result += indent("#define _GNU_SOURCE", 0)
+	headers: List[str] = ["stddef.h", "stdint.h", "stdio.h", "stdlib.h", "string.h", "time.h", "errno.h", "signal.h", "unistd.h"]
+	if options.tape == "mmap":
+		headers.append("sys/mman.h")
+	headers += [h for h in includes if h not in headers]
+	for header in headers:
+		result += indent(f"#include <{header}>", 0)
+	result += indent("", 0)
+	result += indent(f"typedef uint{options.cell_bits}_t cell;", 0)
+	result += indent("", 0)
+	result += indent("static uint8_t bf_read() {", 0)
+	result += indent("int temp = getchar();", 1)
+	result += indent("return (uint8_t)(temp != EOF ? temp : 0);", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	if profile is not None:
+		result += profile.report_c(options.profile)
+		result += indent("", 0)
+	result += output_helpers_c(options.out_buffer, options.flush_ms, profile is not None, bytecells, options.telemetry > 0)
+	result += indent("", 0)
+	result += indent("static int BLOCK_SIZE = 9;", 0)
+	result += indent("static int dbg_count = 100000;", 0)
+	result += indent("static void dbg(cell mem[], cell *p) {", 0)
+	result += indent("out_flush();", 1)
+	result += indent("printf(\"\\nDBG OUTPUT:\\n\");", 1)
+	result += indent("int i, j;", 1)
+	result += indent("for (i = 1000; i < 1100; i += BLOCK_SIZE) {", 1)
+	result += indent("for (j = 0; j < BLOCK_SIZE; j++) {", 2)
+	result += indent("if (p == &mem[i + j])", 3)
+	result += indent("printf(\"*%3u \", (unsigned)mem[i + j]);", 4)
+	result += indent("else", 3)
+	result += indent("printf(\" %3u \", (unsigned)mem[i + j]);", 4)
+	result += indent("}", 2)
+	result += indent("printf(\"\\n\");", 2)
+	result += indent("}", 1)
+	result += indent("fflush(stdout);", 1)
+	result += indent("if (--dbg_count == 0)", 1)
+	result += indent("exit(0);", 2)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += glider_helpers_c()
+	result += indent("", 0)
+	result += decmove_helper_c()
+	result += indent("", 0)
+	if options.tape == "mmap":
+		result += mmap_tape_c(options.tape_limit)
+		result += indent("", 0)
+	else:
+		result += indent("#define TAPE_SIZE 1000000", 0)
+	return result
+
+
+# Checkpoints for the C output. A checkpoint is a header and the written part of the
+# tape, taken at the top of an iteration of the checkpointed loop, after flushing the
+# output. The program saves one every --checkpoint-every N iterations and when
+# SIGINT, SIGTERM or SIGUSR1 arrives; the first two exit once it is written, and
+# a second one exits at once. --resume maps the file back in and continues from the
+# iteration it was taken at. The program id is a hash of the generated code, so a
+# checkpoint can't be resumed by a different program.
+def checkpoint_helpers_c(tape: str, program: int) -> str:
+	def indent(line: str, level: int) -> str:
+		return "\t" * level + line + "\n"
+	result: str = ""
+	result += indent(f"#define CKPT_PROGRAM 0x{program:016x}ULL", 0)
+	result += indent("", 0)
+	if tape != "mmap":
+		result += indent("static size_t tape_size(uint8_t *base) {", 0)
+		result += indent("(void)base;", 1)
+		result += indent("return TAPE_SIZE * sizeof(cell);", 1)
+		result += indent("}", 0)
+		result += indent("", 0)
+		result += indent("static int tape_reserve(uint8_t *base, size_t size) {", 0)
+		result += indent("(void)base;", 1)
+		result += indent("return size <= TAPE_SIZE * sizeof(cell);", 1)
+		result += indent("}", 0)
+		result += indent("", 0)
+	result += indent("struct ckpt_header {", 0)
+	result += indent("char magic[8];", 1)
+	result += indent("uint64_t program;", 1)
+	result += indent("uint64_t cell_size;", 1)
+	result += indent("uint64_t p;", 1)
+	result += indent("uint64_t tape_bytes;", 1)
+	result += indent("uint64_t terms;", 1)
+	result += indent("};", 0)
+	result += indent("", 0)
+	result += indent("static const char *ckpt_path = NULL;", 0)
+	result += indent("static unsigned long long ckpt_every = 0;", 0)
+	result += indent("static unsigned long long ckpt_terms = 0;", 0)
+	result += indent("static unsigned long long ckpt_next = 0;", 0)
+	result += indent("static volatile sig_atomic_t ckpt_pending = 0;", 0)
+	result += indent("", 0)
+	result += indent("static void ckpt_signal(int sig) {", 0)
+	result += indent("if (ckpt_pending)", 1)
+	result += indent("out_signal(sig);", 2)
+	result += indent("ckpt_pending = sig;", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static void ckpt_fail(const char *what) {", 0)
+	result += indent("out_flush();", 1)
+	result += indent("fprintf(stderr, \"checkpoint %s: %s\\n\", ckpt_path, what);", 1)
+	result += indent("exit(EXIT_FAILURE);", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static int ckpt_write(int fd, const void *src, size_t n) {", 0)
+	result += indent("while (n > 0) {", 1)
+	result += indent("ssize_t done = write(fd, src, n);", 2)
+	result += indent("if (done < 0 && errno == EINTR)", 2)
+	result += indent("continue;", 3)
+	result += indent("if (done <= 0)", 2)
+	result += indent("return 0;", 3)
+	result += indent("src = (const uint8_t *)src + done;", 2)
+	result += indent("n -= (size_t)done;", 2)
+	result += indent("}", 1)
+	result += indent("return 1;", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("// Written to a temporary file and renamed over the old checkpoint, so there always is a whole one", 0)
+	result += indent("static void ckpt_save(cell *mem, cell *p) {", 0)
+	result += indent("out_flush();", 1)
+	result += indent("struct ckpt_header h = {\"BFCKPT1\", CKPT_PROGRAM, sizeof(cell), (uint64_t)(p - mem), tape_size((uint8_t *)mem), ckpt_terms};", 1)
+	result += indent("char tmp[4096];", 1)
+	result += indent("snprintf(tmp, sizeof tmp, \"%s.tmp\", ckpt_path);", 1)
+	result += indent("int fd = open(tmp, O_WRONLY | O_CREAT | O_TRUNC, 0644);", 1)
+	result += indent("if (fd < 0 || !ckpt_write(fd, &h, sizeof h) || !ckpt_write(fd, mem, h.tape_bytes) || fsync(fd) != 0 || close(fd) != 0)", 1)
+	result += indent("ckpt_fail(strerror(errno));", 2)
+	result += indent("if (rename(tmp, ckpt_path) != 0)", 1)
+	result += indent("ckpt_fail(strerror(errno));", 2)
+	result += indent("ckpt_next = ckpt_every ? ckpt_terms + ckpt_every : 0;", 1)
+	result += indent("int sig = ckpt_pending;", 1)
+	result += indent("ckpt_pending = 0;", 1)
+	result += indent("if (sig == SIGINT || sig == SIGTERM)", 1)
+	result += indent("out_signal(sig);", 2)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("// --checkpoint FILE [--checkpoint-every N] [--resume]; returns 1 if a checkpoint was loaded", 0)
+	result += indent("static int ckpt_init(int argc, char **argv, cell *mem, cell **p) {", 0)
+	result += indent("int resume = 0;", 1)
+	result += indent("for (int i = 1; i < argc; i++) {", 1)
+	result += indent("if (strcmp(argv[i], \"--checkpoint\") == 0 && i + 1 < argc)", 2)
+	result += indent("ckpt_path = argv[++i];", 3)
+	result += indent("else if (strcmp(argv[i], \"--checkpoint-every\") == 0 && i + 1 < argc)", 2)
+	result += indent("ckpt_every = strtoull(argv[++i], NULL, 10);", 3)
+	result += indent("else if (strcmp(argv[i], \"--resume\") == 0)", 2)
+	result += indent("resume = 1;", 3)
+	result += indent("}", 1)
+	result += indent("if (ckpt_path == NULL) {", 1)
+	result += indent("if (resume) {", 2)
+	result += indent("fputs(\"--resume needs --checkpoint FILE\\n\", stderr);", 3)
+	result += indent("exit(EXIT_FAILURE);", 3)
+	result += indent("}", 2)
+	result += indent("return 0;", 2)
+	result += indent("}", 1)
+	result += indent("signal(SIGINT, ckpt_signal);", 1)
+	result += indent("signal(SIGTERM, ckpt_signal);", 1)
+	result += indent("signal(SIGUSR1, ckpt_signal);", 1)
+	result += indent("ckpt_next = ckpt_every;", 1)
+	result += indent("if (!resume)", 1)
+	result += indent("return 0;", 2)
+	result += indent("int fd = open(ckpt_path, O_RDONLY);", 1)
+	result += indent("struct stat st;", 1)
+	result += indent("if (fd < 0 || fstat(fd, &st) != 0)", 1)
+	result += indent("ckpt_fail(strerror(errno));", 2)
+	result += indent("if ((size_t)st.st_size < sizeof(struct ckpt_header))", 1)
+	result += indent("ckpt_fail(\"too short\");", 2)
+	result += indent("const struct ckpt_header *h = mmap(NULL, (size_t)st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);", 1)
+	result += indent("if (h == MAP_FAILED)", 1)
+	result += indent("ckpt_fail(strerror(errno));", 2)
+	result += indent("if (memcmp(h->magic, \"BFCKPT1\", 8) != 0 || h->cell_size != sizeof(cell))", 1)
+	result += indent("ckpt_fail(\"not a checkpoint for this cell width\");", 2)
+	result += indent("if (h->program != CKPT_PROGRAM)", 1)
+	result += indent("ckpt_fail(\"taken by a different program\");", 2)
+	result += indent("if ((uint64_t)st.st_size != sizeof *h + h->tape_bytes || h->p >= h->tape_bytes / sizeof(cell))", 1)
+	result += indent("ckpt_fail(\"truncated\");", 2)
+	result += indent("if (!tape_reserve((uint8_t *)mem, h->tape_bytes))", 1)
+	result += indent("ckpt_fail(\"larger than the tape\");", 2)
+	result += indent("memcpy(mem, h + 1, h->tape_bytes);", 1)
+	result += indent("*p = mem + h->p;", 1)
+	result += indent("ckpt_terms = h->terms;", 1)
+	result += indent("ckpt_next = ckpt_every ? ckpt_terms + ckpt_every : 0;", 1)
+	result += indent("munmap((void *)h, (size_t)st.st_size);", 1)
+	result += indent("close(fd);", 1)
+	result += indent("return 1;", 1)
+	result += indent("}", 0)
+	return result
+
+
+# Telemetry for the C output: a SIGALRM timer writes a one-line record every
+# interval_ms, and once more at exit, to stderr or the descriptor given by
+# --stats-fd N. A record has the milliseconds since start, lines printed, the
+# length of the last line, the furthest cell past mem[1000] the pointer stopped at
+# after a scan or loop (see commands_to_c) and the total number of cells gliders
+# moved. The running program only counts newlines and glide distances and notes
+# that cell; the handler formats them with async-signal-safe calls.
+def telemetry_helpers_c(interval_ms: int) -> str:
+	def indent(line: str, level: int) -> str:
+		return "\t" * level + line + "\n"
+	result: str = ""
+	result += indent("#include <sys/time.h>", 0)
+	result += indent("", 0)
+	result += indent("static int tele_fd = STDERR_FILENO;", 0)
+	result += indent("static long long tele_start = 0;", 0)
+	result += indent("static cell *tele_mem = NULL;", 0)
+	result += indent("", 0)
+	result += indent("static size_t tele_field(char *buf, size_t n, const char *name, uint64_t value) {", 0)
+	result += indent("while (*name)", 1)
+	result += indent("buf[n++] = *name++;", 2)
+	result += indent("char digits[20];", 1)
+	result += indent("int count = 0;", 1)
+	result += indent("do {", 1)
+	result += indent("digits[count++] = (char)('0' + value % 10);", 2)
+	result += indent("value /= 10;", 2)
+	result += indent("} while (value);", 1)
+	result += indent("while (count)", 1)
+	result += indent("buf[n++] = digits[--count];", 2)
+	result += indent("return n;", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static void tele_record(void) {", 0)
+	result += indent("struct timespec t;", 1)
+	result += indent("clock_gettime(CLOCK_MONOTONIC, &t);", 1)
+	result += indent("long long now = t.tv_sec * 1000000000LL + t.tv_nsec;", 1)
+	result += indent("ptrdiff_t far = tele_far - tele_mem - 1000;", 1)
+	result += indent("char buf[160];", 1)
+	result += indent("size_t n = tele_field(buf, 0, \"ms=\", (uint64_t)(now - tele_start) / 1000000);", 1)
+	result += indent("n = tele_field(buf, n, \" lines=\", tele_lines);", 1)
+	result += indent("n = tele_field(buf, n, \" digits=\", tele_line_length);", 1)
+	result += indent("n = tele_field(buf, n, \" tape=\", (uint64_t)(far > 0 ? far : 0));", 1)
+	result += indent("n = tele_field(buf, n, \" glide=\", tele_glide);", 1)
+	result += indent("buf[n++] = '\\n';", 1)
+	result += indent("if (write(tele_fd, buf, n) < 0) {}", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static void tele_alarm(int sig) {", 0)
+	result += indent("(void)sig;", 1)
+	result += indent("int saved = errno;", 1)
+	result += indent("tele_record();", 1)
+	result += indent("errno = saved;", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("static void tele_exit(void) {", 0)
+	result += indent("signal(SIGALRM, SIG_IGN);", 1)
+	result += indent("tele_record();", 1)
+	result += indent("}", 0)
+	result += indent("", 0)
+	result += indent("// --stats-fd N writes the records to descriptor N instead of stderr", 0)
+	result += indent("static void tele_init(int argc, char **argv, cell *mem) {", 0)
+	result += indent("for (int i = 1; i + 1 < argc; i++) {", 1)
+	result += indent("if (strcmp(argv[i], \"--stats-fd\") == 0)", 2)
+	result += indent("tele_fd = atoi(argv[++i]);", 3)
+	result += indent("}", 1)
+	result += indent("tele_mem = mem;", 1)
+	result += indent("tele_far = mem + 1000;", 1)
+	result += indent("struct timespec t;", 1)
+	result += indent("clock_gettime(CLOCK_MONOTONIC, &t);", 1)
+	result += indent("tele_start = t.tv_sec * 1000000000LL + t.tv_nsec;", 1)
+	result += indent("atexit(tele_exit);", 1)
+	result += indent("struct sigaction sa;", 1)
+	result += indent("memset(&sa, 0, sizeof sa);", 1)
+	result += indent("sa.sa_handler = tele_alarm;", 1)
+	result += indent("sa.sa_flags = SA_RESTART;", 1)
+	result += indent("sigemptyset(&sa.sa_mask);", 1)
+	result += indent("sigaction(SIGALRM, &sa, NULL);", 1)
+	result += indent(f"struct itimerval timer = {{{{{interval_ms // 1000}, {interval_ms % 1000 * 1000}}}, {{{interval_ms // 1000}, {interval_ms % 1000 * 1000}}}}};", 1)
+	result += indent("setitimer(ITIMER_REAL, &timer, NULL);", 1)
+	result += indent("}", 0)
+	return result
+
+
+# The top-level loop checkpoints are taken in: the last one, which in a generated
+# program is the main loop with one term per iteration. None if there isn't one.
+def checkpoint_site(commands: List[Command]) -> Optional[int]:
+	return max((i for (i, cmd) in enumerate(commands) if isinstance(cmd, Loop)), default=None)
+
+
+# The generated module keeps the tape in a bytearray (an array of wider integers
+# for wider cells) and exposes run(out, inp), so it can be imported and executed
+# in-process when no C compiler is around.
+def commands_to_py(commands: List[Command], name: str, maincall: bool = True, indentlevel: int = 1, options: Options = Options()) -> str:
+	def indent(line: str, level: int = indentlevel) -> str:
+		return "\t" * level + line + "\n"
+	def rel(off: int) -> str:
+		return "p" if off == 0 else f"p {plusminus(off)} {abs(off)}"
+	def at(off: int) -> str:
+		return f"mem[{rel(off)}]"
+	def span(off: int, size: int) -> str:
+		return f"mem[{rel(off)} : {rel(off + size)}]"
+	bytecells: bool = options.cell_bits == 8
+	mask: str = f"0x{cell_mask(options.cell_bits):X}"
+	
+	result: str = ""
 	if maincall:
+		result += indent("import sys", 0)
+		if not bytecells:
+			result += indent("from array import array", 0)
+		result += indent("", 0)
+		result += indent("TAPE_SIZE = 1000000", 0)
+		result += indent("BLOCK_SIZE = 9", 0)
+		result += indent("", 0)
+		if bytecells:
+			result += indent("# Gliders step by a fixed stride until they reach a target value; bytearray.index", 0)
+			result += indent("# finds the next candidate and the stride check skips matches between units", 0)
+			result += indent("def glide_f(mem, p, target, step):", 0)
+			result += indent("q = mem.index(target, p)", 1)
+			result += indent("while (q - p) % step:", 1)
+			result += indent("q = mem.index(target, q + 1)", 2)
+			result += indent("return q", 1)
+			result += indent("", 0)
+			result += indent("def glide_b(mem, p, target, step):", 0)
+			result += indent("q = mem.rindex(target, 0, p + 1)", 1)
+			result += indent("while (p - q) % step:", 1)
+			result += indent("q = mem.rindex(target, 0, q)", 2)
+			result += indent("return q", 1)
+			result += indent("", 0)
+			result += indent("def zeros(n):", 0)
+			result += indent("return bytes(n)", 1)
+		else:
+			result += indent("# Gliders step by a fixed stride until they reach a target value", 0)
+			result += indent("def glide_f(mem, p, target, step):", 0)
+			result += indent("while mem[p] != target:", 1)
+			result += indent("p += step", 2)
+			result += indent("return p", 1)
+			result += indent("", 0)
+			result += indent("def glide_b(mem, p, target, step):", 0)
+			result += indent("while mem[p] != target:", 1)
+			result += indent("p -= step", 2)
+			result += indent("return p", 1)
+			result += indent("", 0)
+			result += indent("def zeros(n):", 0)
+			result += indent(f"return array(\"{'H' if options.cell_bits == 16 else 'I'}\", bytes({options.cell_bits // 8} * n))", 1)
+		result += indent("", 0)
+		result += indent("# Prints and clears the run of cells starting at p, stepping by step until a cell", 0)
+		result += indent("# equal to -bias, and returns that cell's index", 0)
+		result += indent("def print_run(mem, p, step, bias, write):", 0)
+		result += indent(f"stop = -bias & {mask}", 1)
+		result += indent(f"mem[p] = (mem[p] - bias) & {mask}", 1)
+		if bytecells:
+			result += indent("if step == 1:", 1)
+			result += indent("q = mem.index(stop, p + 1)", 2)
+			result += indent("elif step == -1:", 1)
+			result += indent("q = mem.rindex(stop, 0, p)", 2)
+			result += indent("else:", 1)
+			result += indent("q = p + step", 2)
+			result += indent("while mem[q] != stop:", 2)
+			result += indent("q += step", 3)
+		else:
+			result += indent("q = p + step", 1)
+			result += indent("while mem[q] != stop:", 1)
+			result += indent("q += step", 2)
+		result += indent("run = slice(p, q, step)", 1)
+		result += indent("write(mem[run])" if bytecells else "write(bytes(c & 0xFF for c in mem[run]))", 1)
+		result += indent("mem[run] = zeros(len(mem[run]))", 1)
+		result += indent(f"mem[q] = (mem[q] + bias) & {mask}", 1)
+		result += indent("return q", 1)
+		result += indent("", 0)
+		result += indent("# Runs a DecMove nest, like dec_move in the C output", 0)
+		result += indent("def dec_move(mem, p, step, levels):", 0)
+		result += indent("level = 1", 1)
+		result += indent("while True:", 1)
+		result += indent("if level > levels:", 2)
+		result += indent("mem[p] = 0", 3)
+		result += indent("level = levels", 3)
+		result += indent("p += step", 3)
+		result += indent("elif mem[p]:", 2)
+		result += indent("take = min(mem[p], levels - level + 1)", 3)
+		result += indent("mem[p] -= take", 3)
+		result += indent("level += take", 3)
+		result += indent("elif level == 1:", 2)
+		result += indent("return p", 3)
+		result += indent("else:", 2)
+		result += indent("level -= 1", 3)
+		result += indent("p += step", 3)
+		result += indent("", 0)
+		result += indent("def dbg(mem, p):", 0)
+		result += indent("print(\"\\nDBG OUTPUT:\")", 1)
+		result += indent("for i in range(1000, 1100, BLOCK_SIZE):", 1)
+		result += indent("print(\"\".join((\"*%3d \" if i + j == p else \" %3d \") % mem[i + j] for j in range(BLOCK_SIZE)))", 2)
+		result += indent("", 0)
+		result += indent("def run(out=None, inp=None):", 0)
+		result += indent("out = out if out is not None else sys.stdout.buffer")
+		result += indent("inp = inp if inp is not None else sys.stdin.buffer")
+		result += indent("write = out.write")
+		result += indent("def read():")
+		result += indent("c = inp.read(1)", 2)
+		result += indent("return c[0] if c else 0", 2)
+		result += indent("mem = bytearray(TAPE_SIZE)" if bytecells else "mem = zeros(TAPE_SIZE)")
+		result += indent("p = 1000")
 		result += indent("")
-		result += indent("return EXIT_SUCCESS;")
-		result += indent("}", 0)
+	
+	start: int = len(result)
+	for cmd in commands:
+		if isinstance(cmd, Assign):
+			result += indent(f"{at(cmd.offset)} = {cmd.value & cell_mask(options.cell_bits)}")
+		elif isinstance(cmd, Add):
+			result += indent(f"{at(cmd.offset)} = ({at(cmd.offset)} {plusminus(cmd.value)} {abs(cmd.value)}) & {mask}")
+		elif isinstance(cmd, MultAssign):
+			if cmd.value == 1:
+				result += indent(f"{at(cmd.destOff)} = {at(cmd.srcOff)}")
+			else:
+				result += indent(f"{at(cmd.destOff)} = ({at(cmd.srcOff)} * {cmd.value}) & {mask}")
+		elif isinstance(cmd, MultAdd):
+			if abs(cmd.value) == 1:
+				result += indent(f"{at(cmd.destOff)} = ({at(cmd.destOff)} {plusminus(cmd.value)} {at(cmd.srcOff)}) & {mask}")
+			else:
+				result += indent(f"{at(cmd.destOff)} = ({at(cmd.destOff)} {plusminus(cmd.value)} {at(cmd.srcOff)} * {abs(cmd.value)}) & {mask}")
+		elif isinstance(cmd, Right):
+			result += indent(f"p {plusminus(cmd.offset)}= {abs(cmd.offset)}")
+		elif isinstance(cmd, Input):
+			result += indent(f"{at(cmd.offset)} = read()")
+		elif isinstance(cmd, Output):
+			result += indent(f"write({span(cmd.offset, 1)})" if bytecells else f"write(bytes(({at(cmd.offset)} & 0xFF,)))")
+		elif isinstance(cmd, Dbg):
+			result += indent(f"dbg(mem, {rel(cmd.offset)})")
+		elif isinstance(cmd, If):
+			result += indent(f"if {at(cmd.offset)}:")
+			result += commands_to_py(cmd.commands, name, False, indentlevel + 1, options)
+		elif isinstance(cmd, Loop):
+			result += indent(f"while {at(cmd.offset)}:")
+			result += commands_to_py(cmd.commands, name, False, indentlevel + 1, options)
+		elif isinstance(cmd, UnitLoop):
+			result += indent(f"if {at(cmd.offset)}:")
+			result += indent(f"{at(cmd.offset)} = ({at(cmd.offset)} - {cmd.bias}) & {mask}", indentlevel + 1)
+			result += indent("while True:", indentlevel + 1)
+			result += commands_to_py(cmd.commands, name, False, indentlevel + 2, options)
+			result += indent(f"p {plusminus(cmd.stride)}= {abs(cmd.stride)}", indentlevel + 2)
+			result += indent(f"if ({at(cmd.offset)} + {cmd.bias}) & {mask} == 0:", indentlevel + 2)
+			result += indent("break", indentlevel + 3)
+			result += indent(f"{at(cmd.offset)} = ({at(cmd.offset)} + {cmd.bias}) & {mask}", indentlevel + 1)
+		elif isinstance(cmd, Region):
+			result += indent(f"# {cmd.name}")
+			result += commands_to_py(cmd.commands, name, False, indentlevel, options)
+		elif isinstance(cmd, Glider):
+			if cmd.offset > 0:
+				result += indent(f"p = glide_f(mem, p, {cmd.target}, {cmd.offset})")
+			else:
+				result += indent(f"p = glide_b(mem, p, {cmd.target}, {-cmd.offset})")
+		elif isinstance(cmd, DecMove):
+			result += indent(f"p = dec_move(mem, p, {cmd.offset}, {cmd.max_moves})")
+		elif isinstance(cmd, PrintRun):
+			result += indent("if mem[p]:")
+			result += indent(f"p = print_run(mem, p, {cmd.offset}, {cmd.bias}, write)", indentlevel + 1)
+		elif isinstance(cmd, MemMove):
+			result += indent(f"{span(cmd.destOff, cmd.mem_size)} = {span(cmd.srcOff, cmd.mem_size)}")
+			set_zero_range = sorted(set(range(cmd.srcOff, cmd.srcOff + cmd.mem_size)) - set(range(cmd.destOff, cmd.destOff + cmd.mem_size)))
+			if len(set_zero_range) > 0:
+				result += indent(f"{span(set_zero_range[0], len(set_zero_range))} = zeros({len(set_zero_range)})")
+		elif isinstance(cmd, DivMod):
+			s, q, r, k = cmd.srcOff, cmd.quotOff, cmd.remOff, cmd.divisor
+			result += indent(f"if {at(s)}:")
+			result += indent(f"n, first = {at(s)}, (({k - 1} - {at(r)}) & {mask}) + 1", indentlevel + 1)
+			result += indent("if n < first:", indentlevel + 1)
+			result += indent(f"{at(r)} = ({at(r)} + n) & {mask}", indentlevel + 2)
+			result += indent("else:", indentlevel + 1)
+			result += indent(f"{at(q)} = ({at(q)} + 1 + (n - first) // {k}) & {mask}", indentlevel + 2)
+			result += indent(f"{at(r)} = (n - first) % {k}", indentlevel + 2)
+			for off in (s, *cmd.tempOffs):
+				result += indent(f"{at(off)} = 0", indentlevel + 1)
+		else:
+			raise AssertionError("Unknown command")
+	if len(result) == start:
+		result += indent("pass")
+	
+	if maincall:
+		result += indent("out.flush()")
+		result += indent("", 0)
+		result += indent("", 0)
+		result += indent("if __name__ == \"__main__\":", 0)
+		result += indent("run()", 1)
 	return result
 
 
+# Yields the commands with each run of at least ASSIGN_TABLE consecutive Assigns
+# gathered into a list, for the C output to write as a table
+ASSIGN_TABLE: int = 64
+
+def assign_runs(commands: List[Command]) -> Iterator[Command | List[Assign]]:
+	run: List[Assign] = []
+	for cmd in commands:
+		if isinstance(cmd, Assign):
+			run.append(cmd)
+			continue
+		if len(run) >= ASSIGN_TABLE:
+			yield run
+		else:
+			yield from run
+		run = []
+		yield cmd
+	if len(run) >= ASSIGN_TABLE:
+		yield run
+	else:
+		yield from run
+
+
 def plusminus(val: int) -> str:
 	if val >= 0:
 		return "+"
@@ -0,0 +1,19 @@
+# Width of the cells the generated brainfuck runs on. Cell values wrap modulo
+# size(), so markers and other values just below the wrap are written as small
+# negative numbers, which come out as the same brainfuck at every width.
+
+WIDTHS = (8, 16, 32)
+
+_bits = 8
+
+
+def bits() -> int:
+    return _bits
+
+def size() -> int:
+    return 1 << _bits
+
+def set_bits(bits: int):
+    global _bits
+    assert(bits in WIDTHS)
+    _bits = bits
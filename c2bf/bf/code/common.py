@@ -1,5 +1,6 @@
 from typing import Iterable
 
+from c2bf.bf.code import cells
 from c2bf.bf.code.main import BFCode
 
 
@@ -17,19 +18,24 @@ def bf_bf(n=1, code: str | BFCode = ""):
     return bf_b(n) + code + bf_f(n)
 
 def bf_set(v: int, clear: bool = True):
-    return clear * BFCode("[-]") + (BFCode("-") * (256 - v) if v > 128 else BFCode("+") * v)
+    v %= cells.size()
+    return clear * BFCode("[-]") + (BFCode("-") * (cells.size() - v) if v > cells.size() // 2 else BFCode("+") * v)
 
+# glide targets are markers, written as how far below the wrap they are (-1 for 255 in 8 bit cells)
 def bf_glide_f(target: int, step: int):
-    assert(target >= 250) # trying to only use high target values
-    p = BFCode("+") * (256-target)
-    m = BFCode("-") * (256-target)
+    assert(-6 <= target < 0) # trying to only use high target values
+    p = BFCode("+") * -target
+    m = BFCode("-") * -target
     return p + "[" + m + BFCode(">") * step + p + "]" + m
 
 def bf_glide_b(target: int, step: int):
-    assert(target >= 250) # trying to only use high target values
-    p = BFCode("+") * (256-target)
-    m = BFCode("-") * (256-target)
+    assert(-6 <= target < 0) # trying to only use high target values
+    p = BFCode("+") * -target
+    m = BFCode("-") * -target
     return p + "[" + m + BFCode("<") * step + p + "]" + m
 
 def bf_sum(code: Iterable[BFCode]):
-    return sum(code, BFCode())
\ No newline at end of file
+    ret = BFCode()
+    for c in code:
+        ret += c
+    return ret
\ No newline at end of file
@@ -1,15 +1,53 @@
-import re
-from typing import Iterable, List, Optional, Union
-
-
-def simplify(code):
-    code = re.sub(r"[^<>+-.,\[\]@]", "", code)
-    deletes = ["<>", "><", "+-", "-+"]
-    replaces = {x:"" for x in deletes} | {"[[-]]":"[-]", "][-]": "]"}
-    while any(k in code for k in replaces):
-        for k,v in replaces.items():
-            code = code.replace(k, v)
-    return code
+import io
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+
+INVERSES = {"<": ">", ">": "<", "+": "-", "-": "+"}
+
+# Single pass peephole simplifier. Cancels "<>", "><", "+-", "-+" and rewrites
+# "[[-]]" -> "[-]" and "][-]" -> "]" as ops arrive, with the same result as
+# applying those rewrites until nothing changes.
+# Everything before an I/O op or a closed loop other than "[-]" can't be touched
+# by later rewrites, so that prefix is flushed to `out` once it grows past `chunk` ops.
+# Region labels ("{name" and "}") are barriers as well, nothing cancels across them.
+def simplify_stream(ops: Iterable[str], out: TextIO, chunk: int = 1 << 16):
+    stack: List[str] = []
+    frozen = 0
+    for op in ops:
+        if op in INVERSES:
+            if len(stack) > frozen and stack[-1] == INVERSES[op]:
+                stack.pop()
+            else:
+                stack.append(op)
+        elif op == "]":
+            if stack[-3:] == ["]", "[", "-"]:
+                del stack[-2:]
+            elif stack[-4:] == ["[", "[", "-", "]"] and len(stack) - 4 >= frozen:
+                del stack[-4]
+                if stack[-4:] == ["]", "[", "-", "]"]:
+                    del stack[-3:]
+            elif stack[-2:] == ["[", "-"]:
+                stack.append("]")
+            else:
+                stack.append("]")
+                frozen = len(stack)
+        elif op in ".,@" or op[0] in "{}":
+            stack.append(op)
+            frozen = len(stack)
+        elif op == "[":
+            stack.append(op)
+        
+        if frozen > chunk:
+            # keep the last frozen op, "][-]" still needs to see it
+            out.write("".join(stack[:frozen - 1]))
+            del stack[:frozen - 1]
+            frozen = 1
+    out.write("".join(stack))
+
+def simplify(code: str) -> str:
+    out = io.StringIO()
+    simplify_stream(code, out)
+    return out.getvalue()
 
 class BFOp:
     def __init__(self, op: str):
@@ -17,46 +55,81 @@ class BFOp:
 
 OPS = [BFOp(op) for op in "+-><.,[]@"]
 OPS_MAP = {op.op: op for op in OPS}
+CLOSE_REGION = BFOp("}")
 
-def parse(code: str) -> List[BFOp]:
-    return [OPS_MAP[op] for op in code if op in OPS_MAP]
+def parse(code: str) -> Tuple[BFOp, ...]:
+    return tuple(OPS_MAP[op] for op in code if op in OPS_MAP)
 
 type BFCodeLike = Union[Iterable[BFOp], str]
+type BFPart = Union[Tuple[BFOp, ...], "BFCode", "BFNode"]
+
 
 class BFNode:
-    def __init__(self, code: Optional[BFCodeLike] = None, repeat: int = 1, next: Optional["BFNode"] = None):
-        if isinstance(code, str):
-            code = parse(code)
+    def __init__(self, code: "BFCode", repeat: int = 1):
         self.code = code
         self.repeat = repeat
-        self.next = next
-    
-    def __iter__(self):
-        if self.code is not None:
-            for _ in range(self.repeat):
-                yield from self.code
 
 
+# BFCode is a rope: a list of parts (immutable op tuples, other BFCode
+# objects or repeated BFNodes) that are shared by reference, never copied.
+# Appending and concatenating are O(1); the ops are only produced on iteration.
+# A frozen BFCode is shared, so += and *= on it build a new object instead.
+# A BFCode can name the region of the program it generates (see label), which
+# to_bf(labels=True) writes out as "{name ... }" for the profiler in bfc.
 class BFCode:
     def __init__(self, code: Optional[BFCodeLike] = None):
-        self.code = BFNode(code)
-
-
-    def __append(self, code: BFCodeLike):
-        current = self.code
-        while current.next is not None:
-            current = current.next
-        current.next = BFNode(code)
-
-
-    def __iter__(self):
-        current = self.code
-        while current is not None:
-            yield from current
-            current = current.next
+        self.parts: List[BFPart] = []
+        self.frozen = False
+        self.region: Optional[str] = None
+        if code is not None:
+            self.__append(code)
+
+
+    def __append(self, code: BFCodeLike | BFNode):
+        part: BFPart
+        if isinstance(code, (BFCode, BFNode)):
+            part = code
+        elif isinstance(code, str):
+            part = parse(code)
+        else:
+            part = tuple(code)
+        if not isinstance(part, tuple) or len(part) > 0:
+            self.parts.append(part)
+
+
+    def __iter__(self) -> Iterator[BFOp]:
+        return self.ops()
+
+    def ops(self, labels: bool = False) -> Iterator[BFOp]:
+        # explicit stack so deep chains of `a + b + c ...` don't hit the recursion limit
+        stack = [(self.parts, iter(self.parts), 0, False)]
+        if labels and self.region is not None:
+            yield BFOp("{" + self.region)
+            stack[0] = (self.parts, iter(self.parts), 0, True)
+        while stack:
+            parts, it, remaining, labeled = stack[-1]
+            for part in it:
+                if isinstance(part, BFCode):
+                    opens = labels and part.region is not None
+                    if opens:
+                        yield BFOp("{" + part.region) # type: ignore
+                    stack.append((part.parts, iter(part.parts), 0, opens))
+                    break
+                if isinstance(part, BFNode):
+                    stack.append((part.code.parts, iter(part.code.parts), part.repeat - 1, False))
+                    break
+                yield from part
+            else:
+                stack.pop()
+                if remaining > 0:
+                    stack.append((parts, iter(parts), remaining - 1, labeled))
+                elif labeled:
+                    yield CLOSE_REGION
 
 
     def __iadd__(self, other: BFCodeLike):
+        if self.frozen:
+            return self + other
         self.__append(other)
         return self
 
@@ -73,24 +146,47 @@ class BFCode:
 
     def __imul__(self, amt: int):
         assert(amt >= 0)
+        if self.frozen:
+            return self * amt
         if amt == 0:
-            self.code = BFNode()
-        else:
-            self.code = BFNode(self.code, repeat=amt)
+            self.parts = []
+        elif amt != 1:
+            inner = BFCode()
+            inner.parts = self.parts
+            self.parts = [BFNode(inner, amt)]
         return self
     
     def __mul__(self, amt: int):
-        ret = BFCode(self)
-        ret *= amt
+        assert(amt >= 0)
+        ret = BFCode()
+        if amt > 0:
+            ret.parts.append(BFNode(self, amt))
         return ret
     
     def __rmul__(self, amt: int):
         return self.__mul__(amt)
 
-    def to_bf(self) -> str:
-        return simplify("".join(op.op for op in self))
+    def freeze(self) -> "BFCode":
+        self.frozen = True
+        return self
+
+    # Wraps this code in a region called `name`. Later appends to self still show up in it,
+    # the wrapper is frozen so appending to it starts a new unlabeled BFCode.
+    def label(self, name: str) -> "BFCode":
+        assert(name.isidentifier())
+        ret = BFCode(self)
+        ret.region = name
+        ret.frozen = True
+        return ret
+
+    def to_bf(self, labels: bool = False) -> str:
+        out = io.StringIO()
+        self.write_bf(out, labels)
+        return out.getvalue()
+
+    def write_bf(self, out: TextIO, labels: bool = False):
+        simplify_stream((op.op for op in self.ops(labels)), out)
     
     def copy(self) -> "BFCode":
         return BFCode(self.to_bf())
 
-
@@ -0,0 +1,293 @@
+# Differential testing for the bfc optimizer: a reference interpreter for the IR
+# runs a program before and after the passes and the two runs are compared.
+# Usage: python -m c2bf.bf.difftest [--count N] [--seed S] [--passes SPEC] [--cell-bits 8|16|32] [FILE.bf ...]
+# Without files it checks randomly generated programs.
+
+import argparse
+import random
+import sys
+
+from array import array
+from typing import List, Optional, Sequence
+
+
+TAPE_SIZE = 1 << 16
+ORIGIN = TAPE_SIZE // 2
+# offsets in the IR are small, so staying this far from the ends keeps every access in range
+MARGIN = 1 << 10
+# array type codes for cells of each width
+TYPECODES = {8: "B", 16: "H", 32: "I"}
+
+
+class stopped(Exception):
+    def __init__(self, reason: str):
+        self.reason = reason
+
+
+class result:
+    def __init__(self, output: bytes, tape: array, p: int, reason: Optional[str]):
+        self.output = output
+        self.tape = tape
+        self.p = p
+        # None if the program halted, otherwise why the run was cut short
+        self.reason = reason
+
+
+# Commands are dispatched on their class name rather than isinstance, so IR from
+# bfc running as __main__ works as well as IR from the imported module.
+class machine:
+    def __init__(self, inp: bytes, steps: int, max_output: Optional[int], bits: int = 8):
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.mem = self.zeros(TAPE_SIZE)
+        self.p = ORIGIN
+        self.inp = inp
+        self.steps = steps
+        self.max_output = max_output
+        self.output = bytearray()
+
+    def zeros(self, n: int) -> array:
+        return array(TYPECODES[self.bits], bytes(n * self.bits // 8))
+
+    def tick(self, n: int = 1):
+        self.steps -= n
+        if self.steps < 0:
+            raise stopped("step budget")
+
+    def move(self, p: int):
+        if not MARGIN <= p < TAPE_SIZE - MARGIN:
+            raise stopped("tape bounds")
+        self.p = p
+
+    def write(self, value: int):
+        self.output.append(value & 0xFF)
+        if self.max_output is not None and len(self.output) >= self.max_output:
+            raise stopped("output limit")
+
+    def run(self, commands: Sequence[object]):
+        mem = self.mem
+        mask = self.mask
+        for cmd in commands:
+            self.tick()
+            kind = type(cmd).__name__
+            p = self.p
+            if kind == "Add":
+                mem[p + cmd.offset] = (mem[p + cmd.offset] + cmd.value) & mask
+            elif kind == "Assign":
+                mem[p + cmd.offset] = cmd.value & mask
+            elif kind == "MultAdd":
+                mem[p + cmd.destOff] = (mem[p + cmd.destOff] + mem[p + cmd.srcOff] * cmd.value) & mask
+            elif kind == "MultAssign":
+                mem[p + cmd.destOff] = (mem[p + cmd.srcOff] * cmd.value) & mask
+            elif kind == "Right":
+                self.move(p + cmd.offset)
+            elif kind == "Input":
+                mem[p + cmd.offset] = self.inp[0] if self.inp else 0
+                self.inp = self.inp[1:]
+            elif kind == "Output":
+                self.write(mem[p + cmd.offset])
+            elif kind == "Dbg":
+                pass
+            elif kind == "If":
+                if mem[p + cmd.offset]:
+                    self.run(cmd.commands)
+            elif kind == "Loop":
+                while mem[self.p + cmd.offset]:
+                    self.run(cmd.commands)
+                    self.tick()
+            elif kind == "Region":
+                self.run(cmd.commands)
+            elif kind == "UnitLoop":
+                self.unit_loop(cmd)
+            elif kind == "Glider":
+                while mem[self.p] != cmd.target:
+                    self.move(self.p + cmd.offset)
+                    self.tick()
+            elif kind == "DecMove":
+                self.dec_move(cmd.offset, cmd.max_moves)
+            elif kind == "PrintRun":
+                self.print_run(cmd.offset, cmd.bias)
+            elif kind == "DivMod":
+                self.div_mod(cmd)
+            elif kind == "MemMove":
+                src = mem[p + cmd.srcOff : p + cmd.srcOff + cmd.mem_size]
+                mem[p + cmd.srcOff : p + cmd.srcOff + cmd.mem_size] = self.zeros(cmd.mem_size)
+                mem[p + cmd.destOff : p + cmd.destOff + cmd.mem_size] = src
+            else:
+                raise AssertionError(f"Unknown command {kind}")
+
+    # the nested loops themselves, one level at a time
+    def dec_move(self, step: int, levels: int):
+        mem = self.mem
+        level = 1
+        while True:
+            self.tick()
+            if level > levels:
+                mem[self.p] = 0
+                level = levels
+                self.move(self.p + step)
+            elif mem[self.p]:
+                mem[self.p] -= 1
+                level += 1
+            elif level == 1:
+                return
+            else:
+                level -= 1
+                self.move(self.p + step)
+
+    def unit_loop(self, cmd):
+        mem = self.mem
+        marker = cmd.offset
+        if not mem[self.p + marker]:
+            return
+        mem[self.p + marker] = (mem[self.p + marker] - cmd.bias) & self.mask
+        while True:
+            self.run(cmd.commands)
+            self.move(self.p + cmd.stride)
+            self.tick()
+            if (mem[self.p + marker] + cmd.bias) & self.mask == 0:
+                break
+        mem[self.p + marker] = (mem[self.p + marker] + cmd.bias) & self.mask
+
+    # the counting loop itself, a step at a time
+    def div_mod(self, cmd):
+        mem = self.mem
+        s, q, r = self.p + cmd.srcOff, self.p + cmd.quotOff, self.p + cmd.remOff
+        if not mem[s]:
+            return
+        while mem[s]:
+            self.tick()
+            mem[s] -= 1
+            mem[r] = (mem[r] + 1) & self.mask
+            if mem[r] == cmd.divisor & self.mask:
+                mem[r] = 0
+                mem[q] = (mem[q] + 1) & self.mask
+        for off in cmd.tempOffs:
+            mem[self.p + off] = 0
+
+    def print_run(self, step: int, bias: int):
+        mem = self.mem
+        if not mem[self.p]:
+            return
+        mem[self.p] = (mem[self.p] - bias) & self.mask
+        while mem[self.p] != -bias & self.mask:
+            self.tick()
+            value = mem[self.p]
+            mem[self.p] = 0
+            self.move(self.p + step)
+            self.write(value)
+        mem[self.p] = (mem[self.p] + bias) & self.mask
+
+
+def run(commands: Sequence[object], inp: bytes = b"", steps: int = 200_000, max_output: Optional[int] = None, bits: int = 8) -> result:
+    m = machine(inp, steps, max_output, bits)
+    reason = None
+    try:
+        m.run(commands)
+    except stopped as e:
+        reason = e.reason
+    except IndexError:
+        # an offset reaching past the tape, like a program laying out a large number
+        reason = "tape bounds"
+    return result(bytes(m.output), m.mem, m.p - ORIGIN, reason)
+
+
+# Returns None if the optimized commands behave like the reference ones, or what
+# differs. A reference run that halts must be matched exactly, output, tape and
+# pointer; one that is cut short only has its output compared as far as both got.
+def check(reference: Sequence[object], optimized: Sequence[object], inp: bytes = b"", steps: int = 200_000, bits: int = 8) -> Optional[str]:
+    ref = run(reference, inp, steps, bits=bits)
+    halted = ref.reason is None
+    opt = run(optimized, inp, 2 * steps, None if halted else len(ref.output), bits)
+    n = min(len(ref.output), len(opt.output))
+    for i in range(n):
+        if ref.output[i] != opt.output[i]:
+            return f"output byte {i} is {opt.output[i]}, expected {ref.output[i]}"
+    if not halted:
+        if opt.reason is None and len(opt.output) < len(ref.output):
+            return f"halted after {len(opt.output)} output bytes, expected at least {len(ref.output)}"
+        return None
+    if opt.reason is not None:
+        return f"stopped by {opt.reason} where the original halts"
+    if len(opt.output) != len(ref.output):
+        return f"printed {len(opt.output)} bytes, expected {len(ref.output)}"
+    if opt.p != ref.p:
+        return f"pointer ends at {opt.p}, expected {ref.p}"
+    if opt.tape != ref.tape:
+        cell = next(i for i in range(TAPE_SIZE) if opt.tape[i] != ref.tape[i])
+        return f"cell {cell - ORIGIN} is {opt.tape[cell]}, expected {ref.tape[cell]}"
+    return None
+
+
+# Random brainfuck mixing plain ops with the shapes the passes look for: clears,
+# copies, gliders, decrement-and-move nests, print runs, per-unit loops and
+# division by a constant or the cell size, with the remainder cleared first or not.
+def random_program(rng: random.Random, depth: int = 0) -> str:
+    code = ""
+    for _ in range(rng.randint(1, 8)):
+        r = rng.random()
+        if r < 0.1 and depth < 4:
+            code += "[" + random_program(rng, depth + 1) + "]"
+        elif r < 0.15:
+            code += "[-]"
+        elif r < 0.2:
+            code += "[->+>+<<]"
+        elif r < 0.25:
+            # n = 0 is a bare zero scan like [>]
+            n, move = rng.randint(0, 3), rng.choice("<>") * rng.randint(1, 3)
+            code += "+" * n + "[" + "-" * n + move + "+" * n + "]" + "-" * n
+        elif r < 0.3:
+            levels, move = rng.randint(1, 8), rng.choice("<>") * rng.randint(1, 3)
+            code += "[-" * levels + "[-]" + (move + "]") * levels
+        elif r < 0.33:
+            code += "[.[-]>]"
+        elif r < 0.36:
+            n, move = rng.randint(1, 3), rng.choice("<>") * rng.randint(1, 3)
+            code += "+" * n + "[" + "-" * n + rng.choice(["[-]", "[->+<]", ">+<", "+"]) + move + "+" * n + "]" + "-" * n
+        elif r < 0.39:
+            code += rng.choice(".,")
+        elif r < 0.41:
+            k = rng.randint(0, 12)
+            code += rng.choice(["", ">>[-]<<"]) + "[->>+>>[-]<[-]<[->+>+<<]>>[-<<+>>]<" + "-" * k + ">[-]+<[[-]>[-]<]>[[-]<<[-]<+>>>]<<<<]"
+        else:
+            code += rng.choice("+-<>") * rng.randint(1, 4)
+    return code
+
+
+def main(args: Optional[List[str]] = None):
+    from c2bf.bf import bfc
+
+    parser = argparse.ArgumentParser(description="Check that the bfc passes don't change what programs do.")
+    parser.add_argument("files", nargs="*", help="brainfuck files to check instead of random programs")
+    parser.add_argument("--count", type=int, default=2000, help="random programs to check")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--passes", default=bfc.Options().passes, help="pass spec, as for bfc --passes")
+    parser.add_argument("--steps", type=int, default=200_000, help="reference interpreter step budget")
+    parser.add_argument("--cell-bits", type=int, choices=bfc.CELL_BITS, default=8)
+    opts = parser.parse_args(args)
+
+    mask = bfc.cell_mask(opts.cell_bits)
+    failures = 0
+    if opts.files:
+        for path in opts.files:
+            with open(path) as fin:
+                commands = bfc.parse(fin.read())
+            error = check(commands, bfc.run_passes(commands, opts.passes, mask=mask), steps=opts.steps, bits=opts.cell_bits)
+            print(f"{path}: {error or 'ok'}")
+            failures += error is not None
+    else:
+        rng = random.Random(opts.seed)
+        for _ in range(opts.count):
+            code = random_program(rng)
+            inp = bytes(rng.randrange(256) for _ in range(8))
+            commands = bfc.parse(code)
+            error = check(commands, bfc.run_passes(commands, opts.passes, mask=mask), inp, opts.steps, opts.cell_bits)
+            if error is not None:
+                failures += 1
+                print(f"{code}\n  {error}")
+        print(f"{opts.count} programs, {failures} failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import shutil
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import c2bf.bf.bfc as bfc
+import c2bf.build.threaded as threaded
+
+
+# The optimizer "version" is the digest of bfc.py and the threaded driver, so any
+# change to parsing, optimization or code generation invalidates cached builds.
+def bfc_version() -> str:
+    h = hashlib.sha256(Path(bfc.__file__).read_bytes())
+    h.update(Path(threaded.__file__).read_bytes())
+    return h.hexdigest()
+
+
+# A threaded build has two programs, both are part of its key
+def build_key(bf_paths: Path | Iterable[Path], *flags: str) -> str:
+    h = hashlib.sha256()
+    for i, bf_path in enumerate([bf_paths] if isinstance(bf_paths, Path) else bf_paths):
+        if i:
+            h.update(b"\0")
+        with bf_path.open("rb") as fin:
+            while chunk := fin.read(1 << 20):
+                h.update(chunk)
+    h.update(b"\0" + bfc_version().encode())
+    for flag in flags:
+        h.update(b"\0" + flag.encode())
+    return h.hexdigest()
+
+
+def entry_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+# Content-addressed store of build outputs, one directory per key.
+# Entries are evicted least recently used first once there are more than
+# max_entries of them or they take more than max_bytes.
+class buildcache:
+    def __init__(self, root: Path, max_entries: int = 8, max_bytes: int = 512 << 20):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def entries(self) -> List[Path]:
+        return sorted((p for p in self.root.iterdir() if p.is_dir() and not p.name.startswith("tmp-")),
+                      key=lambda p: p.stat().st_mtime)
+
+    def lookup(self, key: str) -> Optional[Path]:
+        path = self.root.joinpath(key)
+        if not path.is_dir():
+            return None
+        os.utime(path)
+        return path
+
+    # Returns an empty scratch directory to build into; commit() moves it into place.
+    def prepare(self, key: str) -> Path:
+        path = self.root.joinpath(f"tmp-{key}-{os.getpid()}")
+        shutil.rmtree(path, ignore_errors=True)
+        path.mkdir()
+        return path
+
+    # replace drops an existing entry for the key first, for a forced rebuild
+    def commit(self, key: str, scratch: Path, replace: bool = False) -> Path:
+        path = self.root.joinpath(key)
+        if replace:
+            shutil.rmtree(path, ignore_errors=True)
+        try:
+            scratch.rename(path)
+        except OSError:
+            # someone else stored the same key first, theirs is just as good
+            shutil.rmtree(scratch, ignore_errors=True)
+        os.utime(path)
+        self.evict(keep=[path])
+        return path
+
+    def evict(self, keep: Iterable[Path] = ()):
+        keep = set(keep)
+        entries = self.entries()
+        sizes = {p: entry_size(p) for p in entries}
+        total = sum(sizes.values())
+        for path in list(entries):
+            if len(entries) <= self.max_entries and total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            entries.remove(path)
+            total -= sizes[path]
+
+
+class stagetimer:
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.stages.append((name, time.perf_counter() - start))
+
+    def __str__(self):
+        return ", ".join(f"{name} {secs:.3f}s" for name, secs in self.stages)
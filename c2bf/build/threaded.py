@@ -0,0 +1,165 @@
+# Two-stage C build: a producer and a consumer brainfuck program run in separate
+# threads, with everything the producer prints going through a bounded ring buffer
+# to the consumer's input instead of stdout. The ring carries whole cells, so the
+# producer can hand over values of any cell width.
+# Usage: python -m c2bf.build.threaded [bfc options] Producer.bf Consumer.bf Output.c
+
+import pathlib
+import sys
+
+from typing import List, Optional, Sequence
+
+from c2bf.bf import bfc, difftest
+
+
+RING_SIZE = 1 << 16
+
+
+def ring_c(size: int) -> str:
+    def indent(line: str, level: int) -> str:
+        return "\t" * level + line + "\n"
+    result = ""
+    result += indent(f"#define RING_SIZE ((size_t){size}u)", 0)
+    result += indent("static cell ring[RING_SIZE];", 0)
+    result += indent("static _Atomic size_t ring_head = 0;", 0)
+    result += indent("static _Atomic size_t ring_tail = 0;", 0)
+    result += indent("static atomic_int ring_closed = 0;", 0)
+    result += indent("", 0)
+    # each side keeps the last index it saw of the other, so it only touches the
+    # other side's cache line when the ring looks full or empty
+    result += indent("static void ring_put(cell value) {", 0)
+    result += indent("static size_t tail_seen = 0;", 1)
+    result += indent("size_t head = atomic_load_explicit(&ring_head, memory_order_relaxed);", 1)
+    result += indent("while (head - tail_seen == RING_SIZE) {", 1)
+    result += indent("tail_seen = atomic_load_explicit(&ring_tail, memory_order_acquire);", 2)
+    result += indent("if (head - tail_seen == RING_SIZE)", 2)
+    result += indent("sched_yield();", 3)
+    result += indent("}", 1)
+    result += indent("ring[head % RING_SIZE] = value;", 1)
+    result += indent("atomic_store_explicit(&ring_head, head + 1, memory_order_release);", 1)
+    result += indent("}", 0)
+    result += indent("", 0)
+    result += indent("static void ring_close(void) {", 0)
+    result += indent("atomic_store_explicit(&ring_closed, 1, memory_order_release);", 1)
+    result += indent("}", 0)
+    result += indent("", 0)
+    result += indent("// The consumer ends the program once the producer is done and the ring is empty", 0)
+    result += indent("static cell ring_get(void) {", 0)
+    result += indent("static size_t head_seen = 0;", 1)
+    result += indent("size_t tail = atomic_load_explicit(&ring_tail, memory_order_relaxed);", 1)
+    result += indent("while (head_seen == tail) {", 1)
+    result += indent("int closed = atomic_load_explicit(&ring_closed, memory_order_acquire);", 2)
+    result += indent("head_seen = atomic_load_explicit(&ring_head, memory_order_acquire);", 2)
+    result += indent("if (head_seen != tail)", 2)
+    result += indent("break;", 3)
+    result += indent("if (closed)", 2)
+    result += indent("exit(EXIT_SUCCESS);", 3)
+    result += indent("sched_yield();", 2)
+    result += indent("}", 1)
+    result += indent("cell value = ring[tail % RING_SIZE];", 1)
+    result += indent("atomic_store_explicit(&ring_tail, tail + 1, memory_order_release);", 1)
+    result += indent("return value;", 1)
+    result += indent("}", 0)
+    return result
+
+
+def has_print_run(commands: List[bfc.Command]) -> bool:
+    return any(isinstance(cmd, bfc.PrintRun) or has_print_run(getattr(cmd, "commands", [])) for cmd in commands)
+
+
+# Each kernel is a function over its own tape. The producer's output and the
+# consumer's input are redirected to the ring with a macro around the function.
+def threaded_c(producer: List[bfc.Command], consumer: List[bfc.Command], options: bfc.Options) -> str:
+    def indent(line: str, level: int = 1) -> str:
+        return "\t" * level + line + "\n"
+    producer_body = bfc.commands_to_c(producer, "producer", False, 1, options)
+    consumer_body = bfc.commands_to_c(consumer, "consumer", False, 1, options)
+
+    result = bfc.c_prelude(options, None, ["pthread.h", "sched.h", "stdatomic.h"])
+    result += indent("", 0)
+    result += ring_c(RING_SIZE)
+    result += indent("", 0)
+    result += indent("#define bf_putchar ring_put", 0)
+    result += indent("static void *producer(void *arg) {", 0)
+    result += indent("cell *mem = arg;")
+    result += indent("cell *p = &mem[1000];")
+    result += producer_body
+    result += indent("ring_close();")
+    result += indent("return NULL;")
+    result += indent("}", 0)
+    result += indent("#undef bf_putchar", 0)
+    result += indent("", 0)
+    result += indent("#define bf_read ring_get", 0)
+    result += indent("static void consumer(cell *mem) {", 0)
+    result += indent("cell *p = &mem[1000];")
+    result += consumer_body
+    result += indent("}", 0)
+    result += indent("#undef bf_read", 0)
+    result += indent("", 0)
+    result += indent("int main(int argc, char **argv) {", 0)
+    # both tapes are opened here, the mmap tape registry isn't thread safe
+    if options.tape == "mmap":
+        result += indent("cell *producer_mem = (cell *)tape_open(TAPE_LIMIT);")
+        result += indent("cell *consumer_mem = (cell *)tape_open(TAPE_LIMIT);")
+    else:
+        result += indent("static cell producer_mem[TAPE_SIZE];")
+        result += indent("static cell consumer_mem[TAPE_SIZE];")
+    result += indent("out_init(argc, argv);")
+    result += indent("pthread_t thread;")
+    result += indent("int error = pthread_create(&thread, NULL, producer, producer_mem);")
+    result += indent("if (error != 0) {")
+    result += indent("fprintf(stderr, \"pthread_create: %s\\n\", strerror(error));", 2)
+    result += indent("return EXIT_FAILURE;", 2)
+    result += indent("}")
+    result += indent("consumer(consumer_mem);")
+    result += indent("out_flush();")
+    result += indent("return EXIT_SUCCESS;")
+    result += indent("}", 0)
+    return result
+
+
+def compile_kernel(path: pathlib.Path, options: bfc.Options, passes: str) -> List[bfc.Command] | str:
+    parsed = bfc.parse(path.read_text())
+    stats = bfc.PassStats() if options.pass_stats else None
+    commands = bfc.run_passes(parsed, passes, stats, bfc.cell_mask(options.cell_bits))
+    if stats is not None:
+        print(f"{path}:\n{stats.report()}", file=sys.stderr)
+    if options.verify:
+        error = difftest.check(parsed, commands, bits=options.cell_bits)
+        if error is not None:
+            return f"{path}: Optimized program differs from the original ({error}), rerun with --no-verify to keep it anyway"
+    return commands
+
+
+def main(args: Sequence[str]) -> Optional[str]:
+    parsed = bfc.parse_options(args)
+    if isinstance(parsed, str):
+        return parsed
+    options, args = parsed
+    if len(args) != 3 or not args[2].endswith(".c"):
+        return "Usage: python -m c2bf.build.threaded [bfc options] Producer.bf Consumer.bf Output.c"
+    if options.profile is not None or options.checkpoints or options.telemetry:
+        return "Profiling, checkpoints and telemetry aren't supported in threaded builds"
+    paths = [pathlib.Path(arg) for arg in args[:2]]
+    for path in paths:
+        if not path.is_file():
+            return f"{path}: Not a file"
+
+    producer_passes = ",".join(p for p in options.passes.split(",") if p.removesuffix("*") != "printruns")
+    producer = compile_kernel(paths[0], options, producer_passes)
+    if isinstance(producer, str):
+        return producer
+    # print runs write straight to the output buffer, which only the consumer may touch
+    if has_print_run(producer):
+        return f"{paths[0]}: The producer can't have print runs"
+    consumer = compile_kernel(paths[1], options, options.passes)
+    if isinstance(consumer, str):
+        return consumer
+    pathlib.Path(args[2]).write_text(threaded_c(producer, consumer, options))
+    return None
+
+
+if __name__ == "__main__":
+    errmsg = main(sys.argv[1:])
+    if errmsg is not None:
+        sys.exit(errmsg)
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Hashable, NamedTuple
+
+from c2bf.bf.code import cells
+from c2bf.bf.code.main import BFCode
+from c2bf.compile.mem.units import memrange
+
+
+class cacheinfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+def memokey(arg: Any) -> Hashable:
+    if isinstance(arg, memrange):
+        return (memrange, arg.unit, tuple(arg.indices))
+    if isinstance(arg, (list, tuple)):
+        return (type(arg), tuple(memokey(a) for a in arg))
+    # BFCode and workspaces hash by identity, which is what we want for mutable code
+    return arg
+
+
+# LRU cache for code generating primitives. Results are frozen so the shared
+# subtrees can't be mutated by callers that += onto them. The cell width is part
+# of the key, the same call can give different code at another width.
+class memocache:
+    def __init__(self, maxsize: int = 1 << 14):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[Hashable, BFCode] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__[F: Callable[..., BFCode]](self, func: F) -> F:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func, cells.bits(), memokey(args), tuple((k, memokey(v)) for k, v in sorted(kwargs.items())))
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+            code = func(*args, **kwargs)
+            if self.maxsize > 0:
+                self.entries[key] = code.freeze()
+                if len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+            return code
+        return wrapper # type: ignore
+
+    def info(self) -> cacheinfo:
+        return cacheinfo(self.hits, self.misses, self.maxsize, len(self.entries))
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+
+PRIMITIVES = memocache()
@@ -1,7 +1,9 @@
 from typing import List, Type
 
+from c2bf.bf.code import cells
 from c2bf.bf.code.common import bf_b, bf_f, bf_set, bf_sum
 from c2bf.bf.code.main import BFCode
+from c2bf.compile.mem.memo import PRIMITIVES
 from c2bf.compile.mem.units import USIZE, memrange, unit
 
 type CodeParam = BFCode | str
@@ -26,27 +28,35 @@ class workspace:
 
 
     # movement
+    @PRIMITIVES
     def to(self, mr: memrange):
         return bf_f(self.get_distance(mr))
+    @PRIMITIVES
     def back(self, mr: memrange):
         return bf_b(self.get_distance(mr))
 
+    @PRIMITIVES
     def tb(self, mr: memrange, code: CodeParam):
         return self.to(mr) + code + self.back(mr)
+    @PRIMITIVES
     def bt(self, mr: memrange, code: CodeParam):
         return self.back(mr) + code + self.to(mr)
 
 
     # memory
+    @PRIMITIVES
     def clear(self, mr: memrange):
         return bf_sum(self.tb(mc, "[-]") for mc in mr)
+    @PRIMITIVES
     def set(self, mr: memrange, vals: List[int]):
         assert(mr.size == len(vals))
         return bf_sum(self.tb(mc, bf_set(v, True)) for mc, v in zip(mr, vals))
     
+    @PRIMITIVES
     def move(self, src: memrange, dest: memrange):
         assert(src.size == dest.size)
         return self.clear(dest) + bf_sum(self.foreach(s, self.inc(d)) for s, d in zip(src, dest))
+    @PRIMITIVES
     def copy(self, src: memrange, dest: memrange, temp: memrange):
         assert(src.size == dest.size)
         assert(temp.size == 1)
@@ -58,11 +68,14 @@ class workspace:
 
 
     # math
+    @PRIMITIVES
     def inc(self, mr: memrange):
         return bf_sum(self.tb(mc, "+") for mc in mr)
+    @PRIMITIVES
     def dec(self, mr: memrange):
         return bf_sum(self.tb(mc, "-") for mc in mr)
 
+    @PRIMITIVES
     def inc_num(self, mr: memrange, t1: memrange, t2: memrange, clear_temps = True):
         if mr.size == 1: 
             return self.inc(mr)
@@ -72,6 +85,7 @@ class workspace:
         code += self.inc(mr[-1]) + self.copy(mr[-1], t1, t2) + self.not_(t1, t2)
         code += self.if_(t1, self.inc_num(mr[:-1], t1, t2, False))
         return code
+    @PRIMITIVES
     def dec_num(self, mr: memrange, t1: memrange, t2: memrange, clear_temps = True):
         if mr.size == 1:
             return self.dec(mr)
@@ -82,6 +96,7 @@ class workspace:
         code += self.if_(t1, self.dec_num(mr[:-1], t1, t2, False))
         return code
 
+    @PRIMITIVES
     def lshift(self, mr: memrange, t1: memrange, t2: memrange):
         assert(t1.size == t2.size == 1)
         code = self.clear(t1) + self.clear(t2)
@@ -93,27 +108,44 @@ class workspace:
                 code += self.loop(t1, self.dec(t1) * 2 + self.inc(mc) * 2 + self.dec(t2))
                 code += self.if_(t2, self.inc(mr[i - 1]))
         return code
+    @PRIMITIVES
     def rshift(self, mr: memrange, t1: memrange, t2: memrange):
         assert(t1.size == t2.size == 1)
         code = self.clear(t1) + self.clear(t2)
         for i in range(mr.size - 1, -1, -1):
             mc = mr[i]
-            code += self.foreach(mc, self.inc(t1) + self.inc(t2) * 128)
-            code += self.if_(t2, self.dec(t1) + self.inc(mr[i + 1]) * 128 * (i != mr.size - 1))
+            half = cells.size() // 2
+            code += self.foreach(mc, self.inc(t1) + self.inc(t2) * half)
+            code += self.if_(t2, self.dec(t1) + self.inc(mr[i + 1]) * half * (i != mr.size - 1))
             code += self.loop(t1, self.dec(t1) * 2 + self.inc(mc))
         return code
 
+    # src is counted down into rem, which wraps back to 0 at k and adds 1 to quot
+    # each time. With rem below k to start with, src ends up 0, rem at (rem + src) % k
+    # and quot (rem + src) // k higher; k may be the cell size, for an add with carry.
+    # bfc turns the loop into a DivMod, keep the shape in step with try_extract_divmod.
+    @PRIMITIVES
+    def divmod_const(self, src: memrange, quot: memrange, rem: memrange, k: int, t1: memrange, t2: memrange):
+        assert(src.size == quot.size == rem.size == t1.size == t2.size == 1)
+        assert(0 < k <= cells.size())
+        step = self.inc(rem) + self.copy(rem, t1, t2) + self.tb(t1, "-" * (k % cells.size()))
+        step += self.set(t2, [1]) + self.if_(t1, self.clear(t2)) + self.if_(t2, self.clear(rem) + self.inc(quot))
+        return self.foreach(src, step)
+
 
     # logic
+    @PRIMITIVES
     def not_(self, mr: memrange, temp: memrange):
         assert(mr.size == 1)
         assert(temp.size == 1)
         return self.set(temp, [1]) + self.if_(mr, self.dec(temp)) + self.move(temp, mr)
 
+    @PRIMITIVES
     def eq(self, mr1: memrange, mr2: memrange):
         assert(mr1.size == mr2.size == 1)
         return self.foreach(mr2, self.dec(mr1)) + self.not_(mr1, mr2)
 
+    @PRIMITIVES
     def and_(self, result: memrange, *mrs: memrange):
         assert(result.size == 1)
         code = self.clear(result)
@@ -124,6 +156,7 @@ class workspace:
         code += short_circuit
         return code
 
+    @PRIMITIVES
     def or_(self, result: memrange, *mrs: memrange):
         assert(result.size == 1)
         code = self.clear(result)
@@ -131,6 +164,7 @@ class workspace:
             for mc in mr:
                 code += self.if_(mc, self.set(result, [1]))
         return code
+    @PRIMITIVES
     def or_keep(self, result: memrange, temp: memrange, *mrs: memrange):
         assert(result.size == 1)
         assert(temp.size == 1)
@@ -142,17 +176,21 @@ class workspace:
 
 
     # control
+    @PRIMITIVES
     def if_(self, mr: memrange, code: CodeParam):
         assert(mr.size == 1)
         return self.tb(mr, "[[-]" + self.bt(mr, code) + "]")
 
+    @PRIMITIVES
     def loop(self, mr: memrange, code: CodeParam):
         assert(mr.size == 1)
         return self.tb(mr, "[" + self.bt(mr, code) + "]")
+    @PRIMITIVES
     def foreach(self, mr: memrange, code: CodeParam):
         assert(mr.size == 1)
         return self.tb(mr, "[-" + self.bt(mr, code) + "]")
+    @PRIMITIVES
     def while_(self, mr: memrange, expr: CodeParam, code: CodeParam):
         assert(mr.size == 1)
-        return self.set(mr, [255]) + self.loop(mr, self.inc(mr) + self.if_(mr, code) + expr)
+        return self.set(mr, [-1]) + self.loop(mr, self.inc(mr) + self.if_(mr, code) + expr)
 
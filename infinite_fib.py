@@ -1,52 +1,224 @@
+import argparse
+import importlib.util
+import shutil
 import subprocess
+import sys
+import time
 
 from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from c2bf.bf.bfc import main as bfc_main
+from c2bf.bf.code import cells
 from c2bf.bf.code.common import bf_b, bf_f, bf_glide_b, bf_glide_f
 from c2bf.bf.code.main import BFCode
-from c2bf.compile.mem.units import USIZE, memrange, unit
+from c2bf.build.cache import buildcache, build_key, stagetimer
+from c2bf.build.threaded import main as threaded_main
+from c2bf.compile.mem.memo import PRIMITIVES
+from c2bf.compile.mem.units import USIZE, memrange, memunit, unit
+from c2bf.compile.mem.workspace import workspace
 from c2bf.compile.mem.workspaces.unit import UNIT, nextunit, prevunit
 
 
-def infinite_fib():
-    code = bf_f(USIZE * 3)
-    code += UNIT.set(unit.n0, [0])
-    code += UNIT.set(unit.n1, [1])
+MODES = ("binary", "decimal")
+
+# marker values, counted down from the top of a cell so they read the same at every width
+START = -1 # the unit before the number
+END = -2 # the unit after its zero top limb, and the end of the digit stack
+
+
+# the two units before the START one hold the counters for sparse printing: how many
+# terms to skip before the next printed one, and how many are left to print. Each
+# is a number of up to COUNTER_LIMBS cells, most significant first.
+@memunit
+class termsunit(unit):
+    pass
 
-    code += UNIT.set(prevunit.marker, [255])
-    code += UNIT.set(memrange([USIZE * 2], unit=unit), [254])
+@memunit
+class strideunit(unit):
+    pass
 
-    code += UNIT.loop(prevunit.marker, fib_pass())
+COUNTERS = workspace([termsunit, strideunit, prevunit, unit, nextunit], unit.marker)
+COUNTER_LIMBS = 5
+
+
+# binary mode keeps one limb per cell, so the base is the cell size. The program
+# prints terms[1] first; start_index instead starts the output at F(start_index).
+# With every > 1 only every that many'th term is printed, and max_terms stops the
+# program after printing that many. A threaded program sends the terms to
+# conversion_kernel instead of printing them.
+def infinite_fib(mode: str = "binary", terms: Tuple[int, int] = (0, 1), start_index: Optional[int] = None,
+                 every: int = 1, max_terms: Optional[int] = None, threaded: bool = False):
+    assert(mode in MODES)
+    assert(every >= 1 and (max_terms is None or max_terms >= 1))
+    if start_index is not None:
+        assert(start_index >= 0)
+        fn, fn1 = fib_pair(start_index)
+        terms = (fn1 - fn, fn)
+    code = initial_terms(terms, cells.size() if mode == "binary" else 10)
+    if max_terms is not None:
+        code += COUNTERS.set(termsunit.empty[:COUNTER_LIMBS], counter_limbs(max_terms))
+    code += UNIT.loop(prevunit.marker, fib_pass(mode, every, max_terms is not None, threaded))
 
     return code
 
 
-def fib_pass():
-    code = output_n1()
+# The consumer half of a threaded build: reads each term the way send_n1 writes it
+# into the same layout, prints it and clears the units again
+def conversion_kernel(mode: str):
+    assert(mode in MODES)
+    code = bf_f(USIZE * 3) + UNIT.set(prevunit.marker, [START])
+    code += UNIT.loop(prevunit.marker, convert := BFCode())
 
-    code += (glide_add := BFCode())
+    receive = UNIT.clear(unit.empty[0]) + UNIT.tb(unit.n1, ",") + bf_f(USIZE) + UNIT.tb(unit.empty[0], ",")
+    convert += (UNIT.tb(unit.empty[0], ",") + UNIT.loop(unit.empty[0], receive)).label("receive")
+    convert += UNIT.set(unit.marker, [END]) + bf_glide_b(START, USIZE) + bf_f(USIZE)
 
-    glide_add += "++[--" + (add_unit := BFCode()) + bf_f(USIZE) + "++]--"
+    convert += output_n1().label("output_n1") if mode == "binary" else output_decimal().label("output_decimal")
 
-    # add n0+n1 and possible leftover carry
-    add_unit += UNIT.copy(unit.n0, unit.empty[1], unit.empty[0])
-    add_unit += UNIT.copy(unit.n1, unit.empty[2], unit.empty[0])
-    add_unit += UNIT.foreach(unit.empty[2], inc_result := BFCode())
-    inc_result += UNIT.inc_num(unit.empty[:2], nextunit.empty[0], nextunit.empty[1])
-    add_unit += UNIT.if_(prevunit.empty[0], inc_result) # carry
+    convert += glide_each_unit(UNIT.clear(unit.empty + unit.n0 + unit.n1)).label("clear_units")
+    convert += bf_glide_f(END, USIZE) + "[-]" + bf_glide_b(START, USIZE) + bf_f(USIZE)
+    return code
 
-    # update n0 and n1
-    add_unit += UNIT.move(unit.n1, unit.n0)
-    add_unit += UNIT.move(unit.empty[1], unit.n1)
+
+def counter_limbs(value: int):
+    limbs = []
+    for _ in range(COUNTER_LIMBS):
+        value, limb = divmod(value, cells.size())
+        limbs.insert(0, limb)
+    assert(value == 0) # too large for the counter
+    return limbs
+
+
+def fib_pair(n: int):
+    # fast doubling, returns (F(n), F(n+1))
+    a, b = 0, 1
+    for bit in bin(n)[2:]:
+        a, b = a * (2 * b - a), a * a + b * b
+        if bit == "1":
+            a, b = b, a + b
+    return a, b
+
+
+# lay out n0 and n1 one limb per unit, least significant first, followed by
+# a zero limb and the END marker
+def initial_terms(terms: Tuple[int, int], base: int):
+    n0, n1 = terms
+    limbs: List[Tuple[int, int]] = []
+    while n0 or n1 or not limbs:
+        limbs.append((n0 % base, n1 % base))
+        n0, n1 = n0 // base, n1 // base
+
+    code = bf_f(USIZE * 3)
+    for i, (d0, d1) in enumerate(limbs):
+        if i:
+            code += bf_f(USIZE)
+        code += UNIT.set(unit.n0, [d0])
+        code += UNIT.set(unit.n1, [d1])
+    code += bf_b(USIZE * (len(limbs) - 1))
+
+    code += UNIT.set(prevunit.marker, [START])
+    code += UNIT.set(memrange([USIZE * (len(limbs) + 1)], unit=unit), [END])
+    return code
+
+
+def fib_pass(mode: str, every: int = 1, limited: bool = False, threaded: bool = False):
+    if threaded:
+        output = send_n1().label("send_n1")
+    else:
+        output = output_n1().label("output_n1") if mode == "binary" else output_decimal().label("output_decimal")
+    code = sparse_output(output, every, limited) if every > 1 or limited else output
+
+    code += (glide_add := BFCode()).label("add")
+
+    add_unit = add_binary_unit() if mode == "binary" else add_decimal_unit()
+    glide_add += "++[--" + add_unit + bf_f(USIZE) + "++]--"
     
-    # move 254 marker forward if it's too close
+    # move END marker forward if it's too close
     glide_add += UNIT.copy(prevunit.n1, unit.empty[0], unit.empty[1])
-    glide_add += UNIT.if_(unit.empty[0], move_marker := BFCode())
-    move_marker += UNIT.clear(unit.marker) + UNIT.set(nextunit.marker, [254])
+    glide_add += UNIT.if_(unit.empty[0], move_marker := BFCode()).label("move_marker")
+    move_marker += UNIT.clear(unit.marker) + UNIT.set(nextunit.marker, [END])
+
+    code += bf_glide_b(START, USIZE) + bf_f(USIZE)
+
+    # clearing START ends the main loop, after this pass has glided back to it
+    if limited:
+        code += COUNTERS.if_(termsunit.marker, COUNTERS.clear(prevunit.marker))
+
+    return code
+
+
+# prints a term only when the stride counter is down to zero, then restarts it
+# at every - 1; counts printed terms down and flags the last one
+def sparse_output(output: BFCode, every: int, limited: bool):
+    S = COUNTERS
+    t1, t2 = strideunit.n0, strideunit.n1
+    code = BFCode()
+    show = output
+    if limited:
+        remaining = termsunit.empty[:COUNTER_LIMBS]
+        show += S.dec_num(remaining, t1, t2)
+        show += S.or_keep(termsunit.empty[5], t1, remaining)
+        show += S.set(termsunit.marker, [1]) + S.if_(termsunit.empty[5], S.clear(termsunit.marker))
+    if every > 1:
+        gap = strideunit.empty[:COUNTER_LIMBS]
+        show += S.set(gap, counter_limbs(every - 1))
+        code += S.or_keep(strideunit.marker, t1, gap)
+        code += S.set(strideunit.empty[5], [1])
+        code += S.if_(strideunit.marker, S.dec_num(gap, t1, t2) + S.clear(strideunit.empty[5]))
+        code += S.if_(strideunit.empty[5], show)
+    else:
+        code += show
+    return code.label("sparse_output")
+
+
+# writes n1 of every unit up to END, each limb after a 1, and a 0 after the last
+def send_n1():
+    code = glide_each_unit(UNIT.set(unit.empty[0], [1]) + UNIT.tb(unit.empty[0], ".[-]") + UNIT.tb(unit.n1, "."))
+    code += UNIT.clear(unit.empty[0]) + UNIT.tb(unit.empty[0], ".")
+    return code
+
+
+def add_binary_unit():
+    # add n0+n1 and possible leftover carry, the sum wrapping at the cell size
+    # and carrying into empty[0]
+    code = UNIT.copy(unit.n0, unit.empty[1], unit.empty[0])
+    code += UNIT.copy(unit.n1, unit.empty[2], unit.empty[0])
+    for addend in (unit.empty[2], prevunit.empty[0]):
+        code += UNIT.divmod_const(addend, unit.empty[0], unit.empty[1], cells.size(), unit.empty[3], unit.empty[4])
+
+    # update n0 and n1
+    code += UNIT.move(unit.n1, unit.n0)
+    code += UNIT.move(unit.empty[1], unit.n1)
+    return code
+
+
+def add_decimal_unit():
+    # add n0+n1 and possible leftover carry one digit at a time,
+    # wrapping at 10 and carrying into empty[0]
+    code = UNIT.copy(unit.n0, unit.empty[1], unit.empty[0])
+    code += UNIT.copy(unit.n1, unit.empty[2], unit.empty[0])
+    code += UNIT.if_(prevunit.empty[0], UNIT.inc(unit.empty[2])) # carry
+    code += UNIT.foreach(unit.empty[2], inc_digit := BFCode())
+    inc_digit += UNIT.inc(unit.empty[1])
+    inc_digit += UNIT.copy(unit.empty[1], unit.empty[3], unit.empty[4])
+    inc_digit += UNIT.set(unit.empty[4], [10]) + UNIT.eq(unit.empty[3], unit.empty[4])
+    inc_digit += UNIT.if_(unit.empty[3], UNIT.clear(unit.empty[1]) + UNIT.inc(unit.empty[0]))
+
+    # update n0 and n1
+    code += UNIT.move(unit.n1, unit.n0)
+    code += UNIT.move(unit.empty[1], unit.n1)
+    return code
+
 
-    code += bf_glide_b(255, USIZE) + bf_f(USIZE)
+def output_decimal():
+    # n1 is already in decimal, print it from the most significant digit
+    # (skipping the zero top limb) back down to the START marker
+    code = bf_glide_f(END, USIZE) + bf_b(USIZE * 2)
+    code += "+[-" + UNIT.tb(unit.n1, "+" * 48 + "." + "-" * 48) + bf_b(USIZE) + "+]-"
+    code += bf_f(USIZE)
 
+    code += UNIT.tb(unit.empty[0], "+" * 10 + ".[-]")
     return code
 
 
@@ -57,95 +229,48 @@ def output_n1():
     rc = unit.empty[5] # remainder cell
 
     # clear digit stack
-    code += bf_glide_f(254, USIZE) + ">[-]<" + bf_glide_b(255, USIZE) + bf_f(USIZE)
+    code += bf_glide_f(END, USIZE) + ">[-]<" + bf_glide_b(START, USIZE) + bf_f(USIZE)
 
     # copy n1 to rc for every unit
-    code += glide_each_unit(UNIT.copy(unit.n1, rc, unit.empty[0]))
+    code += glide_each_unit(UNIT.copy(unit.n1, rc, unit.empty[0])).label("copy_n1")
 
     keep_digitizing = prevunit.empty[0]
-    keep_dividing = prevunit.empty[1]
     code += UNIT.set(keep_digitizing, [1])
     code += UNIT.loop(keep_digitizing, digitize_code := BFCode())
 
-
-    digitize_code += UNIT.set(keep_dividing, [1])
-    digitize_code += UNIT.loop(keep_dividing, div_code := BFCode())
-
     # DIVISION CODE
 
-    # divide each remainder by 10
-    div_code += glide_each_unit(div10_unit := BFCode())
-
-    # split rc to qc & rc
-    inc_qc_clear_rc = UNIT.bt(unit.empty[1], inc_inf_num(qc, prevunit.empty[2], prevunit.empty[3], 253) + UNIT.clear(rc) + UNIT.set(unit.empty[3], [1]))
-    inc_rc = UNIT.bt(unit.empty[1], UNIT.inc(rc))
-
-    div10 = inc_rc + inc_qc_clear_rc + "<"
-    for _ in range(9):
-        div10 = "[-" + inc_rc + div10 + "]"
-    div10 = UNIT.tb(unit.empty[1], "[-" + inc_rc + div10 + ">]>[-<]<")
-    div10 = UNIT.set(unit.marker, [253]) + UNIT.set(unit.empty[:4], [0, 0, 0, 1]) + UNIT.move(rc, unit.empty[1]) + div10
-    div10 += UNIT.clear(unit.marker) + UNIT.clear(unit.empty[:4])
-    
-    div10_unit += UNIT.copy(rc, unit.empty[0], unit.empty[1])
-    div10_unit += UNIT.if_(unit.empty[0], div10)
-
-    # split each rc to previous unit
-    # rc -> 25 * qc[-1], 6 * rc[-1]
-    pqc = memrange([qc.index - USIZE], unit=unit)
-    prc = memrange([rc.index - USIZE], unit=unit)
-    div_code += bf_f(USIZE) + glide_each_unit(split_rc := BFCode())
-    split_rc += UNIT.set(unit.marker, [253])
-    split_rc += UNIT.foreach(rc, (inc_pqc_prc := BFCode()))
-    inc_pqc_prc += UNIT.set(unit.empty[2], [25])
-    inc_pqc_prc += UNIT.foreach(unit.empty[2], inc_inf_num(pqc, prevunit.empty[0], prevunit.empty[1], 253))
-    inc_pqc_prc += UNIT.set(unit.empty[2], [6])
-    inc_pqc_prc += UNIT.foreach(unit.empty[2], inc_inf_num(prc, prevunit.empty[0], prevunit.empty[1], 253))
-    split_rc += UNIT.clear(unit.marker)
-
-
-    # check all remainder values to see if it's < 10 yet
-    div_code += UNIT.clear(prevunit.empty[3])
-    div_code += UNIT.set(unit.empty[0], [10])
-    div_code += UNIT.copy(rc, unit.empty[1], unit.empty[2])
-    div_code += UNIT.foreach(unit.empty[0], (check_zero := BFCode()) + UNIT.dec(unit.empty[1]))
-    check_zero += UNIT.copy(unit.empty[1], unit.empty[2], unit.empty[3])
-    check_zero += UNIT.not_(unit.empty[2], unit.empty[3])
-    check_zero += UNIT.if_(unit.empty[2], UNIT.inc(prevunit.empty[3]))
-    div_code += UNIT.clear(unit.empty[1])
-
-    # if prevunit.empty[3] then the first rc < 10
-    # and now need to check other rcs
-    div_code += UNIT.if_(prevunit.empty[3], check_all_rcs := BFCode())
-    check_all_rcs += UNIT.set(prevunit.empty[3], [1])
-    check_all_rcs += bf_f(USIZE) + glide_each_unit(check_rc := BFCode())
-    check_rc += UNIT.copy(rc, unit.empty[0], unit.empty[1])
-    check_rc += UNIT.if_(unit.empty[0], clear_flag := BFCode())
-    clear_flag += bf_glide_b(255, USIZE) + bf_f(USIZE)
-    clear_flag += UNIT.clear(prevunit.empty[3])
-    # glide to unit right before 254 to end it quick
-    clear_flag += bf_glide_f(254, USIZE) + bf_b(USIZE)
-
-    # if prevunit.empty[3] then stop dividing
-    check_all_rcs += UNIT.if_(prevunit.empty[3], UNIT.clear(keep_dividing))
+    # long division by 10 from the top limb down. The remainder carried into a limb
+    # from the one above is worth a cell size times more, size // 10 * 10 + size % 10,
+    # so it adds size // 10 to the quotient and size % 10 to the limb's own remainder,
+    # which stays below 64 and the quotient below the cell size. The last remainder
+    # is carried into the START unit and is the next digit.
+    carry = unit.empty[3]
+    qc_share, rc_share = divmod(cells.size(), 10)
+    div10 = UNIT.move(rc, unit.empty[0])
+    div10 += UNIT.divmod_const(unit.empty[0], qc, unit.empty[1], 10, unit.empty[2], rc)
+    div10 += UNIT.foreach(carry, UNIT.tb(qc, "+" * qc_share) + UNIT.tb(unit.empty[1], "+" * rc_share))
+    div10 += UNIT.divmod_const(unit.empty[1], qc, unit.empty[0], 10, unit.empty[2], rc)
+    div10 += UNIT.move(unit.empty[0], prevunit.empty[3])
+    digitize_code += glide_each_unit_down(div10).label("div10")
 
 
     # DIGITIZING CODE
 
     # move remainder to digit stack
-    digitize_code += bf_glide_f(254, USIZE) + "[>]>[-]<" + "+" * 48 + bf_glide_b(254, 1) + bf_glide_b(255, USIZE) + bf_f(USIZE)
-    digitize_code += UNIT.foreach(rc, move_code := BFCode())
-    move_code += bf_glide_f(254, USIZE) + "[>]<+" + bf_glide_b(254, 1) + bf_glide_b(255, USIZE) + bf_f(USIZE)
+    digitize_code += bf_glide_f(END, USIZE) + "[>]>[-]<" + "+" * 48 + bf_glide_b(END, 1) + bf_glide_b(START, USIZE) + bf_f(USIZE)
+    digitize_code += UNIT.foreach(prevunit.empty[3], move_code := BFCode()).label("push_digit")
+    move_code += bf_glide_f(END, USIZE) + "[>]<+" + bf_glide_b(END, 1) + bf_glide_b(START, USIZE) + bf_f(USIZE)
 
     # check if all qcs are zero
     digitize_code += UNIT.set(prevunit.empty[3], [1])
-    digitize_code += glide_each_unit(check_qc := BFCode())
+    digitize_code += glide_each_unit(check_qc := BFCode()).label("check_qcs")
     check_qc += UNIT.copy(qc, unit.empty[0], unit.empty[1])
     check_qc += UNIT.if_(unit.empty[0], clear_flag := BFCode())
-    clear_flag += bf_glide_b(255, USIZE) + bf_f(USIZE)
+    clear_flag += bf_glide_b(START, USIZE) + bf_f(USIZE)
     clear_flag += UNIT.clear(prevunit.empty[3])
-    # glide to unit right before 254 to end it quick
-    clear_flag += bf_glide_f(254, USIZE) + bf_b(USIZE)
+    # glide to unit right before END to end it quick
+    clear_flag += bf_glide_f(END, USIZE) + bf_b(USIZE)
 
     # if prevunit.empty[3] then stop digitizing
     digitize_code += UNIT.set(prevunit.empty[2], [1])
@@ -154,40 +279,231 @@ def output_n1():
 
     # clear flag and print out all digits
     stop_digitizing_code += UNIT.clear(keep_digitizing) + UNIT.clear(prevunit.empty[2])
-    stop_digitizing_code += bf_glide_f(254, USIZE) + "[>]<++[--.[-]<++]--" + bf_glide_b(255, USIZE) + bf_f(USIZE)
+    stop_digitizing_code += (bf_glide_f(END, USIZE) + "[>]<++[--.[-]<++]--" + bf_glide_b(START, USIZE) + bf_f(USIZE)).label("print_digits")
 
     # move qcs to rcs
-    keep_digitizing_code += glide_each_unit(UNIT.move(qc, rc))
+    keep_digitizing_code += glide_each_unit(UNIT.move(qc, rc)).label("move_qcs")
 
     code += UNIT.tb(unit.empty[0], "+" * 10 + ".[-]")
     return code
 
 
-def inc_inf_num(mr: memrange, t1: memrange, t2: memrange, glide_back_target: int):
-    code = UNIT.set(t1, [1])
-    code += UNIT.loop(t1, inc_move := BFCode())
-    inc_move += UNIT.inc(mr) + UNIT.copy(mr, t2, t1)
-    inc_move += UNIT.not_(t2, t1)
-    inc_move += UNIT.if_(t2, UNIT.set(memrange([t1.index + USIZE], unit=t1.unit), [1]))
-    inc_move += bf_f(USIZE)
-    return code + bf_glide_b(glide_back_target, USIZE)
-
-
+@PRIMITIVES
 def glide_each_unit(code: BFCode):
-    return "++[--" + code + bf_f(USIZE) + "++]--" + bf_glide_b(255, USIZE) + bf_f(USIZE)
+    return "++[--" + code + bf_f(USIZE) + "++]--" + bf_glide_b(START, USIZE) + bf_f(USIZE)
+
+
+# the same from the top limb, the one before END, down to the first unit
+@PRIMITIVES
+def glide_each_unit_down(code: BFCode):
+    return bf_glide_f(END, USIZE) + bf_b(USIZE) + "+[-" + code + bf_b(USIZE) + "+]-" + bf_f(USIZE)
+
+
+def run_py(path: Path):
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    assert(spec is not None and spec.loader is not None)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.run()
+
+
+CC = "gcc"
+# C compiler flags of each --build profile. pgo compiles with its flags twice, first
+# instrumented for a training run and then with the profile that run wrote.
+BUILDS: Dict[str, List[str]] = {
+    "debug": ["-O0", "-g"],
+    "o2": ["-O2"],
+    "native": ["-O3", "-march=native"],
+    "pgo": ["-O3", "-march=native"],
+}
+DEFAULT_BUILD = "o2"
+CFLAGS: List[str] = BUILDS[DEFAULT_BUILD]
+BFC_FLAGS: List[str] = ["--tape=mmap"]
+
+
+def cc_version() -> str:
+    return subprocess.run([CC, "-dumpfullversion"], capture_output=True, text=True, check=True).stdout.strip()
+
+
+def compile_c(source: Path, exe: Path, build: str, train_terms: int, timer: stagetimer, libs: Sequence[str] = ()):
+    cmd = [CC, *BUILDS[build], str(source), "-o", str(exe), *libs]
+    if build != "pgo":
+        with timer.stage("cc"):
+            subprocess.run(cmd, check=True)
+        return
+    # the instrumented program writes its counts to exe's .gcda, where -fprofile-use looks for them
+    with timer.stage("cc instrumented"):
+        subprocess.run([*cmd, "-fprofile-generate", "-fprofile-update=single"], check=True)
+    with timer.stage(f"train {train_terms} terms"):
+        subprocess.run([str(exe), "--max-lines", str(train_terms)], stdout=subprocess.DEVNULL, check=True)
+    with timer.stage("cc pgo"):
+        subprocess.run([*cmd, "-fprofile-use", "-Wno-missing-profile"], check=True)
+    for gcda in exe.parent.glob("*.gcda"):
+        gcda.unlink()
+
+
+def time_terms(exe: Path, terms: int, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([str(exe), "--max-lines", str(terms)], stdout=subprocess.DEVNULL, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate, compile and run the infinite fibonacci brainfuck program.")
+    parser.add_argument("--backend", choices=["c", "py"], default="c" if shutil.which(CC) else "py",
+                        help="compile to C with gcc, or run the python translation in-process (default: c if gcc is available)")
+    parser.add_argument("--mode", choices=MODES, default="binary",
+                        help="store the terms in base 256 (the cell size) and convert them for printing, or keep them in decimal")
+    parser.add_argument("--cell-bits", type=int, choices=cells.WIDTHS, default=8,
+                        help="width of a tape cell; binary mode keeps one limb per cell")
+    parser.add_argument("--start-index", type=int, metavar="N",
+                        help="start printing at the Nth fibonacci number, F(0) = 0, instead of F(1)")
+    parser.add_argument("--every", type=int, default=1, metavar="K", help="only print every Kth term")
+    parser.add_argument("--stop-index", type=int, metavar="N", help="stop before the Nth fibonacci number")
+    parser.add_argument("--max-terms", type=int, metavar="N", help="stop after printing N terms")
+    parser.add_argument("--no-cache", action="store_true", help="always rerun bfc and the C compiler")
+    parser.add_argument("--cache-entries", type=int, default=8, help="number of builds to keep in build/cache")
+    parser.add_argument("--cache-mb", type=int, default=512, help="size limit of build/cache in MB")
+    parser.add_argument("--profile", action="store_true",
+                        help="count loop iterations per labeled part of the program into build/profile.txt (c backend only)")
+    parser.add_argument("--build", choices=BUILDS, default=DEFAULT_BUILD,
+                        help="C compiler profile: debug (-O0 -g), o2, native (-O3 -march=native) or pgo (native, profile guided)")
+    parser.add_argument("--train-terms", type=int, default=300, help="terms the instrumented program runs for to train a pgo build, at most --max-terms")
+    parser.add_argument("--compare-builds", type=int, metavar="TERMS",
+                        help="build every profile, report how long each takes to print TERMS terms and exit")
+    parser.add_argument("--checkpoint-every", type=int, metavar="TERMS",
+                        help="save the program's tape every TERMS terms, and on ctrl-c, SIGTERM or SIGUSR1 (c backend only)")
+    parser.add_argument("--resume", action="store_true", help="continue from the term after the last checkpoint")
+    parser.add_argument("--checkpoint-file", type=Path, default=Path("./build/checkpoint.bin"))
+    parser.add_argument("--telemetry", type=int, metavar="MS",
+                        help="have the program write a stats line to stderr every MS milliseconds (c backend only)")
+    parser.add_argument("--threaded", action="store_true",
+                        help="add the terms in one thread and convert and print them in another (c backend only)")
+    opts = parser.parse_args(args)
+    checkpoints = opts.checkpoint_every is not None or opts.resume
+    if opts.backend != "c" and (opts.profile or opts.compare_builds or checkpoints or opts.threaded or opts.telemetry):
+        parser.error("--profile, --compare-builds, checkpoints, --threaded and --telemetry need the c backend")
+    if opts.threaded and (opts.profile or checkpoints or opts.telemetry):
+        parser.error("--threaded can't be combined with --profile, checkpoints or --telemetry")
+    if opts.telemetry is not None and opts.telemetry < 1:
+        parser.error("--telemetry needs an interval of at least 1 ms")
+    if opts.start_index is not None and opts.start_index < 0:
+        parser.error("--start-index can't be negative")
+    if opts.every < 1 or (opts.max_terms is not None and opts.max_terms < 1):
+        parser.error("--every and --max-terms must be at least 1")
+    max_terms = opts.max_terms
+    if opts.stop_index is not None:
+        first = 1 if opts.start_index is None else opts.start_index
+        if opts.stop_index <= first:
+            parser.error("--stop-index must come after the first term")
+        window = len(range(first, opts.stop_index, opts.every))
+        max_terms = window if max_terms is None else min(max_terms, window)
+    if max(opts.every, max_terms or 0) >> (opts.cell_bits * COUNTER_LIMBS):
+        parser.error(f"--every and --max-terms must fit in {COUNTER_LIMBS} cells")
+    if opts.mode == "binary" and opts.cell_bits > 16:
+        # the long division spells out cell size / 10 as increments for every carried remainder
+        parser.error("binary mode needs cells of at most 16 bits")
 
-
-def main():
     build_path = Path("./build/")
     build_path.mkdir(parents=True, exist_ok=True)
-
-    code = infinite_fib()
-    bf_code_path = build_path.joinpath("code.bf")
-    bf_code_path.write_text(code.to_bf())
-
-    bfc_main([str(bf_code_path), str(build_path.joinpath("code.c"))])
-    subprocess.run(["gcc", str(build_path.joinpath("code.c")), "-o", str(build_path.joinpath("code"))])
-    subprocess.run([str(build_path.joinpath("code"))])
+    timer = stagetimer()
+    profile_path = build_path.joinpath("profile.txt").absolute()
+    bfc_flags = [*BFC_FLAGS, f"--profile={profile_path}"] if opts.profile else BFC_FLAGS
+    if opts.cell_bits != 8:
+        bfc_flags = [*bfc_flags, f"--cell-bits={opts.cell_bits}"]
+    if opts.telemetry:
+        bfc_flags = [*bfc_flags, f"--telemetry={opts.telemetry}"]
+    run_args = []
+    if checkpoints:
+        bfc_flags = [*bfc_flags, "--checkpoints"]
+        run_args = ["--checkpoint", str(opts.checkpoint_file)]
+        if opts.checkpoint_every is not None:
+            run_args += ["--checkpoint-every", str(opts.checkpoint_every)]
+        if opts.resume:
+            run_args.append("--resume")
+    cells.set_bits(opts.cell_bits)
+
+    with timer.stage("codegen"):
+        code = infinite_fib(opts.mode, start_index=opts.start_index, every=opts.every, max_terms=max_terms, threaded=opts.threaded)
+        # only the plain 8 bit binary program is build/code.bf, the others get their own file
+        variant = ("" if opts.mode == "binary" else f".{opts.mode}") + ("" if opts.cell_bits == 8 else f".{opts.cell_bits}bit")
+        variant += ".profile" if opts.profile else ""
+        if opts.start_index is not None:
+            variant += f".from{opts.start_index}"
+        if opts.every > 1:
+            variant += f".every{opts.every}"
+        if max_terms is not None:
+            variant += f".max{max_terms}"
+        if opts.threaded:
+            variant += ".threaded"
+        bf_code_path = build_path.joinpath(f"code{variant}.bf")
+        with bf_code_path.open("wt") as fout:
+            code.write_bf(fout, labels=opts.profile)
+        bf_paths = [bf_code_path]
+        if opts.threaded:
+            bf_paths.append(build_path.joinpath(f"code{variant}.convert.bf"))
+            with bf_paths[1].open("wt") as fout:
+                conversion_kernel(opts.mode).write_bf(fout)
+
+    artifact = "code.py" if opts.backend == "py" else "code"
+    # the instrumented program stops by itself after max_terms, train on what it prints
+    train_terms = opts.train_terms if max_terms is None else min(opts.train_terms, max_terms)
+    cache = buildcache(build_path.joinpath("cache"), opts.cache_entries, opts.cache_mb << 20)
+    # an upgraded compiler must not reuse binaries from the old one
+    compiler = [CC, cc_version()] if opts.backend == "c" else [CC]
+
+    def build(name: str, timer: stagetimer) -> Path:
+        train = [f"--train-terms={train_terms}"] if name == "pgo" else []
+        key = build_key(bf_paths, opts.backend, *compiler, *BUILDS[name], *train, *bfc_flags)
+        entry = None if opts.no_cache else cache.lookup(key)
+        status = "hit" if entry is not None else "miss"
+        if entry is None:
+            scratch = cache.prepare(key)
+            try:
+                source = scratch.joinpath("code.py" if opts.backend == "py" else "code.c")
+                with timer.stage("bfc"):
+                    translate = threaded_main if opts.threaded else bfc_main
+                    errmsg = translate([*bfc_flags, *map(str, bf_paths), str(source)])
+                if errmsg is not None:
+                    sys.exit(errmsg)
+                if opts.backend == "c":
+                    compile_c(source, scratch.joinpath(artifact), name, train_terms, timer, ["-pthread"] if opts.threaded else [])
+                entry = cache.commit(key, scratch, replace=opts.no_cache)
+            finally:
+                # gone after a commit, left over when bfc or the compiler failed
+                shutil.rmtree(scratch, ignore_errors=True)
+        print(f"build cache {status} ({name} {key[:12]}): {timer}", file=sys.stderr)
+        return entry
+
+    if opts.compare_builds:
+        results: List[Tuple[str, float]] = []
+        for name in BUILDS:
+            exe = build(name, stagetimer() if results else timer).joinpath(artifact)
+            results.append((name, time_terms(exe, opts.compare_builds)))
+        print(f"{'build':<8} {'seconds':>9} {'terms/s':>10}")
+        for name, seconds in results:
+            print(f"{name:<8} {seconds:9.3f} {opts.compare_builds / seconds:10.1f}")
+        return
+
+    entry = build(opts.build, timer)
+    if opts.backend == "c" and not variant and bfc_flags == BFC_FLAGS:
+        # the plain program's C is kept next to build/code.bf
+        shutil.copyfile(entry.joinpath("code.c"), build_path.joinpath("code.c"))
+    if opts.backend == "py":
+        run_py(entry.joinpath(artifact))
+    else:
+        proc = subprocess.Popen([str(entry.joinpath(artifact)), *run_args])
+        try:
+            proc.wait()
+        except KeyboardInterrupt:
+            # the program got the ctrl-c too, let it finish writing its checkpoint
+            proc.wait()
+        finally:
+            if opts.profile:
+                print(f"profile written to {profile_path}", file=sys.stderr)
 
 
 if __name__ == "__main__":
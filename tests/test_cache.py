@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from c2bf.build.cache import buildcache
+
+
+class buildcache_test(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_entries(self, count: int):
+        # e0 is the oldest, each later one a minute newer
+        for i in range(count):
+            path = self.root.joinpath(f"e{i}")
+            path.mkdir()
+            path.joinpath("code").write_bytes(b"x")
+            os.utime(path, (1_000_000 + 60 * i, 1_000_000 + 60 * i))
+
+    def names(self, cache: buildcache):
+        return [p.name for p in cache.entries()]
+
+    def test_evicts_least_recently_used(self):
+        self.make_entries(6)
+        cache = buildcache(self.root, max_entries=3)
+        cache.evict()
+        self.assertEqual(self.names(cache), ["e3", "e4", "e5"])
+
+    def test_evict_keeps(self):
+        self.make_entries(6)
+        cache = buildcache(self.root, max_entries=3)
+        cache.evict(keep=[self.root.joinpath("e0")])
+        self.assertEqual(self.names(cache), ["e0", "e4", "e5"])
+
+    def test_evicts_by_size(self):
+        self.make_entries(4)
+        cache = buildcache(self.root, max_entries=8, max_bytes=2)
+        cache.evict()
+        self.assertEqual(self.names(cache), ["e2", "e3"])
+
+    def test_commit_replace(self):
+        cache = buildcache(self.root)
+        old = cache.prepare("key")
+        old.joinpath("code").write_bytes(b"old")
+        cache.commit("key", old)
+        new = cache.prepare("key")
+        new.joinpath("code").write_bytes(b"new")
+        entry = cache.commit("key", new, replace=True)
+        self.assertEqual(entry.joinpath("code").read_bytes(), b"new")
+        self.assertEqual(self.names(cache), ["key"])
+
+
+if __name__ == "__main__":
+    unittest.main()